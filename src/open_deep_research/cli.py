@@ -15,6 +15,7 @@ from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
 from open_deep_research.deep_researcher import deep_researcher
 from open_deep_research.state import AgentInputState
 from open_deep_research.configuration import Configuration, SearchAPI
+from open_deep_research.utils import aclose_http_clients
 
 app = typer.Typer(help="Open Deep Research CLI")
 console = Console()
@@ -197,7 +198,14 @@ def research(
     """
     Run deep research on a topic.
     """
-    asyncio.run(run_research(topic, max_depth, max_concurrent, research_model, search_api))
+    async def run_and_shutdown():
+        try:
+            await run_research(topic, max_depth, max_concurrent, research_model, search_api)
+        finally:
+            # Release pooled HTTP connections before the event loop closes
+            await aclose_http_clients()
+
+    asyncio.run(run_and_shutdown())
 
 if __name__ == "__main__":
     app()
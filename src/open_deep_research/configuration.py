@@ -1,8 +1,11 @@
 """Configuration management for the Open Deep Research system."""
 
+import json
 import os
+import threading
+from collections import OrderedDict
 from enum import Enum
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional
 
 from langchain_core.runnables import RunnableConfig
 from pydantic import BaseModel, Field
@@ -16,6 +19,12 @@ class SearchAPI(Enum):
     TAVILY = "tavily"
     NONE = "none"
 
+class ReportMergeStrategy(Enum):
+    """Enumeration of strategies for merging report section drafts."""
+    
+    SINGLE_PASS = "single_pass"
+    HIERARCHICAL = "hierarchical"
+
 class MCPConfig(BaseModel):
     """Configuration for Model Context Protocol (MCP) servers."""
     
@@ -35,6 +44,44 @@ class MCPConfig(BaseModel):
     )
     """Whether the MCP server requires authentication"""
 
+class RateLimit(BaseModel):
+    """Per-minute request and token limits for a model provider, model or search API."""
+    
+    requests_per_minute: Optional[int] = Field(
+        default=None,
+        optional=True,
+    )
+    """Maximum number of requests started per minute"""
+    tokens_per_minute: Optional[int] = Field(
+        default=None,
+        optional=True,
+    )
+    """Maximum number of estimated prompt tokens sent per minute"""
+
+class ConcurrencyLimits(BaseModel):
+    """Maximum number of concurrent operations in each named concurrency pool."""
+    
+    research_units: Optional[int] = Field(
+        default=None,
+        optional=True,
+    )
+    """Maximum number of researcher subgraphs running at once"""
+    tool_calls: Optional[int] = Field(
+        default=None,
+        optional=True,
+    )
+    """Maximum number of researcher tool calls executing at once"""
+    search_requests: Optional[int] = Field(
+        default=None,
+        optional=True,
+    )
+    """Maximum number of search API requests in flight at once"""
+    summarizations: Optional[int] = Field(
+        default=None,
+        optional=True,
+    )
+    """Maximum number of webpage summarization calls in flight at once"""
+
 class Configuration(BaseModel):
     """Main configuration class for the Deep Research agent."""
     
@@ -74,6 +121,63 @@ class Configuration(BaseModel):
             }
         }
     )
+    research_unit_timeout_seconds: float = Field(
+        default=0.0,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 0.0,
+                "min": 0,
+                "description": "Optional time budget in seconds for each research unit, including compression. Research is cancelled once 80% of the budget has passed, and the rest is spent compressing its findings so far into a partial result. 0 (the default) disables the budget"
+            }
+        }
+    )
+    research_unit_max_retries: int = Field(
+        default=0,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 0,
+                "min": 0,
+                "max": 5,
+                "description": "Number of times a failed research unit is retried before the supervisor is told it failed. Each retry reruns the unit from scratch, repeating its model and search spend. Off by default"
+            }
+        }
+    )
+    research_unit_retry_backoff_seconds: float = Field(
+        default=2.0,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 2.0,
+                "min": 0,
+                "description": "Delay in seconds before the first retry of a failed research unit, doubling on each further retry"
+            }
+        }
+    )
+    pipelined_supervisor: bool = Field(
+        default=False,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "boolean",
+                "default": False,
+                "description": "Report research units back to the supervisor as they complete, so it can dispatch new research while slower units are still running"
+            }
+        }
+    )
+    max_total_research_units: int = Field(
+        default=20,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "slider",
+                "default": 20,
+                "min": 1,
+                "max": 100,
+                "step": 1,
+                "description": "Maximum number of research units the pipelined supervisor may dispatch over a whole research run"
+            }
+        }
+    )
     # Research Configuration
     search_api: SearchAPI = Field(
         default=SearchAPI.TAVILY,
@@ -117,6 +221,49 @@ class Configuration(BaseModel):
             }
         }
     )
+    incremental_compression: bool = Field(
+        default=False,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "boolean",
+                "default": False,
+                "description": "Fold each researcher tool step into running compressed notes while research continues, so the final compression only merges the last step"
+            }
+        }
+    )
+    researcher_compaction_token_watermark: int = Field(
+        default=40000,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 40000,
+                "min": 0,
+                "description": "Researcher transcript size in tokens above which older tool results are collapsed into compact digests. Set to 0 to disable compaction"
+            }
+        }
+    )
+    researcher_compaction_keep_recent_turns: int = Field(
+        default=2,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 2,
+                "min": 1,
+                "max": 10,
+                "description": "Number of most recent tool-calling turns kept verbatim when a researcher transcript is compacted"
+            }
+        }
+    )
+    researcher_compaction_digest_chars: int = Field(
+        default=2000,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 2000,
+                "description": "Maximum characters of each tool result digest left in a compacted researcher transcript"
+            }
+        }
+    )
     # Model Configuration
     summarization_model: str = Field(
         default="openai:gpt-4.1-mini",
@@ -150,6 +297,94 @@ class Configuration(BaseModel):
             }
         }
     )
+    summarization_passthrough_chars: int = Field(
+        default=3000,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 3000,
+                "min": 0,
+                "description": "Webpages shorter than this many characters are passed to the researcher unchanged. Also the length extractive compression reduces mid-sized pages to"
+            }
+        }
+    )
+    summarization_llm_min_chars: int = Field(
+        default=8000,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 8000,
+                "min": 0,
+                "description": "Webpages at least this many characters long are summarized by the summarization model. Shorter pages above the passthrough length are compressed extractively instead"
+            }
+        }
+    )
+    summarization_timeout_seconds: float = Field(
+        default=60.0,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 60,
+                "min": 1,
+                "description": "Maximum seconds to wait for a webpage summary. The effective timeout adapts to observed summarization latency and never exceeds this value"
+            }
+        }
+    )
+    summarization_batch_token_budget: int = Field(
+        default=0,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 0,
+                "min": 0,
+                "max": 200000,
+                "description": "Estimated input token budget for summarizing several mid-sized webpages in one model call. Pages larger than half the budget are summarized individually. 0 disables batching"
+            }
+        }
+    )
+    content_prefilter: bool = Field(
+        default=True,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "boolean",
+                "default": True,
+                "description": "When a webpage exceeds the maximum content length, keep the passages most relevant to the search query (BM25) instead of truncating it"
+            }
+        }
+    )
+    deduplicate_near_duplicates: bool = Field(
+        default=True,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "boolean",
+                "default": True,
+                "description": "Whether to collapse search results with nearly identical content (e.g. syndicated or mirrored pages) into one summarized source"
+            }
+        }
+    )
+    near_duplicate_threshold: float = Field(
+        default=0.85,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "slider",
+                "default": 0.85,
+                "min": 0.5,
+                "max": 1.0,
+                "step": 0.05,
+                "description": "Estimated Jaccard similarity of page content above which two search results are treated as duplicates"
+            }
+        }
+    )
+    prompt_caching: bool = Field(
+        default=False,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "boolean",
+                "default": False,
+                "description": "Mark the stable prompt prefix (system prompt, tool schemas and earlier turns) of researcher and supervisor calls as cacheable. Adds Anthropic cache breakpoints; OpenAI caches stable prefixes automatically"
+            }
+        }
+    )
     research_model: str = Field(
         default="openai:gpt-4.1",
         metadata={
@@ -210,6 +445,218 @@ class Configuration(BaseModel):
             }
         }
     )
+    report_map_reduce_threshold: int = Field(
+        default=60000,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 60000,
+                "min": 0,
+                "description": "Findings size in tokens above which the final report is drafted section by section in parallel and then merged. Set to 0 to always write the report in a single call"
+            }
+        }
+    )
+    report_section_max_tokens: int = Field(
+        default=20000,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 20000,
+                "description": "Maximum tokens of research notes drafted into one report section"
+            }
+        }
+    )
+    max_concurrent_report_sections: int = Field(
+        default=5,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "slider",
+                "default": 5,
+                "min": 1,
+                "max": 20,
+                "step": 1,
+                "description": "Maximum number of report sections to draft concurrently. Note: with more concurrency, you may run into rate limits."
+            }
+        }
+    )
+    report_merge_strategy: ReportMergeStrategy = Field(
+        default=ReportMergeStrategy.SINGLE_PASS,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "select",
+                "default": "single_pass",
+                "description": "How section drafts are merged into the final report. Single pass merges all drafts in one call, only merging groups first when they do not fit. Hierarchical always merges drafts in groups until one remains",
+                "options": [
+                    {"label": "Single Pass", "value": ReportMergeStrategy.SINGLE_PASS.value},
+                    {"label": "Hierarchical", "value": ReportMergeStrategy.HIERARCHICAL.value}
+                ]
+            }
+        }
+    )
+    # Cache Configuration
+    cache_dir: Optional[str] = Field(
+        default=None,
+        optional=True,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "text",
+                "description": "Directory for persistent caches. Defaults to ~/.cache/open_deep_research"
+            }
+        }
+    )
+    search_cache_enabled: bool = Field(
+        default=False,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "boolean",
+                "default": False,
+                "description": "Whether to cache Tavily search results on disk (in cache_dir, ~/.cache/open_deep_research by default) and reuse them for repeated queries. Off by default"
+            }
+        }
+    )
+    search_cache_ttl_seconds: int = Field(
+        default=21600,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 21600,
+                "min": 0,
+                "description": "Time in seconds a cached search result stays valid"
+            }
+        }
+    )
+    search_cache_max_size_mb: int = Field(
+        default=256,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 256,
+                "min": 1,
+                "description": "Maximum size of the search result cache in megabytes. Least recently used entries are evicted first"
+            }
+        }
+    )
+    summary_cache_enabled: bool = Field(
+        default=False,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "boolean",
+                "default": False,
+                "description": "Whether to cache webpage summaries on disk (in cache_dir, ~/.cache/open_deep_research by default) and reuse them across runs, keyed by the summarized content and summarization model. Off by default"
+            }
+        }
+    )
+    summary_cache_ttl_seconds: int = Field(
+        default=604800,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 604800,
+                "min": 0,
+                "description": "Time in seconds a cached webpage summary stays valid"
+            }
+        }
+    )
+    summary_cache_max_size_mb: int = Field(
+        default=256,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 256,
+                "min": 1,
+                "description": "Maximum size of the persistent webpage summary cache in megabytes"
+            }
+        }
+    )
+    summary_cache_memory_entries: int = Field(
+        default=1024,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 1024,
+                "min": 0,
+                "description": "Number of webpage summaries kept in the in-memory cache tier in front of the persistent cache"
+            }
+        }
+    )
+    # Rate Limit Configuration
+    rate_limits: Optional[Dict[str, RateLimit]] = Field(
+        default=None,
+        optional=True,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "json",
+                "description": "Shared rate limits keyed by provider (e.g. 'openai', 'tavily') or full model name (e.g. 'openai:gpt-4.1'). Every model call and Tavily request waits for capacity in both its provider and model buckets. Unset means unlimited."
+            }
+        }
+    )
+    # Concurrency Governor Configuration
+    run_concurrency_limits: Optional[ConcurrencyLimits] = Field(
+        default=None,
+        optional=True,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "json",
+                "description": "Concurrency limits for a single research run (identified by its run_id or thread_id) across all nested fan-outs, keyed by pool: 'research_units', 'tool_calls', 'search_requests', 'summarizations'. Unset means unlimited."
+            }
+        }
+    )
+    process_concurrency_limits: Optional[ConcurrencyLimits] = Field(
+        default=None,
+        optional=True,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "json",
+                "description": "Concurrency limits shared by every run in this process, keyed by pool: 'research_units', 'tool_calls', 'search_requests', 'summarizations'. Unset means unlimited."
+            }
+        }
+    )
+    # HTTP Connection Pool Configuration
+    http_pool_max_connections: int = Field(
+        default=100,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 100,
+                "min": 1,
+                "description": "Maximum number of open connections per pooled HTTP client (Tavily, MCP token exchange)"
+            }
+        }
+    )
+    http_pool_max_keepalive_connections: int = Field(
+        default=20,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 20,
+                "min": 0,
+                "description": "Maximum number of idle keep-alive connections retained per pooled HTTP client"
+            }
+        }
+    )
+    http_keepalive_expiry_seconds: float = Field(
+        default=30.0,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 30,
+                "min": 0,
+                "description": "Seconds an idle keep-alive connection is kept open before it is closed"
+            }
+        }
+    )
+    # Tool Registry Configuration
+    tool_cache_ttl_seconds: int = Field(
+        default=300,
+        metadata={
+            "x_oap_ui_config": {
+                "type": "number",
+                "default": 300,
+                "min": 0,
+                "description": "Time in seconds an assembled research toolkit, including tools discovered on the MCP server, is reused before it is reloaded. MCP authentication errors reload it immediately. 0 disables caching"
+            }
+        }
+    )
     # MCP server configuration
     mcp_config: Optional[MCPConfig] = Field(
         default=None,
@@ -237,16 +684,71 @@ class Configuration(BaseModel):
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
     ) -> "Configuration":
-        """Create a Configuration instance from a RunnableConfig."""
+        """Create a Configuration instance from a RunnableConfig.
+
+        Parsed configurations are cached by the values of their configuration fields,
+        so every node and tool of a run shares one instance instead of re-validating.
+        Environment overrides are read once at import; call clear_cache after changing
+        them. The returned instance is shared and must be treated as read-only.
+        """
         configurable = config.get("configurable", {}) if config else {}
-        field_names = list(cls.model_fields.keys())
+        provided = {
+            field_name: configurable[field_name]
+            for field_name in cls.model_fields
+            if configurable.get(field_name) is not None
+        }
+        try:
+            cache_key = (cls, json.dumps(provided, sort_keys=True, default=repr))
+        except (TypeError, ValueError):
+            return cls._parse_configurable(configurable)
+
+        with _configuration_cache_lock:
+            if cache_key in _configuration_cache:
+                _configuration_cache.move_to_end(cache_key)
+                return _configuration_cache[cache_key]
+
+        parsed = cls._parse_configurable(configurable)
+        with _configuration_cache_lock:
+            _configuration_cache[cache_key] = parsed
+            while len(_configuration_cache) > _CONFIGURATION_CACHE_MAX_ENTRIES:
+                _configuration_cache.popitem(last=False)
+        return parsed
+
+    @classmethod
+    def _parse_configurable(cls, configurable: Dict[str, Any]) -> "Configuration":
+        """Validate a configurable dict, with environment overrides taking precedence."""
         values: dict[str, Any] = {
-            field_name: os.environ.get(field_name.upper(), configurable.get(field_name))
-            for field_name in field_names
+            field_name: _environment_overrides.get(field_name.upper(), configurable.get(field_name))
+            for field_name in cls.model_fields
         }
         return cls(**{k: v for k, v in values.items() if v is not None})
 
+    @classmethod
+    def clear_cache(cls) -> None:
+        """Forget parsed configurations and re-read environment overrides."""
+        global _environment_overrides
+        with _configuration_cache_lock:
+            _configuration_cache.clear()
+            _environment_overrides = _read_environment_overrides()
+
     class Config:
         """Pydantic configuration."""
         
-        arbitrary_types_allowed = True
\ No newline at end of file
+        arbitrary_types_allowed = True
+
+
+def _read_environment_overrides() -> Dict[str, str]:
+    """Return the environment variables that override Configuration fields."""
+    return {
+        field_name.upper(): os.environ[field_name.upper()]
+        for field_name in Configuration.model_fields
+        if field_name.upper() in os.environ
+    }
+
+# Environment overrides are snapshotted once at import rather than scanned on every lookup
+_environment_overrides: Dict[str, str] = _read_environment_overrides()
+
+# Parsed configurations keyed by their configuration field values, bounded in size
+_CONFIGURATION_CACHE_MAX_ENTRIES = 128
+_configuration_cache: "OrderedDict[tuple, Configuration]" = OrderedDict()
+_configuration_cache_lock = threading.Lock()
@@ -1,9 +1,12 @@
 """Main LangGraph implementation for the Deep Research agent."""
 
 import asyncio
+import contextlib
+import functools
+import logging
+import uuid
 from typing import Literal
 
-from langchain.chat_models import init_chat_model
 from langchain_core.messages import (
     AIMessage,
     HumanMessage,
@@ -18,13 +21,17 @@ from langgraph.types import Command
 
 from open_deep_research.configuration import (
     Configuration,
+    ReportMergeStrategy,
 )
 from open_deep_research.prompts import (
     clarify_with_user_instructions,
+    compress_research_incremental_human_message,
     compress_research_simple_human_message,
     compress_research_system_prompt,
     final_report_generation_prompt,
     lead_researcher_prompt,
+    report_section_draft_prompt,
+    report_section_merge_prompt,
     research_system_prompt,
     transform_messages_into_research_topic_prompt,
 )
@@ -40,22 +47,39 @@ from open_deep_research.state import (
     SupervisorState,
 )
 from open_deep_research.utils import (
+    acquire_model_rate_limit,
     anthropic_websearch_called,
+    apply_prompt_cache_breakpoints,
+    cluster_notes,
+    compact_tool_messages,
+    concurrency_slot,
+    count_message_tokens,
+    count_text_tokens,
+    fit_messages_to_token_budget,
+    fit_text_to_token_budget,
     get_all_tools,
     get_api_key_for_model,
-    get_model_token_limit,
+    get_chat_model,
     get_notes_from_tool_calls,
+    get_prompt_token_budget,
+    get_research_unit_pool,
+    get_rolling_compression,
     get_today_str,
+    get_tools_by_name,
+    is_compacted,
     is_token_limit_exceeded,
+    load_tokenizers,
+    open_research_unit_pool,
     openai_websearch_called,
+    pop_rolling_compression,
+    prompt_cache_stats,
+    release_research_unit_pool,
+    release_rolling_compression,
     remove_up_to_last_ai_message,
     think_tool,
+    with_run_scope,
 )
 
-# Initialize a configurable model that we will use throughout the agent
-configurable_model = init_chat_model(
-    configurable_fields=("model", "max_tokens", "api_key"),
-)
 
 async def clarify_with_user(state: AgentState, config: RunnableConfig) -> Command[Literal["write_research_brief", "__end__"]]:
     """Analyze user messages and ask clarifying questions if the research scope is unclear.
@@ -70,8 +94,10 @@ async def clarify_with_user(state: AgentState, config: RunnableConfig) -> Comman
     Returns:
         Command to either end with a clarifying question or proceed to research brief
     """
-    # Step 1: Check if clarification is enabled in configuration
+    # Step 1: Check if clarification is enabled in configuration, loading the configured
+    # models' tokenizers off the event loop before any node counts tokens
     configurable = Configuration.from_runnable_config(config)
+    await load_tokenizers(configurable)
     if not configurable.allow_clarification:
         # Skip clarification step and proceed directly to research
         return Command(goto="write_research_brief")
@@ -85,12 +111,11 @@ async def clarify_with_user(state: AgentState, config: RunnableConfig) -> Comman
         "tags": ["langsmith:nostream"]
     }
     
-    # Configure model with structured output and retry logic
-    clarification_model = (
-        configurable_model
-        .with_structured_output(ClarifyWithUser)
-        .with_retry(stop_after_attempt=configurable.max_structured_output_retries)
-        .with_config(model_config)
+    # Reuse the cached model with structured output and retry logic
+    clarification_model = get_chat_model(
+        model_config,
+        structured_output=ClarifyWithUser,
+        max_retries=configurable.max_structured_output_retries
     )
     
     # Step 3: Analyze whether clarification is needed
@@ -98,7 +123,9 @@ async def clarify_with_user(state: AgentState, config: RunnableConfig) -> Comman
         messages=get_buffer_string(messages), 
         date=get_today_str()
     )
-    response = await clarification_model.ainvoke([HumanMessage(content=prompt_content)])
+    clarification_messages = [HumanMessage(content=prompt_content)]
+    await acquire_model_rate_limit(configurable, configurable.research_model, clarification_messages)
+    response = await clarification_model.ainvoke(clarification_messages)
     
     # Step 4: Route based on clarification analysis
     if response.need_clarification:
@@ -138,12 +165,11 @@ async def write_research_brief(state: AgentState, config: RunnableConfig) -> Com
         "tags": ["langsmith:nostream"]
     }
     
-    # Configure model for structured research question generation
-    research_model = (
-        configurable_model
-        .with_structured_output(ResearchQuestion)
-        .with_retry(stop_after_attempt=configurable.max_structured_output_retries)
-        .with_config(research_model_config)
+    # Reuse the cached model for structured research question generation
+    research_model = get_chat_model(
+        research_model_config,
+        structured_output=ResearchQuestion,
+        max_retries=configurable.max_structured_output_retries
     )
     
     # Step 2: Generate structured research brief from user messages
@@ -151,7 +177,9 @@ async def write_research_brief(state: AgentState, config: RunnableConfig) -> Com
         messages=get_buffer_string(state.get("messages", [])),
         date=get_today_str()
     )
-    response = await research_model.ainvoke([HumanMessage(content=prompt_content)])
+    brief_messages = [HumanMessage(content=prompt_content)]
+    await acquire_model_rate_limit(configurable, configurable.research_model, brief_messages)
+    response = await research_model.ainvoke(brief_messages)
     
     # Step 3: Initialize supervisor with research brief and instructions
     supervisor_system_prompt = lead_researcher_prompt.format(
@@ -175,6 +203,10 @@ async def write_research_brief(state: AgentState, config: RunnableConfig) -> Com
     )
 
 
+# Available supervisor tools: research delegation, completion signaling, and strategic thinking.
+# Kept at module level so the cached tool binding is reused across supervisor iterations.
+lead_researcher_tools = [ConductResearch, ResearchComplete, think_tool]
+
 async def supervisor(state: SupervisorState, config: RunnableConfig) -> Command[Literal["supervisor_tools"]]:
     """Lead research supervisor that plans research strategy and delegates to researchers.
     
@@ -191,6 +223,7 @@ async def supervisor(state: SupervisorState, config: RunnableConfig) -> Command[
     """
     # Step 1: Configure the supervisor model with available tools
     configurable = Configuration.from_runnable_config(config)
+    await load_tokenizers(configurable)
     research_model_config = {
         "model": configurable.research_model,
         "max_tokens": configurable.research_model_max_tokens,
@@ -198,20 +231,25 @@ async def supervisor(state: SupervisorState, config: RunnableConfig) -> Command[
         "tags": ["langsmith:nostream"]
     }
     
-    # Available tools: research delegation, completion signaling, and strategic thinking
-    lead_researcher_tools = [ConductResearch, ResearchComplete, think_tool]
-    
-    # Configure model with tools, retry logic, and model settings
-    research_model = (
-        configurable_model
-        .bind_tools(lead_researcher_tools)
-        .with_retry(stop_after_attempt=configurable.max_structured_output_retries)
-        .with_config(research_model_config)
+    # Reuse the cached model with tools, retry logic, and model settings
+    research_model = get_chat_model(
+        research_model_config,
+        tools=lead_researcher_tools,
+        max_retries=configurable.max_structured_output_retries
     )
     
     # Step 2: Generate supervisor response based on current context
     supervisor_messages = state.get("supervisor_messages", [])
+    supervisor_messages = fit_messages_to_token_budget(
+        supervisor_messages,
+        configurable.research_model,
+        get_prompt_token_budget(configurable.research_model, configurable.research_model_max_tokens)
+    )
+    if configurable.prompt_caching:
+        supervisor_messages = apply_prompt_cache_breakpoints(supervisor_messages, configurable.research_model)
+    await acquire_model_rate_limit(configurable, configurable.research_model, supervisor_messages)
     response = await research_model.ainvoke(supervisor_messages)
+    prompt_cache_stats.record("supervisor", response)
     
     # Step 3: Update state and proceed to tool execution
     return Command(
@@ -222,6 +260,211 @@ async def supervisor(state: SupervisorState, config: RunnableConfig) -> Command[
         }
     )
 
+async def run_research_unit(
+    research_topic: str,
+    config: RunnableConfig,
+    research_slots: asyncio.Semaphore | None = None
+) -> dict:
+    """Run one research unit, retrying failures with exponential backoff.
+    
+    Token limit errors are not retried, since a second attempt would hit the same limit.
+    
+    Args:
+        research_topic: Topic for the researcher to investigate
+        config: Runtime configuration with retry settings
+        research_slots: Optional semaphore held during each attempt but not during the
+            backoff between attempts, so queued units can run meanwhile
+        
+    Returns:
+        Researcher output with compressed research and raw notes
+        
+    Raises:
+        Exception: The last error once all retries are exhausted
+    """
+    configurable = Configuration.from_runnable_config(config)
+    max_retries = configurable.research_unit_max_retries
+    for attempt in range(max_retries + 1):
+        try:
+            async with research_slots or contextlib.nullcontext(), concurrency_slot("research_units", config):
+                return await run_research_unit_attempt(research_topic, config)
+        except Exception as e:
+            if attempt == max_retries or is_token_limit_exceeded(e, configurable.research_model):
+                raise
+            delay = configurable.research_unit_retry_backoff_seconds * 2 ** attempt
+            logging.warning(f"Research unit failed, retrying in {delay}s: {research_topic}: {e}")
+            await asyncio.sleep(delay)
+
+async def run_research_unit_attempt(research_topic: str, config: RunnableConfig) -> dict:
+    """Run one researcher subgraph, owning the background folds of its rolling compression.
+    
+    Args:
+        research_topic: Topic for the researcher to investigate
+        config: Runtime configuration with the research unit time budget
+        
+    Returns:
+        Researcher output with compressed research and raw notes
+    """
+    rolling_compression_id = str(uuid.uuid4())
+    researcher_input = {
+        "researcher_messages": [HumanMessage(content=research_topic)],
+        "research_topic": research_topic,
+        "rolling_compression_id": rolling_compression_id
+    }
+    try:
+        return await run_researcher_within_budget(researcher_input, config)
+    finally:
+        # Background folds must not outlive the unit, even if it failed or was cancelled
+        release_rolling_compression(rolling_compression_id)
+
+# Share of a research unit's time budget held back to compress partial results
+PARTIAL_COMPRESSION_BUDGET_SHARE = 0.2
+
+async def run_researcher_within_budget(researcher_input: dict, config: RunnableConfig) -> dict:
+    """Run the researcher subgraph within the configured per-unit time budget.
+    
+    The subgraph's state is streamed so that, if research runs past its share of the
+    budget, the unit can be cancelled and compress_research run over the messages
+    gathered so far in the time that remains. Such results carry "partial": True, and
+    the whole unit never takes longer than the budget.
+    
+    Args:
+        researcher_input: Initial researcher state
+        config: Runtime configuration with the research unit time budget
+        
+    Returns:
+        Researcher output with compressed research and raw notes
+    """
+    configurable = Configuration.from_runnable_config(config)
+    research_topic = researcher_input["research_topic"]
+    timeout = configurable.research_unit_timeout_seconds
+    if not timeout:
+        return await researcher_subgraph.ainvoke(researcher_input, config)
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    latest_state = researcher_input
+    
+    async def stream_researcher():
+        nonlocal latest_state
+        async for state in researcher_subgraph.astream(researcher_input, config, stream_mode="values"):
+            latest_state = state
+        return latest_state
+    
+    try:
+        return await asyncio.wait_for(stream_researcher(), timeout * (1 - PARTIAL_COMPRESSION_BUDGET_SHARE))
+    except asyncio.TimeoutError:
+        logging.warning(f"Research unit exceeded its {timeout}s budget, returning partial results: {research_topic}")
+    
+    # Compress whatever the researcher gathered before it was cancelled in the rest of the
+    # budget; fall back to the raw tool outputs if that also runs out
+    try:
+        partial_result = await asyncio.wait_for(
+            compress_research(latest_state, config), max(0.0, deadline - loop.time())
+        )
+    except asyncio.TimeoutError:
+        raw_findings = "\n".join(
+            str(message.content)
+            for message in filter_messages(latest_state.get("researcher_messages", []), include_types=["tool"])
+        )
+        partial_result = {"compressed_research": raw_findings, "raw_notes": [raw_findings]}
+    return {**partial_result, "partial": True}
+
+def format_research_unit_result(result) -> str:
+    """Render a research unit's outcome, or the error it raised, as supervisor-visible text."""
+    if isinstance(result, BaseException):
+        return f"Error: This research unit failed and returned no findings: {result}"
+    compressed_research = result.get("compressed_research", "Error synthesizing research report: Maximum retries exceeded")
+    if result.get("partial"):
+        return f"Note: This research unit ran out of time, so these findings are partial.\n\n{compressed_research}"
+    return compressed_research
+
+def research_unit_additional_kwargs(result) -> dict:
+    """Flag partial research unit results on the message that reports them."""
+    if isinstance(result, dict) and result.get("partial"):
+        return {"partial_research": True}
+    return {}
+
+async def run_pipelined_research_step(
+    state: SupervisorState,
+    conduct_research_calls: list[dict],
+    config: RunnableConfig
+) -> tuple[list, list[str], dict]:
+    """Dispatch ConductResearch calls to the run's research pool and collect completed units.
+    
+    New units are queued in a pool that outlives this step, and the step returns as soon
+    as at least one unit has completed. Units still running get a placeholder ToolMessage,
+    and their findings are delivered in a later step once they finish. The total number
+    of units dispatched over the run is capped by max_total_research_units.
+    
+    Args:
+        state: Current supervisor state, including the run's pool id and dispatch count
+        conduct_research_calls: ConductResearch tool calls from the latest supervisor turn
+        config: Runtime configuration with research limits
+        
+    Returns:
+        Tuple of messages for the supervisor, raw notes of completed units, and state updates
+    """
+    configurable = Configuration.from_runnable_config(config)
+    pool = get_research_unit_pool(state.get("research_pool_id"))
+    research_units_dispatched = state.get("research_units_dispatched", 0)
+    
+    # Accept units up to the per-run cap and reject the rest
+    remaining_units = max(0, configurable.max_total_research_units - research_units_dispatched)
+    accepted_calls = conduct_research_calls[:remaining_units]
+    tool_messages = [
+        ToolMessage(
+            content=f"Error: Did not run this research as the limit of {configurable.max_total_research_units} research units for this run has been reached.",
+            name="ConductResearch",
+            tool_call_id=tool_call["id"]
+        )
+        for tool_call in conduct_research_calls[remaining_units:]
+    ]
+    for tool_call in accepted_calls:
+        research_topic = tool_call["args"]["research_topic"]
+        pool.submit(tool_call["id"], research_topic, functools.partial(run_research_unit, research_topic, config))
+    
+    # Wait until at least one unit completes so the supervisor has new findings to react to
+    await pool.wait_for_any()
+    completed_units = {unit_id: (topic, result) for unit_id, topic, result in pool.pop_completed()}
+    
+    # Answer this turn's calls with findings, or a placeholder while the unit is running
+    for tool_call in accepted_calls:
+        if tool_call["id"] in completed_units:
+            _, result = completed_units.pop(tool_call["id"])
+            tool_messages.append(ToolMessage(
+                content=format_research_unit_result(result),
+                name="ConductResearch",
+                tool_call_id=tool_call["id"],
+                additional_kwargs=research_unit_additional_kwargs(result)
+            ))
+        else:
+            tool_messages.append(ToolMessage(
+                content="Research on this topic is running in the background. Its findings will be reported as soon as it completes; you can dispatch other research in the meantime.",
+                name="ConductResearch",
+                tool_call_id=tool_call["id"],
+                additional_kwargs={"research_pending": True}
+            ))
+    
+    # Deliver units from earlier turns that have completed since
+    background_messages = [
+        HumanMessage(
+            content=f"Background research on \"{topic}\" has completed:\n\n{format_research_unit_result(result)}",
+            additional_kwargs={} if isinstance(result, BaseException) else {
+                "research_unit_id": unit_id, **research_unit_additional_kwargs(result)
+            }
+        )
+        for unit_id, (topic, result) in completed_units.items()
+    ]
+    
+    finished_units = [
+        result for _, result in completed_units.values() if not isinstance(result, BaseException)
+    ]
+    raw_notes_concat = "\n".join("\n".join(result.get("raw_notes", [])) for result in finished_units)
+    
+    return tool_messages + background_messages, [raw_notes_concat] if raw_notes_concat else [], {
+        "research_units_dispatched": research_units_dispatched + len(accepted_calls)
+    }
+
 async def supervisor_tools(state: SupervisorState, config: RunnableConfig) -> Command[Literal["supervisor", "__end__"]]:
     """Execute tools called by the supervisor, including research delegation and strategic thinking.
     
@@ -253,12 +496,21 @@ async def supervisor_tools(state: SupervisorState, config: RunnableConfig) -> Co
     
     # Exit if any termination condition is met
     if exceeded_allowed_iterations or no_tool_calls or research_complete_tool_call:
+        notes = get_notes_from_tool_calls(supervisor_messages)
+        update_payload = {"research_brief": state.get("research_brief", "")}
+        
+        # Collect research units the pipelined supervisor still has running
+        if configurable.pipelined_supervisor:
+            pool = get_research_unit_pool(state.get("research_pool_id"))
+            finished_units = [result for _, _, result in await pool.drain() if not isinstance(result, BaseException)]
+            notes += [result.get("compressed_research", "") for result in finished_units]
+            raw_notes_concat = "\n".join("\n".join(result.get("raw_notes", [])) for result in finished_units)
+            if raw_notes_concat:
+                update_payload["raw_notes"] = [raw_notes_concat]
+        
         return Command(
             goto=END,
-            update={
-                "notes": get_notes_from_tool_calls(supervisor_messages),
-                "research_brief": state.get("research_brief", "")
-            }
+            update={"notes": notes, **update_payload}
         )
     
     # Step 2: Process all tool calls together (both think_tool and ConductResearch)
@@ -285,61 +537,51 @@ async def supervisor_tools(state: SupervisorState, config: RunnableConfig) -> Co
         if tool_call["name"] == "ConductResearch"
     ]
     
-    if conduct_research_calls:
-        try:
-            # Limit concurrent research units to prevent resource exhaustion
-            allowed_conduct_research_calls = conduct_research_calls[:configurable.max_concurrent_research_units]
-            overflow_conduct_research_calls = conduct_research_calls[configurable.max_concurrent_research_units:]
-            
-            # Execute research tasks in parallel
-            research_tasks = [
-                researcher_subgraph.ainvoke({
-                    "researcher_messages": [
-                        HumanMessage(content=tool_call["args"]["research_topic"])
-                    ],
-                    "research_topic": tool_call["args"]["research_topic"]
-                }, config) 
-                for tool_call in allowed_conduct_research_calls
-            ]
-            
-            tool_results = await asyncio.gather(*research_tasks)
-            
-            # Create tool messages with research results
-            for observation, tool_call in zip(tool_results, allowed_conduct_research_calls):
-                all_tool_messages.append(ToolMessage(
-                    content=observation.get("compressed_research", "Error synthesizing research report: Maximum retries exceeded"),
-                    name=tool_call["name"],
-                    tool_call_id=tool_call["id"]
-                ))
-            
-            # Handle overflow research calls with error messages
-            for overflow_call in overflow_conduct_research_calls:
-                all_tool_messages.append(ToolMessage(
-                    content=f"Error: Did not run this research as you have already exceeded the maximum number of concurrent research units. Please try again with {configurable.max_concurrent_research_units} or fewer research units.",
-                    name="ConductResearch",
-                    tool_call_id=overflow_call["id"]
-                ))
-            
-            # Aggregate raw notes from all research results
-            raw_notes_concat = "\n".join([
-                "\n".join(observation.get("raw_notes", [])) 
-                for observation in tool_results
-            ])
-            
-            if raw_notes_concat:
-                update_payload["raw_notes"] = [raw_notes_concat]
-                
-        except Exception as e:
-            # Handle research execution errors
-            if is_token_limit_exceeded(e, configurable.research_model) or True:
-                # Token limit exceeded or other error - end research phase
-                return Command(
-                    goto=END,
-                    update={
-                        "notes": get_notes_from_tool_calls(supervisor_messages),
-                        "research_brief": state.get("research_brief", "")
-                    }
-                )
+    research_pool = (
+        get_research_unit_pool(state.get("research_pool_id")) if configurable.pipelined_supervisor else None
+    )
+    if research_pool and (conduct_research_calls or research_pool.pending):
+        # Dispatch new units and report whichever units have completed so far
+        research_messages, raw_notes, pool_update = await run_pipelined_research_step(
+            state, conduct_research_calls, config
+        )
+        all_tool_messages.extend(research_messages)
+        update_payload.update(pool_update)
+        if raw_notes:
+            update_payload["raw_notes"] = raw_notes
+    elif conduct_research_calls:
+        # Accept every research unit, but run at most max_concurrent_research_units at
+        # once; queued units start as soon as a running one finishes or backs off to retry
+        research_slots = asyncio.Semaphore(configurable.max_concurrent_research_units)
+        
+        # Execute research tasks through the bounded work queue, keeping tool-call order;
+        # a failing unit yields its exception without affecting the others
+        research_tasks = [
+            run_research_unit(tool_call["args"]["research_topic"], config, research_slots)
+            for tool_call in conduct_research_calls
+        ]
+        
+        tool_results = await asyncio.gather(*research_tasks, return_exceptions=True)
+        
+        # Create tool messages with research results, flagging units that ran out of time
+        # and reporting units that failed
+        for observation, tool_call in zip(tool_results, conduct_research_calls):
+            all_tool_messages.append(ToolMessage(
+                content=format_research_unit_result(observation),
+                name=tool_call["name"],
+                tool_call_id=tool_call["id"],
+                additional_kwargs=research_unit_additional_kwargs(observation)
+            ))
+        
+        # Aggregate raw notes from all successful research results
+        raw_notes_concat = "\n".join([
+            "\n".join(observation.get("raw_notes", [])) 
+            for observation in tool_results
+            if not isinstance(observation, BaseException)
+        ])
+        
+        if raw_notes_concat:
+            update_payload["raw_notes"] = [raw_notes_concat]
     
     # Step 3: Return command with all tool results
     update_payload["supervisor_messages"] = all_tool_messages
@@ -362,6 +604,44 @@ supervisor_builder.add_edge(START, "supervisor")  # Entry point to supervisor
 # Compile supervisor subgraph for use in main workflow
 supervisor_subgraph = supervisor_builder.compile()
 
+async def research_supervisor(state: AgentState, config: RunnableConfig):
+    """Run the supervisor subgraph, owning the research unit pool of the pipelined mode.
+    
+    In-flight research units only exist in this process, so their pool is opened here and
+    cancelled when the supervisor exits, whether it finished, failed or was cancelled.
+    The run's identity is pinned in the config passed down, so every research unit, tool
+    call and search of this run shares the run-scoped concurrency limits.
+    
+    Args:
+        state: Current agent state with the research brief and supervisor messages
+        config: Runtime configuration with supervisor settings
+        
+    Returns:
+        Dictionary with the supervisor's notes, raw notes and messages
+    """
+    config = with_run_scope(config)
+    configurable = Configuration.from_runnable_config(config)
+    supervisor_input = {
+        "supervisor_messages": state.get("supervisor_messages", []),
+        "research_brief": state.get("research_brief", "")
+    }
+    research_pool_id = None
+    if configurable.pipelined_supervisor:
+        research_pool_id = open_research_unit_pool(configurable.max_concurrent_research_units)
+        supervisor_input["research_pool_id"] = research_pool_id
+    
+    try:
+        supervisor_output = await supervisor_subgraph.ainvoke(supervisor_input, config)
+    finally:
+        if research_pool_id:
+            release_research_unit_pool(research_pool_id)
+    
+    return {
+        key: supervisor_output[key]
+        for key in ("supervisor_messages", "research_brief", "notes", "raw_notes")
+        if key in supervisor_output
+    }
+
 async def researcher(state: ResearcherState, config: RunnableConfig) -> Command[Literal["researcher_tools"]]:
     """Individual researcher that conducts focused research on specific topics.
     
@@ -378,9 +658,11 @@ async def researcher(state: ResearcherState, config: RunnableConfig) -> Command[
     """
     # Step 1: Load configuration and validate tool availability
     configurable = Configuration.from_runnable_config(config)
+    await load_tokenizers(configurable)
     researcher_messages = state.get("researcher_messages", [])
     
-    # Get all available research tools (search, MCP, think_tool)
+    # Get all available research tools (search, MCP, think_tool) from the shared tool
+    # registry, so the toolkit and its model binding are reused across iterations
     tools = await get_all_tools(config)
     if len(tools) == 0:
         raise ValueError(
@@ -396,43 +678,54 @@ async def researcher(state: ResearcherState, config: RunnableConfig) -> Command[
         "tags": ["langsmith:nostream"]
     }
     
-    # Prepare system prompt with MCP context if available
+    # Prepare system prompt with MCP context if available; the date is pinned for the
+    # whole research run so the system prompt stays a stable, cacheable prefix
+    research_date = state.get("research_date") or get_today_str()
     researcher_prompt = research_system_prompt.format(
         mcp_prompt=configurable.mcp_prompt or "", 
-        date=get_today_str()
+        date=research_date
     )
     
-    # Configure model with tools, retry logic, and settings
-    research_model = (
-        configurable_model
-        .bind_tools(tools)
-        .with_retry(stop_after_attempt=configurable.max_structured_output_retries)
-        .with_config(research_model_config)
+    # Reuse the cached model with tools, retry logic, and settings
+    research_model = get_chat_model(
+        research_model_config,
+        tools=tools,
+        max_retries=configurable.max_structured_output_retries
     )
     
     # Step 3: Generate researcher response with system context
-    messages = [SystemMessage(content=researcher_prompt)] + researcher_messages
+    messages = fit_messages_to_token_budget(
+        [SystemMessage(content=researcher_prompt)] + researcher_messages,
+        configurable.research_model,
+        get_prompt_token_budget(configurable.research_model, configurable.research_model_max_tokens)
+    )
+    if configurable.prompt_caching:
+        messages = apply_prompt_cache_breakpoints(messages, configurable.research_model)
+    await acquire_model_rate_limit(configurable, configurable.research_model, messages)
     response = await research_model.ainvoke(messages)
+    prompt_cache_stats.record("researcher", response)
     
     # Step 4: Update state and proceed to tool execution
     return Command(
         goto="researcher_tools",
         update={
             "researcher_messages": [response],
+            "research_date": research_date,
             "tool_call_iterations": state.get("tool_call_iterations", 0) + 1
         }
     )
 
 # Tool Execution Helper Function
 async def execute_tool_safely(tool, args, config):
-    """Safely execute a tool with error handling."""
+    """Safely execute a tool with error handling, within the run and process tool call pools."""
     try:
-        return await tool.ainvoke(args, config)
+        async with concurrency_slot("tool_calls", config):
+            return await tool.ainvoke(args, config)
     except Exception as e:
         return f"Error executing tool: {str(e)}"
 
 
-async def researcher_tools(state: ResearcherState, config: RunnableConfig) -> Command[Literal["researcher", "compress_research"]]:
+async def researcher_tools(state: ResearcherState, config: RunnableConfig) -> Command[Literal["researcher", "compact_research", "compress_research"]]:
     """Execute tools called by the researcher, including search tools and strategic thinking.
     
     This function handles various types of researcher tool calls:
@@ -463,12 +756,8 @@ async def researcher_tools(state: ResearcherState, config: RunnableConfig) -> Co
     if not has_tool_calls and not has_native_search:
         return Command(goto="compress_research")
     
-    # Step 2: Handle other tool calls (search, MCP tools, etc.)
-    tools = await get_all_tools(config)
-    tools_by_name = {
-        tool.name if hasattr(tool, "name") else tool.get("name", "web_search"): tool 
-        for tool in tools
-    }
+    # Step 2: Handle other tool calls (search, MCP tools, etc.) with the cached toolkit
+    tools_by_name = await get_tools_by_name(config)
     
     # Execute all tool calls in parallel
     tool_calls = most_recent_message.tool_calls
@@ -502,12 +791,122 @@ async def researcher_tools(state: ResearcherState, config: RunnableConfig) -> Co
             update={"researcher_messages": tool_outputs}
         )
     
-    # Continue research loop with tool results
+    # Continue research loop with tool results, compacting the transcript first once it
+    # crosses the token watermark
+    watermark = configurable.researcher_compaction_token_watermark
+    needs_compaction = watermark > 0 and count_message_tokens(
+        researcher_messages + tool_outputs, configurable.research_model
+    ) > watermark
+    update = {"researcher_messages": tool_outputs}
+    
+    # In incremental mode, fold this step into the running notes in a background task, so
+    # the next iteration does not wait for the compression model
+    if configurable.incremental_compression:
+        rolling_compression_id = state.get("rolling_compression_id") or str(uuid.uuid4())
+        research_topic = state.get("research_topic", "")
+        get_rolling_compression(rolling_compression_id).fold(
+            researcher_messages + tool_outputs,
+            lambda notes, new_messages: fold_research_step(research_topic, notes, new_messages, config)
+        )
+        update["rolling_compression_id"] = rolling_compression_id
+    
+    return Command(
+        goto="compact_research" if needs_compaction else "researcher",
+        update=update
+    )
+
+async def compact_research(state: ResearcherState, config: RunnableConfig) -> Command[Literal["researcher"]]:
+    """Collapse older tool results into compact digests to bound the researcher's prompt size.
+    
+    Tool results of all but the most recent turns are replaced by the passages most
+    relevant to the research topic, while the full text moves to raw_notes so nothing
+    is lost for the final report.
+    
+    Args:
+        state: Current researcher state with a transcript above the compaction watermark
+        config: Runtime configuration with compaction settings
+        
+    Returns:
+        Command to continue the research loop with the compacted transcript
+    """
+    configurable = Configuration.from_runnable_config(config)
+    researcher_messages, full_texts = compact_tool_messages(
+        state.get("researcher_messages", []),
+        query=state.get("research_topic", ""),
+        keep_recent_turns=configurable.researcher_compaction_keep_recent_turns,
+        digest_chars=configurable.researcher_compaction_digest_chars
+    )
+    if not full_texts:
+        return Command(goto="researcher")
+    
     return Command(
         goto="researcher",
-        update={"researcher_messages": tool_outputs}
+        update={
+            "researcher_messages": {"type": "override", "value": researcher_messages},
+            "raw_notes": full_texts
+        }
     )
 
+async def fold_research_step(
+    research_topic: str,
+    compressed_research: str,
+    new_messages: list,
+    config: RunnableConfig
+) -> str:
+    """Fold newly gathered researcher messages into running compressed notes.
+    
+    Args:
+        research_topic: Topic the researcher is investigating
+        compressed_research: Cleaned findings folded so far, empty for the first step
+        new_messages: Researcher messages not yet reflected in the compressed notes
+        config: Runtime configuration with compression model settings
+        
+    Returns:
+        Updated compressed notes covering the earlier notes and the new messages
+    """
+    configurable = Configuration.from_runnable_config(config)
+    synthesizer_model = get_chat_model({
+        "model": configurable.compression_model,
+        "max_tokens": configurable.compression_model_max_tokens,
+        "api_key": get_api_key_for_model(configurable.compression_model, config),
+        "tags": ["langsmith:nostream"]
+    })
+    
+    # Render the step's tool calls and their results as plain text
+    new_findings = "\n\n".join(
+        "\n".join(
+            [str(message.content)] + [
+                f"Called {tool_call['name']} with {tool_call['args']}"
+                for tool_call in getattr(message, "tool_calls", None) or []
+            ]
+        ).strip()
+        for message in filter_messages(new_messages, include_types=["tool", "ai"])
+    )
+    
+    # Budget the new findings so the fold fits the compression model on the first attempt
+    compression_prompt = SystemMessage(content=compress_research_system_prompt.format(date=get_today_str()))
+    prompt_values = {
+        "research_topic": research_topic,
+        "compressed_research": compressed_research or "None yet."
+    }
+    prompt_token_budget = get_prompt_token_budget(
+        configurable.compression_model, configurable.compression_model_max_tokens
+    )
+    if prompt_token_budget is not None:
+        prompt_token_budget -= count_message_tokens([
+            compression_prompt,
+            HumanMessage(content=compress_research_incremental_human_message.format(new_findings="", **prompt_values))
+        ], configurable.compression_model)
+        new_findings = fit_text_to_token_budget(new_findings, configurable.compression_model, max(0, prompt_token_budget))
+    
+    messages = [
+        compression_prompt,
+        HumanMessage(content=compress_research_incremental_human_message.format(new_findings=new_findings, **prompt_values))
+    ]
+    await acquire_model_rate_limit(configurable, configurable.compression_model, messages)
+    response = await synthesizer_model.ainvoke(messages)
+    return str(response.content)
+
 async def compress_research(state: ResearcherState, config: RunnableConfig):
     """Compress and synthesize research findings into a concise, structured summary.
     
@@ -524,7 +923,7 @@ async def compress_research(state: ResearcherState, config: RunnableConfig):
     """
     # Step 1: Configure the compression model
     configurable = Configuration.from_runnable_config(config)
-    synthesizer_model = configurable_model.with_config({
+    synthesizer_model = get_chat_model({
         "model": configurable.compression_model,
         "max_tokens": configurable.compression_model_max_tokens,
         "api_key": get_api_key_for_model(configurable.compression_model, config),
@@ -534,8 +933,54 @@ async def compress_research(state: ResearcherState, config: RunnableConfig):
     # Step 2: Prepare messages for compression
     researcher_messages = state.get("researcher_messages", [])
     
-    # Add instruction to switch from research mode to compression mode
-    researcher_messages.append(HumanMessage(content=compress_research_simple_human_message))
+    # Extract raw notes from all tool and AI messages before any trimming; compacted
+    # tool results already have their full text in raw_notes
+    raw_notes_content = "\n".join([
+        str(message.content) 
+        for message in filter_messages(researcher_messages, include_types=["tool", "ai"])
+        if not is_compacted(message)
+    ])
+    
+    # In incremental mode, wait for the background folds and merge only the steps they
+    # do not cover yet
+    rolling_compression_id = state.get("rolling_compression_id")
+    rolling_compression = pop_rolling_compression(rolling_compression_id) if rolling_compression_id else None
+    rolling_compressed_research, rolling_compressed_through = (
+        await rolling_compression.result() if rolling_compression else ("", 0)
+    )
+    if configurable.incremental_compression and rolling_compressed_research:
+        new_messages = researcher_messages[rolling_compressed_through:]
+        if not any(message.type == "tool" for message in new_messages):
+            return {
+                "compressed_research": rolling_compressed_research,
+                "raw_notes": [raw_notes_content]
+            }
+        try:
+            return {
+                "compressed_research": await fold_research_step(
+                    state.get("research_topic", ""), rolling_compressed_research, new_messages, config
+                ),
+                "raw_notes": [raw_notes_content]
+            }
+        except Exception as e:
+            logging.warning(f"Merging the last research step failed, compressing the full transcript: {e}")
+    
+    # Create system prompt focused on compression task, plus the instruction to switch
+    # from research mode to compression mode
+    compression_prompt = SystemMessage(content=compress_research_system_prompt.format(date=get_today_str()))
+    compression_instruction = HumanMessage(content=compress_research_simple_human_message)
+    
+    # Budget the transcript locally so it fits the compression model on the first attempt
+    prompt_token_budget = get_prompt_token_budget(
+        configurable.compression_model, configurable.compression_model_max_tokens
+    )
+    if prompt_token_budget is not None:
+        prompt_token_budget -= count_message_tokens(
+            [compression_prompt, compression_instruction], configurable.compression_model
+        )
+    researcher_messages = fit_messages_to_token_budget(
+        researcher_messages, configurable.compression_model, prompt_token_budget
+    )
     
     # Step 3: Attempt compression with retry logic for token limit issues
     synthesis_attempts = 0
@@ -543,19 +988,12 @@ async def compress_research(state: ResearcherState, config: RunnableConfig):
     
     while synthesis_attempts < max_attempts:
         try:
-            # Create system prompt focused on compression task
-            compression_prompt = compress_research_system_prompt.format(date=get_today_str())
-            messages = [SystemMessage(content=compression_prompt)] + researcher_messages
+            messages = [compression_prompt] + researcher_messages + [compression_instruction]
             
             # Execute compression
+            await acquire_model_rate_limit(configurable, configurable.compression_model, messages)
             response = await synthesizer_model.ainvoke(messages)
             
-            # Extract raw notes from all tool and AI messages
-            raw_notes_content = "\n".join([
-                str(message.content) 
-                for message in filter_messages(researcher_messages, include_types=["tool", "ai"])
-            ])
-            
             # Return successful compression result
             return {
                 "compressed_research": str(response.content),
@@ -566,7 +1004,7 @@ async def compress_research(state: ResearcherState, config: RunnableConfig):
             synthesis_attempts += 1
             
             # Handle token limit exceeded by removing older messages
-            if is_token_limit_exceeded(e, configurable.research_model):
+            if is_token_limit_exceeded(e, configurable.compression_model):
                 researcher_messages = remove_up_to_last_ai_message(researcher_messages)
                 continue
             
@@ -574,11 +1012,6 @@ async def compress_research(state: ResearcherState, config: RunnableConfig):
             continue
     
     # Step 4: Return error result if all attempts failed
-    raw_notes_content = "\n".join([
-        str(message.content) 
-        for message in filter_messages(researcher_messages, include_types=["tool", "ai"])
-    ])
-    
     return {
         "compressed_research": "Error synthesizing research report: Maximum retries exceeded",
         "raw_notes": [raw_notes_content]
@@ -595,6 +1028,7 @@ researcher_builder = StateGraph(
 # Add researcher nodes for research execution and compression
 researcher_builder.add_node("researcher", researcher)                 # Main researcher logic
 researcher_builder.add_node("researcher_tools", researcher_tools)     # Tool execution handler
+researcher_builder.add_node("compact_research", compact_research)     # Transcript compaction
 researcher_builder.add_node("compress_research", compress_research)   # Research compression
 
 # Define researcher workflow edges
@@ -604,6 +1038,87 @@ researcher_builder.add_edge("compress_research", END)      # Exit point after co
 # Compile researcher subgraph for parallel execution by supervisor
 researcher_subgraph = researcher_builder.compile()
 
+async def draft_report_sections(
+    notes: list[str],
+    research_brief: str,
+    findings_token_limit: int | None,
+    config: RunnableConfig
+) -> str:
+    """Draft report sections from clusters of notes concurrently, then merge the drafts.
+    
+    Notes are packed into clusters of at most report_section_max_tokens, and each cluster
+    is drafted into report sections with at most max_concurrent_report_sections calls in
+    flight. Drafts are then merged in groups according to report_merge_strategy until
+    they fit the final merge pass.
+    
+    Args:
+        notes: Compressed research notes from all research units
+        research_brief: Research brief the report answers
+        findings_token_limit: Tokens available for findings in the final merge pass, if known
+        config: Runtime configuration with report model settings
+        
+    Returns:
+        Section drafts that the final report generation call merges into the report
+    """
+    configurable = Configuration.from_runnable_config(config)
+    model_name = configurable.final_report_model
+    writer_model = get_chat_model({
+        "model": model_name,
+        "max_tokens": configurable.final_report_model_max_tokens,
+        "api_key": get_api_key_for_model(model_name, config),
+        "tags": ["langsmith:nostream"]
+    })
+    section_semaphore = asyncio.Semaphore(configurable.max_concurrent_report_sections)
+    
+    async def write_section(prompt: str, findings: str) -> str:
+        report_messages = [HumanMessage(content=prompt)]
+        async with section_semaphore:
+            try:
+                await acquire_model_rate_limit(configurable, model_name, report_messages)
+                response = await writer_model.ainvoke(report_messages)
+                return str(response.content)
+            except Exception as e:
+                # Keep the findings themselves so a failed draft never drops research
+                logging.warning(f"Drafting a report section failed, keeping its findings: {e}")
+                return findings
+    
+    async def draft_section(findings: str) -> str:
+        return await write_section(report_section_draft_prompt.format(
+            research_brief=research_brief,
+            findings=findings,
+            date=get_today_str()
+        ), findings)
+    
+    async def merge_drafts(drafts: str) -> str:
+        return await write_section(report_section_merge_prompt.format(
+            research_brief=research_brief,
+            drafts=drafts,
+            date=get_today_str()
+        ), drafts)
+    
+    # Map: draft a section from each cluster of notes in parallel
+    drafts = await asyncio.gather(*[
+        draft_section(cluster)
+        for cluster in cluster_notes(notes, model_name, configurable.report_section_max_tokens)
+    ])
+    
+    # Reduce: merge groups of drafts until they fit the final merge pass, or down to a
+    # single draft for the hierarchical strategy
+    def drafts_fit() -> bool:
+        return findings_token_limit is None or count_text_tokens(
+            "\n\n".join(drafts), model_name
+        ) <= findings_token_limit
+    
+    while len(drafts) > 1 and (
+        configurable.report_merge_strategy == ReportMergeStrategy.HIERARCHICAL or not drafts_fit()
+    ):
+        groups = cluster_notes(drafts, model_name, configurable.report_section_max_tokens)
+        if len(groups) >= len(drafts):
+            groups = ["\n\n".join(drafts[index:index + 2]) for index in range(0, len(drafts), 2)]
+        drafts = await asyncio.gather(*[merge_drafts(group) for group in groups])
+    
+    return "\n\n".join(drafts)
+
 async def final_report_generation(state: AgentState, config: RunnableConfig):
     """Generate the final comprehensive research report with retry logic for token limits.
     
@@ -631,25 +1146,45 @@ async def final_report_generation(state: AgentState, config: RunnableConfig):
         "tags": ["langsmith:nostream"]
     }
     
-    # Step 3: Attempt report generation with token limit retry logic
+    # Step 3: Budget the findings locally so the prompt fits on the first attempt
+    prompt_values = {
+        "research_brief": state.get("research_brief", ""),
+        "messages": get_buffer_string(state.get("messages", [])),
+        "date": get_today_str()
+    }
+    findings_token_limit = get_prompt_token_budget(
+        configurable.final_report_model, configurable.final_report_model_max_tokens
+    )
+    if findings_token_limit is not None:
+        findings_token_limit = max(0, findings_token_limit - count_message_tokens(
+            [HumanMessage(content=final_report_generation_prompt.format(findings="", **prompt_values))],
+            configurable.final_report_model
+        ))
+    
+    # Draft large finding sets section by section in parallel, so the final call only
+    # merges the drafts instead of truncating late research units
+    map_reduce_threshold = configurable.report_map_reduce_threshold
+    if map_reduce_threshold > 0 and count_text_tokens(findings, configurable.final_report_model) > map_reduce_threshold:
+        findings = await draft_report_sections(
+            notes, state.get("research_brief", ""), findings_token_limit, config
+        )
+    
+    if findings_token_limit is not None:
+        findings = fit_text_to_token_budget(findings, configurable.final_report_model, findings_token_limit)
+    
+    # Step 4: Attempt report generation with token limit retry logic
     max_retries = 3
     current_retry = 0
-    findings_token_limit = None
     
     while current_retry <= max_retries:
         try:
             # Create comprehensive prompt with all research context
-            final_report_prompt = final_report_generation_prompt.format(
-                research_brief=state.get("research_brief", ""),
-                messages=get_buffer_string(state.get("messages", [])),
-                findings=findings,
-                date=get_today_str()
-            )
+            final_report_prompt = final_report_generation_prompt.format(findings=findings, **prompt_values)
             
             # Generate the final report
-            final_report = await configurable_model.with_config(writer_model_config).ainvoke([
-                HumanMessage(content=final_report_prompt)
-            ])
+            report_messages = [HumanMessage(content=final_report_prompt)]
+            await acquire_model_rate_limit(configurable, configurable.final_report_model, report_messages)
+            final_report = await get_chat_model(writer_model_config).ainvoke(report_messages)
             
             # Return successful report generation
             return {
@@ -663,23 +1198,16 @@ async def final_report_generation(state: AgentState, config: RunnableConfig):
             if is_token_limit_exceeded(e, configurable.final_report_model):
                 current_retry += 1
                 
-                if current_retry == 1:
-                    # First retry: determine initial truncation limit
-                    model_token_limit = get_model_token_limit(configurable.final_report_model)
-                    if not model_token_limit:
-                        return {
-                            "final_report": f"Error generating final report: Token limit exceeded, however, we could not determine the model's maximum context length. Please update the model map in deep_researcher/utils.py with this information. {e}",
-                            "messages": [AIMessage(content="Report generation failed due to token limits")],
-                            **cleared_state
-                        }
-                    # Use 4x token limit as character approximation for truncation
-                    findings_token_limit = model_token_limit * 4
-                else:
-                    # Subsequent retries: reduce by 10% each time
-                    findings_token_limit = int(findings_token_limit * 0.9)
+                if findings_token_limit is None:
+                    return {
+                        "final_report": f"Error generating final report: Token limit exceeded, however, we could not determine the model's maximum context length. Please update the model map in deep_researcher/utils.py with this information. {e}",
+                        "messages": [AIMessage(content="Report generation failed due to token limits")],
+                        **cleared_state
+                    }
                 
-                # Truncate findings and retry
-                findings = findings[:findings_token_limit]
+                # The provider counted more tokens than the local estimate; shrink by 10% and retry
+                findings_token_limit = int(findings_token_limit * 0.9)
+                findings = fit_text_to_token_budget(findings, configurable.final_report_model, findings_token_limit)
                 continue
             else:
                 # Non-token-limit error: return error immediately
@@ -689,7 +1217,7 @@ async def final_report_generation(state: AgentState, config: RunnableConfig):
                     **cleared_state
                 }
     
-    # Step 4: Return failure result if all retries exhausted
+    # Step 5: Return failure result if all retries exhausted
     return {
         "final_report": "Error generating final report: Maximum retries exceeded",
         "messages": [AIMessage(content="Report generation failed after maximum retries")],
@@ -707,7 +1235,7 @@ deep_researcher_builder = StateGraph(
 # Add main workflow nodes for the complete research process
 deep_researcher_builder.add_node("clarify_with_user", clarify_with_user)           # User clarification phase
 deep_researcher_builder.add_node("write_research_brief", write_research_brief)     # Research planning phase
-deep_researcher_builder.add_node("research_supervisor", supervisor_subgraph)       # Research execution phase
+deep_researcher_builder.add_node("research_supervisor", research_supervisor)       # Research execution phase
 deep_researcher_builder.add_node("final_report_generation", final_report_generation)  # Report generation phase
 
 # Define main workflow edges for sequential execution
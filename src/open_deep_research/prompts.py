@@ -225,6 +225,24 @@ compress_research_simple_human_message = """All above messages are about researc
 
 DO NOT summarize the information. I want the raw information returned, just in a cleaner format. Make sure all relevant information is preserved - you can rewrite findings verbatim."""
 
+compress_research_incremental_human_message = """Research on the topic below is still in progress. You have already cleaned up the earlier findings into the notes below, and the researcher has since gathered new findings from tool calls and web searches.
+
+<Research Topic>
+{research_topic}
+</Research Topic>
+
+<Cleaned Findings So Far>
+{compressed_research}
+</Cleaned Findings So Far>
+
+<New Findings>
+{new_findings}
+</New Findings>
+
+Fold the new findings into the cleaned findings and return the complete, updated notes in the required output format. Keep everything from the cleaned findings so far, add all relevant new information and sources, and renumber citations so they stay sequential.
+
+DO NOT summarize the information. I want the raw information returned, just in a cleaner format. Make sure all relevant information is preserved - you can rewrite findings verbatim."""
+
 final_report_generation_prompt = """Based on all the research conducted, create a comprehensive, well-structured answer to the overall research brief:
 <Research Brief>
 {research_brief}
@@ -308,6 +326,49 @@ Format the report in clear markdown with proper structure and include source ref
 """
 
 
+report_section_draft_prompt = """You are drafting part of a research report. The full set of research findings is too large to write up in one pass, so it has been split into parts, and you are given one part. Your draft will later be merged with drafts of the other parts into the final report.
+
+<Research Brief>
+{research_brief}
+</Research Brief>
+
+Today's date is {date}.
+
+Here is the part of the research findings you are responsible for:
+<Findings>
+{findings}
+</Findings>
+
+Please write report sections that cover these findings:
+1. Use ## for section titles and ### for subsections (Markdown format)
+2. Include ALL specific facts, figures and insights from the findings that are relevant to the research brief. Do not drop information, since the merge step only sees your draft
+3. Cite sources inline with numbered citations, and end with a ### Sources section listing each source as [n] Source Title: URL
+4. Do not write an introduction or conclusion for the whole report, and do not refer to the other parts
+5. Do not refer to yourself or say what you are doing. Just write the sections
+"""
+
+report_section_merge_prompt = """You are consolidating drafts of a research report. Each draft below was written from a different part of the research findings, and together they are too long to merge into the final report in one pass. Your consolidated draft will later be merged with other consolidated drafts into the final report.
+
+<Research Brief>
+{research_brief}
+</Research Brief>
+
+Today's date is {date}.
+
+Here are the drafts you are responsible for consolidating:
+<Drafts>
+{drafts}
+</Drafts>
+
+Please combine these drafts into a single set of report sections:
+1. Use ## for section titles and ### for subsections (Markdown format)
+2. Merge sections that cover the same subject under one heading instead of repeating headings, and remove statements that repeat each other
+3. Keep ALL specific facts, figures and insights from the drafts. Do not summarize or shorten them, since the next merge step only sees your consolidated draft
+4. Renumber citations so each source has one number across the consolidated draft, and end with a single ### Sources section listing each source once as [n] Source Title: URL
+5. Do not write an introduction or conclusion for the whole report, and do not refer to the other drafts
+6. Do not refer to yourself or say what you are doing. Just write the sections
+"""
+
 summarize_webpage_prompt = """You are tasked with summarizing the raw content of a webpage retrieved from a web search. Your goal is to create a summary that preserves the most important information from the original web page. This summary will be used by a downstream research agent, so it's crucial to maintain the key details without losing essential information.
 
 Here is the raw content of the webpage:
@@ -365,4 +426,29 @@ Example 2 (for a scientific article):
 Remember, your goal is to create a summary that can be easily understood and utilized by a downstream research agent while preserving the most critical information from the original webpage.
 
 Today's date is {date}.
-"""
\ No newline at end of file
+"""
+
+summarize_webpages_batch_prompt = """You are tasked with summarizing the raw content of several webpages retrieved from a web search. Your goal is to create, for each webpage independently, a summary that preserves the most important information from that page. These summaries will be used by a downstream research agent, so it's crucial to maintain the key details without losing essential information.
+
+Here are the webpages, each wrapped in a numbered <webpage> tag:
+
+{webpages}
+
+Please follow these guidelines for every summary:
+
+1. Identify and preserve the main topic or purpose of the webpage.
+2. Retain key facts, statistics, and data points that are central to the content's message.
+3. Keep important quotes from credible sources or experts.
+4. Maintain the chronological order of events if the content is time-sensitive or historical.
+5. Preserve any lists or step-by-step instructions if present.
+6. Include relevant dates, names, and locations that are crucial to understanding the content.
+7. Summarize lengthy explanations while keeping the core message intact.
+
+Summarize each webpage only from its own content. Never merge information across webpages, even if they cover the same topic.
+
+Each summary should be significantly shorter than its webpage but comprehensive enough to stand alone as a source of information. Aim for about 25-30 percent of the original length, unless the content is already concise. Include up to 5 key excerpts per webpage.
+
+Return exactly {count} summaries, one per webpage, in the same order as the webpages are numbered. Each entry has a "summary" field and a "key_excerpts" field.
+
+Today's date is {date}.
+"""
@@ -27,6 +27,11 @@ class Summary(BaseModel):
     summary: str
     key_excerpts: str
 
+class Summaries(BaseModel):
+    """Research summaries for a batch of webpages, in the order they were given."""
+    
+    summaries: list[Summary]
+
 class ClarifyWithUser(BaseModel):
     """Model for user clarification requests."""
     
@@ -79,14 +84,18 @@ class SupervisorState(TypedDict):
     notes: Annotated[list[str], override_reducer] = []
     research_iterations: int = 0
     raw_notes: Annotated[list[str], override_reducer] = []
+    research_pool_id: Optional[str]
+    research_units_dispatched: int = 0
 
 class ResearcherState(TypedDict):
     """State for individual researchers conducting research."""
     
-    researcher_messages: Annotated[list[MessageLikeRepresentation], operator.add]
+    researcher_messages: Annotated[list[MessageLikeRepresentation], override_reducer]
     tool_call_iterations: int = 0
     research_topic: str
+    research_date: Optional[str]
     compressed_research: str
+    rolling_compression_id: Optional[str]
     raw_notes: Annotated[list[str], override_reducer] = []
 
 class ResearcherOutputState(BaseModel):
@@ -1,20 +1,46 @@
 """Utility functions and helpers for the Deep Research agent."""
 
 import asyncio
+import hashlib
+import heapq
+import json
 import logging
+import math
 import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
 import warnings
+import weakref
+import zlib
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager, nullcontext
 from datetime import datetime, timedelta, timezone
-from typing import Annotated, Any, Dict, List, Literal, Optional
+from typing import (
+    Annotated,
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+)
 
 import aiohttp
+import httpx
+import tiktoken
 from langchain.chat_models import init_chat_model
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import (
     AIMessage,
     HumanMessage,
     MessageLikeRepresentation,
-    filter_messages,
 )
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import (
@@ -24,14 +50,18 @@ from langchain_core.tools import (
     ToolException,
     tool,
 )
-from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.sessions import Connection, create_session
+from langchain_mcp_adapters.tools import load_mcp_tools as load_session_mcp_tools
 from langgraph.config import get_store
-from mcp import McpError
+from mcp import ClientSession, McpError
 from tavily import AsyncTavilyClient
 
 from open_deep_research.configuration import Configuration, SearchAPI
-from open_deep_research.prompts import summarize_webpage_prompt
-from open_deep_research.state import ResearchComplete, Summary
+from open_deep_research.prompts import (
+    summarize_webpage_prompt,
+    summarize_webpages_batch_prompt,
+)
+from open_deep_research.state import ResearchComplete, Summaries, Summary
 
 ##########################
 # Tavily Search Tool Utils
@@ -58,78 +88,185 @@ async def tavily_search(
     Returns:
         Formatted string containing summarized search results
     """
-    # Step 1: Execute search queries asynchronously
-    search_results = await tavily_search_async(
-        queries,
-        max_results=max_results,
-        topic=topic,
-        include_raw_content=True,
-        config=config
-    )
-    
-    # Step 2: Deduplicate results by URL to avoid processing the same content multiple times
-    unique_results = {}
-    for response in search_results:
-        for result in response['results']:
-            url = result['url']
-            if url not in unique_results:
-                unique_results[url] = {**result, "query": response['query']}
-    
-    # Step 3: Set up the summarization model with configuration
+    # Step 1: Set up the summarization model with configuration
     configurable = Configuration.from_runnable_config(config)
     
     # Character limit to stay within model token limits (configurable)
     max_char_to_include = configurable.max_content_length
     
-    # Initialize summarization model with retry logic
-    model_api_key = get_api_key_for_model(configurable.summarization_model, config)
-    summarization_model = init_chat_model(
-        model=configurable.summarization_model,
-        max_tokens=configurable.summarization_model_max_tokens,
-        api_key=model_api_key,
-        tags=["langsmith:nostream"]
-    ).with_structured_output(Summary).with_retry(
-        stop_after_attempt=configurable.max_structured_output_retries
+    # Reuse the cached summarization model with retry logic
+    summarization_model_config = {
+        "model": configurable.summarization_model,
+        "max_tokens": configurable.summarization_model_max_tokens,
+        "api_key": get_api_key_for_model(configurable.summarization_model, config),
+        "tags": ["langsmith:nostream"]
+    }
+    summarization_model = get_chat_model(
+        summarization_model_config,
+        structured_output=Summary,
+        max_retries=configurable.max_structured_output_retries
+    )
+    summary_cache = await get_summary_cache(configurable) if configurable.summary_cache_enabled else None
+    summarization_rate_limiter = get_rate_limiter(configurable, configurable.summarization_model)
+    # Load the tokenizer off the event loop before pages are counted for batching and rate limits
+    await token_counter.aload(configurable.summarization_model)
+    summarization_policy = SummarizationPolicy.from_configuration(configurable)
+    duplicate_detector = (
+        NearDuplicateDetector(configurable.near_duplicate_threshold)
+        if configurable.deduplicate_near_duplicates else None
     )
     
-    # Step 4: Create summarization tasks (skip empty content)
-    async def noop():
-        """No-op function for results without raw content."""
-        return None
-    
-    summarization_tasks = [
-        noop() if not result.get("raw_content") 
-        else summarize_webpage(
-            summarization_model, 
-            result['raw_content'][:max_char_to_include]
+    # Optional batch model that summarizes several mid-sized pages in one call
+    batch_summarization_model = None
+    if configurable.summarization_batch_token_budget > 0:
+        batch_summarization_model = get_chat_model(
+            summarization_model_config,
+            structured_output=Summaries,
+            max_retries=configurable.max_structured_output_retries
         )
-        for result in unique_results.values()
-    ]
     
-    # Step 5: Execute all summarization tasks in parallel
-    summaries = await asyncio.gather(*summarization_tasks)
+    def summarization_slot():
+        """Hold a slot in the run and process summarization pools."""
+        return concurrency_slot("summarizations", config)
+    
+    async def governed_summarization(summarization: Awaitable):
+        """Run a summarization call within the run and process summarization pools."""
+        async with summarization_slot():
+            return await summarization
+    
+    def start_summarization_tasks(pages: Dict[str, str], query: str) -> Dict[str, asyncio.Task]:
+        """Start summarizing new pages, packing mid-sized ones into batches when enabled."""
+        batches = []
+        if batch_summarization_model:
+            batches, pages = pack_summarization_batches(
+                pages,
+                configurable.summarization_batch_token_budget,
+                summarization_policy,
+                model_name=configurable.summarization_model
+            )
+        
+        tasks = {}
+        for batch in batches:
+            # The batch call and each per-page fallback call hold their own slot
+            batch_task = asyncio.create_task(summarize_webpages_batch(
+                summarization_model,
+                batch_summarization_model,
+                list(batch.values()),
+                model_name=configurable.summarization_model,
+                summary_cache=summary_cache,
+                rate_limiter=summarization_rate_limiter,
+                policy=summarization_policy,
+                query=query,
+                slot=summarization_slot
+            ))
+            for position, url in enumerate(batch):
+                tasks[url] = asyncio.create_task(get_batch_item(batch_task, position))
+        for url, page_content in pages.items():
+            tasks[url] = asyncio.create_task(governed_summarization(summarize_webpage(
+                summarization_model, 
+                page_content,
+                model_name=configurable.summarization_model,
+                summary_cache=summary_cache,
+                rate_limiter=summarization_rate_limiter,
+                policy=summarization_policy,
+                query=query
+            )))
+        return tasks
+    
+    # Step 2: Stream search results and start summarizing each new URL as soon as
+    # its query returns, instead of waiting for the slowest query (skip empty content).
+    # Responses are processed in query order, so which copy of a duplicated page is
+    # kept does not depend on which query happened to return first.
+    search_results = [None] * len(queries)
+    summarization_tasks: Dict[str, asyncio.Task] = {}
+    alternate_urls: Dict[str, List[str]] = {}
+    duplicate_urls = set()
+    next_index = 0
+    try:
+        async for index, response in tavily_search_as_completed(
+            queries,
+            max_results=max_results,
+            topic=topic,
+            include_raw_content=True,
+            config=config
+        ):
+            search_results[index] = response
+            while next_index < len(queries) and search_results[next_index] is not None:
+                response = search_results[next_index]
+                next_index += 1
+                new_pages = {}
+                for result in response['results']:
+                    url = result['url']
+                    if (
+                        url in summarization_tasks or url in new_pages or url in duplicate_urls
+                        or not result.get("raw_content")
+                    ):
+                        continue
+                    
+                    # Syndicated or mirrored copies of a page already being summarized
+                    # are listed as alternate URLs of that source instead
+                    if duplicate_detector:
+                        canonical_url = duplicate_detector.match_or_add(
+                            url, result['raw_content'][:max_char_to_include]
+                        )
+                        if canonical_url:
+                            alternate_urls.setdefault(canonical_url, []).append(url)
+                            duplicate_urls.add(url)
+                            continue
+                    
+                    # Fit long pages into the character budget by keeping the passages most
+                    # relevant to the query that found them, rather than the leading prefix
+                    if configurable.content_prefilter:
+                        new_pages[url] = select_relevant_passages(
+                            result['raw_content'], response['query'], max_char_to_include
+                        )
+                    else:
+                        new_pages[url] = result['raw_content'][:max_char_to_include]
+                
+                summarization_tasks.update(start_summarization_tasks(new_pages, response['query']))
+    except BaseException:
+        # A failed search fails the whole tool call; don't leave summaries running
+        for task in summarization_tasks.values():
+            task.cancel()
+        raise
+    
+    # Step 3: Deduplicate results by URL in query order, so the output does not
+    # depend on which query happened to return first
+    unique_results = {}
+    for response in search_results:
+        for result in response['results']:
+            url = result['url']
+            if url not in unique_results:
+                unique_results[url] = {**result, "query": response['query']}
+    
+    # Step 4: Wait for the summaries that are still running
+    summaries = dict(zip(
+        summarization_tasks.keys(),
+        await asyncio.gather(*summarization_tasks.values())
+    ))
     
-    # Step 6: Combine results with their summaries
+    # Step 5: Combine results with their summaries, folding near-duplicates into their source
     summarized_results = {
         url: {
             'title': result['title'], 
-            'content': result['content'] if summary is None else summary
+            'content': result['content'] if summaries.get(url) is None else summaries[url],
+            'alternate_urls': alternate_urls.get(url, [])
         }
-        for url, result, summary in zip(
-            unique_results.keys(), 
-            unique_results.values(), 
-            summaries
-        )
+        for url, result in unique_results.items()
+        if url not in duplicate_urls
     }
     
-    # Step 7: Format the final output
+    # Step 6: Format the final output
     if not summarized_results:
         return "No valid search results found. Please try different search queries or use a different search API."
     
     formatted_output_list = ["Search results: \n\n"]
     for i, (url, result) in enumerate(summarized_results.items()):
         formatted_output_list.append(f"\n\n--- SOURCE {i+1}: {result['title']} ---\n")
-        formatted_output_list.append(f"URL: {url}\n\n")
+        formatted_output_list.append(f"URL: {url}\n")
+        if result['alternate_urls']:
+            formatted_output_list.append(f"ALTERNATE URLS: {', '.join(result['alternate_urls'])}\n")
+        formatted_output_list.append("\n")
         formatted_output_list.append(f"SUMMARY:\n{result['content']}\n\n")
         formatted_output_list.append("\n\n" + "-" * 80 + "\n")
     
@@ -152,69 +289,1504 @@ async def tavily_search_async(
         config: Runtime configuration for API key access
         
     Returns:
-        List of search result dictionaries from Tavily API
+        List of search result dictionaries from Tavily API, in query order
     """
-    # Initialize the Tavily client with API key from config
-    tavily_client = AsyncTavilyClient(api_key=get_tavily_api_key(config))
+    search_results = [None] * len(search_queries)
+    async for index, response in tavily_search_as_completed(
+        search_queries,
+        max_results=max_results,
+        topic=topic,
+        include_raw_content=include_raw_content,
+        config=config
+    ):
+        search_results[index] = response
+    return search_results
+
+async def tavily_search_as_completed(
+    search_queries, 
+    max_results: int = 5, 
+    topic: Literal["general", "news", "finance"] = "general", 
+    include_raw_content: bool = True, 
+    config: RunnableConfig = None
+) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """Execute multiple Tavily search queries concurrently, yielding each response as it arrives.
     
-    # Create search tasks for parallel execution
+    Args:
+        search_queries: List of search query strings to execute
+        max_results: Maximum number of results per query
+        topic: Topic category for filtering results
+        include_raw_content: Whether to include full webpage content
+        config: Runtime configuration for API key access
+        
+    Yields:
+        Tuples of (query index, search result dictionary) in completion order
+    """
+    # Reuse the pooled Tavily client for this API key
+    configurable = Configuration.from_runnable_config(config)
+    tavily_client = get_tavily_client(get_tavily_api_key(config), configurable)
+
+    # Set up the persistent result cache if enabled, and the shared Tavily rate limit
+    search_cache = await get_search_cache(configurable) if configurable.search_cache_enabled else None
+    search_rate_limiter = get_rate_limiter(configurable, "tavily")
+
+    async def fetch_with_cache(query: str, cache_key: str):
+        """Serve a single query from the cache, falling back to the Tavily API."""
+        if search_cache:
+            cached_result = await search_cache.aget(cache_key)
+            if cached_result is not None:
+                return cached_result
+
+        await search_rate_limiter.acquire()
+        async with concurrency_slot("search_requests", config):
+            result = await tavily_client.search(
+                query,
+                max_results=max_results,
+                include_raw_content=include_raw_content,
+                topic=topic
+            )
+
+        if search_cache:
+            await search_cache.aset(cache_key, result)
+        return result
+
+    async def search_query(index: int, query: str):
+        """Execute a query, sharing the request with identical queries already in flight."""
+        cache_key = make_search_cache_key(query, max_results, topic, include_raw_content)
+        result = await search_flights.do(cache_key, lambda: fetch_with_cache(query, cache_key))
+        # Keep the caller's query string, which may differ in case or spacing
+        return index, {**result, "query": query}
+
+    # Start all queries in parallel and hand results back as they complete
     search_tasks = [
-        tavily_client.search(
-            query,
-            max_results=max_results,
-            include_raw_content=include_raw_content,
-            topic=topic
-        )
-        for query in search_queries
+        asyncio.create_task(search_query(index, query))
+        for index, query in enumerate(search_queries)
     ]
-    
-    # Execute all search queries in parallel and return results
-    search_results = await asyncio.gather(*search_tasks)
-    return search_results
+    try:
+        for next_completed in asyncio.as_completed(search_tasks):
+            yield await next_completed
+    finally:
+        # Cancel outstanding queries if the consumer stops early or a query failed
+        for task in search_tasks:
+            task.cancel()
 
-async def summarize_webpage(model: BaseChatModel, webpage_content: str) -> str:
+async def summarize_webpage(
+    model: BaseChatModel,
+    webpage_content: str,
+    model_name: Optional[str] = None,
+    summary_cache: Optional["SummaryCache"] = None,
+    rate_limiter: Optional["RateLimiter"] = None,
+    policy: Optional["SummarizationPolicy"] = None,
+    query: str = ""
+) -> str:
     """Summarize webpage content using AI model with timeout protection.
     
     Args:
         model: The chat model configured for summarization
         webpage_content: Raw webpage content to be summarized
+        model_name: Name of the summarization model, used to key cached and in-flight summaries
+        summary_cache: Optional cache consulted before and populated after the model call
+        rate_limiter: Optional shared rate limiter acquired before the model call
+        policy: Tier thresholds and adaptive timeout; defaults to default_summarization_policy
+        query: Search query that surfaced the page, used to rank passages for extractive compression
         
     Returns:
         Formatted summary with key excerpts, or original content if summarization fails
     """
-    # Optimization: Skip summarization for short content to save latency and cost
-    if len(webpage_content) < 3000:
-        return f"<summary>\n{webpage_content}\n</summary>"
+    policy = policy or default_summarization_policy
+
+    # Optimization: Pass short pages through and compress mid-sized pages extractively,
+    # reserving the model for long pages to save latency and cost
+    condensed_content = policy.condense_without_model(webpage_content, query)
+    if condensed_content is not None:
+        return condensed_content
+
+    cache_key = make_summary_cache_key(webpage_content, model_name) if model_name else None
+
+    async def summarize_with_cache():
+        """Serve the page from the cache, falling back to the summarization model."""
+        if summary_cache and cache_key:
+            cached_summary = await summary_cache.aget(cache_key)
+            if cached_summary is not None:
+                return format_summary(cached_summary)
+
+        timeout = policy.timeout("llm")
+        try:
+            # Create prompt with current date context
+            prompt_content = summarize_webpage_prompt.format(
+                webpage_content=webpage_content, 
+                date=get_today_str()
+            )
+            messages = [HumanMessage(content=prompt_content)]
+            if rate_limiter:
+                await rate_limiter.acquire(count_message_tokens(messages, model_name or ""))
+            
+            # Execute summarization with a timeout adapted to observed latency to prevent hanging
+            started_at = time.monotonic()
+            summary = await asyncio.wait_for(model.ainvoke(messages), timeout=timeout)
+            policy.stats.record("llm", time.monotonic() - started_at)
+
+            # Only successful summaries are cached; failures fall back to raw content below
+            if summary_cache and cache_key:
+                await summary_cache.aset(cache_key, summary)
+            
+            return format_summary(summary)
+            
+        except asyncio.TimeoutError:
+            # Timeout during summarization - return original content
+            policy.stats.record_timeout("llm", timeout)
+            logging.warning(f"Summarization timed out after {timeout:.1f} seconds, returning original content")
+            return webpage_content
+        except Exception as e:
+            # Other errors during summarization - log and return original content
+            policy.stats.record_failure()
+            logging.warning(f"Summarization failed with error: {str(e)}, returning original content")
+            return webpage_content
 
+    # Coalesce concurrent requests for the same page so it is only summarized once
+    if cache_key:
+        return await summary_flights.do(cache_key, summarize_with_cache)
+    return await summarize_with_cache()
+
+async def summarize_webpages_batch(
+    model: BaseChatModel,
+    batch_model: BaseChatModel,
+    webpage_contents: List[str],
+    model_name: str,
+    summary_cache: Optional["SummaryCache"] = None,
+    rate_limiter: Optional["RateLimiter"] = None,
+    policy: Optional["SummarizationPolicy"] = None,
+    query: str = "",
+    slot: Optional[Callable[[], AsyncContextManager]] = None
+) -> List[str]:
+    """Summarize several webpages with a single structured-output model call.
+    
+    Short and mid-sized pages are condensed without the model and cached pages are
+    served from the cache, as in summarize_webpage. If the batch call fails, times out
+    or returns the wrong number of summaries, the pages are summarized individually instead.
+    
+    Args:
+        model: The per-page summarization model, used as the fallback
+        batch_model: The summarization model with structured output bound to Summaries
+        webpage_contents: Raw content of each webpage
+        model_name: Name of the summarization model, used to key cached summaries
+        summary_cache: Optional cache consulted before and populated after the model call
+        rate_limiter: Optional shared rate limiter acquired before the model call
+        policy: Tier thresholds and adaptive timeout; defaults to default_summarization_policy
+        query: Search query that surfaced the pages, used to rank passages for extractive compression
+        slot: Factory for the concurrency slot held during each model call; the batch call
+            and every per-page fallback call acquire their own
+        
+    Returns:
+        Formatted summary for each webpage, in input order
+    """
+    policy = policy or default_summarization_policy
+    slot = slot or nullcontext
+    results: List[Optional[str]] = [None] * len(webpage_contents)
+    pending = []
+    for index, webpage_content in enumerate(webpage_contents):
+        # Optimization: Skip the model for short and mid-sized content to save latency and cost
+        condensed_content = policy.condense_without_model(webpage_content, query)
+        if condensed_content is not None:
+            results[index] = condensed_content
+            continue
+        if summary_cache:
+            cached_summary = await summary_cache.aget(
+                make_summary_cache_key(webpage_content, model_name)
+            )
+            if cached_summary is not None:
+                results[index] = format_summary(cached_summary)
+                continue
+        pending.append(index)
+    
+    if not pending:
+        return results
+    
     try:
-        # Create prompt with current date context
-        prompt_content = summarize_webpage_prompt.format(
-            webpage_content=webpage_content, 
+        # Number the pages so summaries can be matched back by position
+        webpages = "\n\n".join(
+            f'<webpage index="{position + 1}">\n{webpage_contents[index]}\n</webpage>'
+            for position, index in enumerate(pending)
+        )
+        prompt_content = summarize_webpages_batch_prompt.format(
+            webpages=webpages,
+            count=len(pending),
             date=get_today_str()
         )
+        messages = [HumanMessage(content=prompt_content)]
+        async with slot():
+            if rate_limiter:
+                await rate_limiter.acquire(count_message_tokens(messages, model_name))
+            
+            # Allow twice the per-page timeout, as the output covers several pages
+            timeout = 2 * policy.timeout("llm")
+            started_at = time.monotonic()
+            try:
+                response = await asyncio.wait_for(batch_model.ainvoke(messages), timeout=timeout)
+            except asyncio.TimeoutError:
+                policy.stats.record_timeout("batch", timeout)
+                raise
+        policy.stats.record("batch", time.monotonic() - started_at)
+        if len(response.summaries) != len(pending):
+            raise ValueError(
+                f"expected {len(pending)} summaries, got {len(response.summaries)}"
+            )
         
-        # Execute summarization with timeout to prevent hanging
-        summary = await asyncio.wait_for(
-            model.ainvoke([HumanMessage(content=prompt_content)]),
-            timeout=60.0  # 60 second timeout for summarization
-        )
+        for index, summary in zip(pending, response.summaries):
+            if summary_cache:
+                await summary_cache.aset(
+                    make_summary_cache_key(webpage_contents[index], model_name), summary
+                )
+            results[index] = format_summary(summary)
+    
+    except Exception as e:
+        logging.warning(f"Batch summarization failed with error: {str(e)}, summarizing pages individually")
         
-        # Format the summary with structured sections
-        formatted_summary = (
-            f"<summary>\n{summary.summary}\n</summary>\n\n"
-            f"<key_excerpts>\n{summary.key_excerpts}\n</key_excerpts>"
-        )
+        async def summarize_individually(index: int) -> str:
+            """Summarize one pending page within its own concurrency slot."""
+            async with slot():
+                return await summarize_webpage(
+                    model,
+                    webpage_contents[index],
+                    model_name=model_name,
+                    summary_cache=summary_cache,
+                    rate_limiter=rate_limiter,
+                    policy=policy
+                )
         
-        return formatted_summary
+        fallback_summaries = await asyncio.gather(*[
+            summarize_individually(index) for index in pending
+        ])
+        for index, summary in zip(pending, fallback_summaries):
+            results[index] = summary
+    
+    return results
+
+async def get_batch_item(batch_task: Awaitable[List[str]], position: int) -> str:
+    """Await a batch summarization task and return the summary at the given position."""
+    return (await batch_task)[position]
+
+def pack_summarization_batches(
+    pages: Dict[str, str],
+    token_budget: int,
+    policy: Optional["SummarizationPolicy"] = None,
+    model_name: str = ""
+) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+    """Group mid-sized pages into batches whose input tokens fit the budget.
+    
+    Pages the policy condenses without the model, and pages larger than half the
+    budget, are not batched.
+    
+    Args:
+        pages: Mapping of URL to page content, in discovery order
+        token_budget: Maximum input tokens per batch
+        policy: Tier thresholds deciding which pages need the model; defaults to default_summarization_policy
+        model_name: Name of the summarization model, used to count tokens with its tokenizer
         
-    except asyncio.TimeoutError:
-        # Timeout during summarization - return original content
-        logging.warning("Summarization timed out after 60 seconds, returning original content")
-        return webpage_content
-    except Exception as e:
-        # Other errors during summarization - log and return original content
-        logging.warning(f"Summarization failed with error: {str(e)}, returning original content")
-        return webpage_content
+    Returns:
+        Batches of at least two pages, and the remaining pages to summarize individually
+    """
+    batches: List[Dict[str, str]] = []
+    single_pages: Dict[str, str] = {}
+    current_batch: Dict[str, str] = {}
+    current_tokens = 0
+    policy = policy or default_summarization_policy
+    
+    for url, page_content in pages.items():
+        page_tokens = count_text_tokens(page_content, model_name)
+        if policy.tier(page_content) != "llm" or page_tokens > token_budget // 2:
+            single_pages[url] = page_content
+            continue
+        if current_batch and current_tokens + page_tokens > token_budget:
+            batches.append(current_batch)
+            current_batch, current_tokens = {}, 0
+        current_batch[url] = page_content
+        current_tokens += page_tokens
+    if current_batch:
+        batches.append(current_batch)
+    
+    # A batch of one page gains nothing over a regular per-page call
+    for batch in batches:
+        if len(batch) == 1:
+            single_pages.update(batch)
+    return [batch for batch in batches if len(batch) > 1], single_pages
+
+def format_summary(summary: Summary) -> str:
+    """Format a structured summary with its summary and key excerpt sections."""
+    return (
+        f"<summary>\n{summary.summary}\n</summary>\n\n"
+        f"<key_excerpts>\n{summary.key_excerpts}\n</key_excerpts>"
+    )
+
+##########################
+# Summarization Tier Utils
+##########################
+
+class SummarizationStats:
+    """Per-tier counts and a rolling window of latencies for webpage summarization.
+
+    Tiers are "passthrough", "extractive", "llm" (one model call per page) and
+    "batch" (one model call per batch). The "llm" latency window drives the
+    adaptive summarization timeout.
+    """
+
+    def __init__(self, window_size: int = 200):
+        """Create empty counters keeping the latest window_size latencies per tier."""
+        self.window_size = window_size
+        self.counts: Counter = Counter()
+        self.timeouts = 0
+        self.failures = 0
+        self._latencies: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, tier: str, latency: float) -> None:
+        """Record one page (or batch) handled by a tier and how long it took."""
+        with self._lock:
+            self.counts[tier] += 1
+            if tier not in self._latencies:
+                self._latencies[tier] = deque(maxlen=self.window_size)
+            self._latencies[tier].append(latency)
+
+    def record_timeout(self, tier: str, timeout: float) -> None:
+        """Record a model call cut off by the timeout, counting the timeout as its latency."""
+        self.record(tier, timeout)
+        with self._lock:
+            self.timeouts += 1
+
+    def record_failure(self) -> None:
+        """Record a model call that failed for a reason other than a timeout."""
+        with self._lock:
+            self.failures += 1
+
+    def percentile(self, tier: str, fraction: float) -> Optional[float]:
+        """Return the given percentile (0-1) of recent latencies for a tier, if any were recorded."""
+        with self._lock:
+            latencies = sorted(self._latencies.get(tier, ()))
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+    def sample_count(self, tier: str) -> int:
+        """Return the number of latencies currently in a tier's window."""
+        with self._lock:
+            return len(self._latencies.get(tier, ()))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-tier counts and p50/p95 latencies, plus timeout and failure counts."""
+        tiers = {
+            tier: {
+                "count": count,
+                "p50_seconds": self.percentile(tier, 0.5),
+                "p95_seconds": self.percentile(tier, 0.95),
+            }
+            for tier, count in self.counts.items()
+        }
+        return {"tiers": tiers, "timeouts": self.timeouts, "failures": self.failures}
+
+# Process-wide summarization statistics shared by every researcher in the process
+summarization_stats = SummarizationStats()
+
+def get_summarization_stats() -> Dict[str, Any]:
+    """Return per-tier counts and latencies for webpage summarization."""
+    return summarization_stats.stats()
+
+class SummarizationPolicy:
+    """Choose how a webpage is condensed based on its length.
+
+    Pages shorter than ``passthrough_chars`` are returned unchanged, pages shorter
+    than ``llm_min_chars`` are reduced to their most relevant passages without a
+    model call, and longer pages are summarized by the model. The model timeout
+    follows the observed latency distribution, capped at ``max_timeout``.
+    """
+
+    def __init__(
+        self,
+        passthrough_chars: int = 3000,
+        llm_min_chars: int = 8000,
+        max_timeout: float = 60.0,
+        stats: Optional[SummarizationStats] = None,
+        min_timeout: float = 10.0,
+        timeout_multiplier: float = 3.0,
+        min_samples: int = 20
+    ):
+        """Create a policy.
+
+        Args:
+            passthrough_chars: Length below which pages are passed through unchanged
+            llm_min_chars: Length from which pages are summarized by the model
+            max_timeout: Upper bound on the model timeout, used until enough latencies are observed
+            stats: Statistics to record into; defaults to the process-wide instance
+            min_timeout: Lower bound on the adaptive model timeout
+            timeout_multiplier: Multiple of the observed p95 latency used as the timeout
+            min_samples: Number of observed latencies required before the timeout adapts
+        """
+        self.passthrough_chars = passthrough_chars
+        self.llm_min_chars = max(llm_min_chars, passthrough_chars)
+        self.max_timeout = max_timeout
+        self.stats = stats or summarization_stats
+        self.min_timeout = min(min_timeout, max_timeout)
+        self.timeout_multiplier = timeout_multiplier
+        self.min_samples = min_samples
+
+    @classmethod
+    def from_configuration(cls, configurable: Configuration) -> "SummarizationPolicy":
+        """Build the policy from the summarization settings of a Configuration."""
+        return cls(
+            passthrough_chars=configurable.summarization_passthrough_chars,
+            llm_min_chars=configurable.summarization_llm_min_chars,
+            max_timeout=configurable.summarization_timeout_seconds
+        )
+
+    def tier(self, webpage_content: str) -> Literal["passthrough", "extractive", "llm"]:
+        """Return the tier that handles a page of this length."""
+        if len(webpage_content) < self.passthrough_chars:
+            return "passthrough"
+        if len(webpage_content) < self.llm_min_chars:
+            return "extractive"
+        return "llm"
+
+    def condense_without_model(self, webpage_content: str, query: str = "") -> Optional[str]:
+        """Condense a page in the passthrough or extractive tier, or return None if it needs the model.
+
+        Extractive compression keeps the passages most relevant to the query within
+        the passthrough length; without a query it keeps the leading passages.
+        """
+        started_at = time.monotonic()
+        tier = self.tier(webpage_content)
+        if tier == "llm":
+            return None
+        if tier == "extractive":
+            webpage_content = select_relevant_passages(
+                webpage_content, query, max(self.passthrough_chars, 1)
+            )
+        self.stats.record(tier, time.monotonic() - started_at)
+        return f"<summary>\n{webpage_content}\n</summary>"
+
+    def timeout(self, tier: str = "llm") -> float:
+        """Return the timeout for a model call in a tier, adapted to its observed p95 latency."""
+        if self.stats.sample_count(tier) < self.min_samples:
+            return self.max_timeout
+        p95_latency = self.stats.percentile(tier, 0.95)
+        return min(self.max_timeout, max(self.min_timeout, self.timeout_multiplier * p95_latency))
+
+default_summarization_policy = SummarizationPolicy()
+
+##########################
+# Passage Ranking Utils
+##########################
+
+def split_into_passages(text: str, passage_length: int = 1000) -> List[str]:
+    """Split text into passages of roughly passage_length characters along paragraph breaks.
+
+    Short consecutive paragraphs are merged and overlong ones are split at whitespace,
+    so every passage is a comparable unit for ranking.
+    """
+    passages = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        while len(paragraph) > passage_length:
+            split_at = paragraph.rfind(" ", 0, passage_length)
+            if split_at <= 0:
+                split_at = passage_length
+            passages.append(paragraph[:split_at].strip())
+            paragraph = paragraph[split_at:].strip()
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 2 > passage_length:
+            passages.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        passages.append(current)
+    return passages
+
+def bm25_scores(passages: List[str], query: str, k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """Score each passage against the query with Okapi BM25, using the passages as the corpus.
+
+    Only query terms are ever counted: a single compiled regex extracts them from each
+    passage in C, and passage length is measured in characters. The counts are laid out
+    as one term-frequency column per query term, and scores are accumulated a column at
+    a time against precomputed length norms. Cost is therefore linear in page length
+    with a small constant, which keeps ranking fast across dozens of long pages per search.
+    """
+    query_terms = sorted(set(re.findall(r"\w+", query.lower())))
+    if not query_terms or not passages:
+        return [0.0] * len(passages)
+
+    term_pattern = re.compile(
+        r"\b(?:" + "|".join(re.escape(term) for term in query_terms) + r")\b"
+    )
+    term_counts = [Counter(term_pattern.findall(passage.lower())) for passage in passages]
+    term_frequencies = {
+        term: [counts[term] for counts in term_counts] for term in query_terms
+    }
+
+    passage_lengths = [len(passage) for passage in passages]
+    average_length = (sum(passage_lengths) / len(passage_lengths)) or 1.0
+    length_norms = [k1 * (1 - b + b * length / average_length) for length in passage_lengths]
+
+    total_passages = len(passages)
+    scores = [0.0] * total_passages
+    for frequencies in term_frequencies.values():
+        document_frequency = total_passages - frequencies.count(0)
+        if not document_frequency:
+            continue
+        weight = (k1 + 1) * math.log(
+            1 + (total_passages - document_frequency + 0.5) / (document_frequency + 0.5)
+        )
+        scores = [
+            score + weight * frequency / (frequency + length_norm) if frequency else score
+            for score, frequency, length_norm in zip(scores, frequencies, length_norms)
+        ]
+    return scores
+
+def select_relevant_passages(text: str, query: str, char_budget: int) -> str:
+    """Reduce text to the passages most relevant to the query within a character budget.
+
+    The opening passage (title and lede) is always kept. Remaining passages are
+    added in order of BM25 score while they fit, then reassembled in their original
+    document order. Text that already fits the budget is returned unchanged.
+
+    Args:
+        text: Full page content
+        query: Search query that surfaced the page
+        char_budget: Maximum number of characters to return
+
+    Returns:
+        Selected passages joined by blank lines
+    """
+    if len(text) <= char_budget:
+        return text
+
+    passages = split_into_passages(text)
+    if not passages:
+        return text[:char_budget]
+
+    scores = bm25_scores(passages, query)
+    ranked = sorted(range(1, len(passages)), key=lambda index: (-scores[index], index))
+
+    selected = [0] if len(passages[0]) <= char_budget else []
+    used = len(passages[0]) if selected else 0
+    for index in ranked:
+        passage_size = len(passages[index]) + 2
+        if used + passage_size <= char_budget:
+            selected.append(index)
+            used += passage_size
+
+    if not selected:
+        return text[:char_budget]
+    return "\n\n".join(passages[index] for index in sorted(selected))
+
+##########################
+# Near-Duplicate Detection Utils
+##########################
+
+class NearDuplicateDetector:
+    """Detect near-duplicate documents using bottom-k MinHash sketches.
+
+    Each document is reduced to the ``num_hashes`` smallest hashes of its word
+    shingles. The Jaccard similarity of two documents is estimated from the
+    overlap of their sketches, which is cheap to compute and independent of
+    document length. Hashes use Python's built-in ``hash`` and are therefore only
+    comparable within a single process.
+    """
+
+    def __init__(self, threshold: float, num_hashes: int = 128, shingle_size: int = 5):
+        """Create an empty detector.
+
+        Args:
+            threshold: Estimated Jaccard similarity at or above which documents are duplicates
+            num_hashes: Sketch size; larger sketches give more accurate estimates
+            shingle_size: Number of consecutive words per shingle
+        """
+        self.threshold = threshold
+        self.num_hashes = num_hashes
+        self.shingle_size = shingle_size
+        self._sketches: Dict[str, List[int]] = {}
+
+    def sketch(self, text: str) -> List[int]:
+        """Return the bottom-k MinHash sketch of a text."""
+        words = re.findall(r"\w+", text.lower())
+        shingles = set(zip(*(words[i:] for i in range(self.shingle_size))))
+        return heapq.nsmallest(self.num_hashes, map(hash, shingles))
+
+    def similarity(self, sketch_a: List[int], sketch_b: List[int]) -> float:
+        """Estimate the Jaccard similarity of two documents from their sketches."""
+        if not sketch_a or not sketch_b:
+            return 0.0
+        set_a, set_b = set(sketch_a), set(sketch_b)
+        union_sketch = heapq.nsmallest(self.num_hashes, set_a | set_b)
+        shared = sum(1 for value in union_sketch if value in set_a and value in set_b)
+        return shared / len(union_sketch)
+
+    def match_or_add(self, key: str, text: str) -> Optional[str]:
+        """Return the key of a known near-duplicate of the text, or register the text under key.
+
+        Args:
+            key: Identifier of the document, such as its URL
+            text: Document content
+
+        Returns:
+            Key of the first previously added near-duplicate, or None if the text is new
+        """
+        sketch = self.sketch(text)
+        for existing_key, existing_sketch in self._sketches.items():
+            if self.similarity(sketch, existing_sketch) >= self.threshold:
+                return existing_key
+        self._sketches[key] = sketch
+        return None
+
+##########################
+# Persistent Cache Utils
+##########################
+
+class PersistentCache:
+    """Disk-backed key-value cache with TTL expiry and size-bounded LRU eviction.
+
+    Values are JSON-serialized, zlib-compressed and stored in a SQLite database so
+    that they survive across runs and can be shared between processes. All disk
+    access is synchronous, including opening the database; from async code, obtain
+    instances through get_persistent_cache and use the ``aget``/``aset`` wrappers so
+    the event loop is never blocked on I/O.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_size_bytes: int):
+        """Open (or create) the cache database at the given path.
+
+        Args:
+            path: File path of the SQLite database
+            ttl_seconds: Seconds an entry stays valid after it was written
+            max_size_bytes: Upper bound on the total compressed size of all entries
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)"
+        )
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for a key, or None if it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+
+            # Refresh recency so frequently used entries survive eviction
+            self._connection.execute(
+                "UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a JSON-serializable value and evict least recently used entries if needed."""
+        blob = zlib.compress(json.dumps(value).encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now)
+            )
+            self._evict_expired_and_oldest(now)
+
+    def _evict_expired_and_oldest(self, now: float) -> None:
+        """Drop expired entries, then least recently used ones until under the size bound."""
+        self._connection.execute(
+            "DELETE FROM entries WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        total_size = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+        if total_size <= self.max_size_bytes:
+            return
+
+        for key, size in self._connection.execute(
+            "SELECT key, size FROM entries ORDER BY accessed_at ASC"
+        ).fetchall():
+            if total_size <= self.max_size_bytes:
+                break
+            self._connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total_size -= size
+            self.evictions += 1
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """Async variant of get that never raises on cache I/O errors."""
+        try:
+            return await asyncio.to_thread(self.get, key)
+        except Exception as e:
+            logging.warning(f"Cache read from {self.path} failed: {e}")
+            return None
+
+    async def aset(self, key: str, value: Any) -> None:
+        """Async variant of set that never raises on cache I/O errors."""
+        try:
+            await asyncio.to_thread(self.set, key, value)
+        except Exception as e:
+            logging.warning(f"Cache write to {self.path} failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit, miss and eviction counters for this cache."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+# Process-wide cache instances, shared by every researcher in the process. A None
+# entry records a cache that could not be opened, so the open is not retried per call.
+_persistent_caches: Dict[tuple, Optional[PersistentCache]] = {}
+_persistent_caches_lock = threading.Lock()
+
+def get_cache_dir(configurable: Configuration) -> str:
+    """Resolve the directory used for persistent caches."""
+    return configurable.cache_dir or os.path.join(
+        os.path.expanduser("~"), ".cache", "open_deep_research"
+    )
+
+def _open_persistent_cache(
+    cache_id: tuple,
+    path: str,
+    ttl_seconds: float,
+    max_size_bytes: int
+) -> Optional[PersistentCache]:
+    """Open the cache database for a cache id, or return the instance already opened."""
+    with _persistent_caches_lock:
+        if cache_id not in _persistent_caches:
+            try:
+                _persistent_caches[cache_id] = PersistentCache(path, ttl_seconds, max_size_bytes)
+            except (OSError, sqlite3.Error) as e:
+                # Caching is an optimization: run uncached rather than failing every call
+                logging.warning(f"Cache at {path} is unavailable, continuing without it: {e}")
+                _persistent_caches[cache_id] = None
+        return _persistent_caches[cache_id]
+
+async def get_persistent_cache(
+    name: str,
+    configurable: Configuration,
+    ttl_seconds: float,
+    max_size_bytes: int
+) -> Optional[PersistentCache]:
+    """Return the shared PersistentCache with the given name, creating it on first use.
+
+    The database is opened in a worker thread, as creating the directory and schema
+    is blocking disk I/O.
+
+    Args:
+        name: Cache name, also used as the database file name inside the cache directory
+        configurable: Configuration used to resolve the cache directory
+        ttl_seconds: Seconds an entry stays valid after it was written
+        max_size_bytes: Upper bound on the total compressed size of all entries
+
+    Returns:
+        Process-wide cache instance for this name and settings, or None if the cache
+        database cannot be opened (for example on a read-only filesystem)
+    """
+    path = os.path.join(get_cache_dir(configurable), f"{name}.sqlite")
+    cache_id = (name, path, ttl_seconds, max_size_bytes)
+    if cache_id in _persistent_caches:
+        return _persistent_caches[cache_id]
+    return await asyncio.to_thread(
+        _open_persistent_cache, cache_id, path, ttl_seconds, max_size_bytes
+    )
+
+def get_cache_stats(name: str) -> Dict[str, int]:
+    """Aggregate hit, miss and eviction counters across all caches with the given name."""
+    totals = {"hits": 0, "misses": 0, "evictions": 0}
+    with _persistent_caches_lock:
+        caches = [
+            cache for cache_id, cache in _persistent_caches.items()
+            if cache_id[0] == name and cache is not None
+        ]
+    for cache in caches:
+        for counter, value in cache.stats().items():
+            totals[counter] += value
+    return totals
+
+async def get_search_cache(configurable: Configuration) -> Optional[PersistentCache]:
+    """Return the persistent cache used for Tavily search results, or None if it is unavailable."""
+    return await get_persistent_cache(
+        "search_cache",
+        configurable,
+        configurable.search_cache_ttl_seconds,
+        configurable.search_cache_max_size_mb * 1024 * 1024
+    )
+
+def get_search_cache_stats() -> Dict[str, int]:
+    """Return hit, miss and eviction counters for the Tavily search result cache."""
+    return get_cache_stats("search_cache")
+
+def make_search_cache_key(
+    query: str,
+    max_results: int,
+    topic: str,
+    include_raw_content: bool
+) -> str:
+    """Build a content-addressed cache key for a single search request.
+
+    Queries are normalized (case and whitespace) so trivially different spellings
+    of the same query share one entry.
+    """
+    normalized_query = " ".join(query.lower().split())
+    key_parts = [normalized_query, max_results, topic, include_raw_content]
+    return hashlib.sha256(json.dumps(key_parts).encode("utf-8")).hexdigest()
+
+# Bump implicitly whenever a summarization prompt changes so stale summaries are not reused.
+# Per-page and batch summaries of the same content are interchangeable and share entries.
+SUMMARIZE_WEBPAGE_PROMPT_VERSION = hashlib.sha256(
+    (summarize_webpage_prompt + summarize_webpages_batch_prompt).encode("utf-8")
+).hexdigest()[:12]
+
+class SummaryCache:
+    """Two-tier webpage summary cache: an in-memory LRU in front of a PersistentCache."""
+
+    def __init__(self, persistent_cache: PersistentCache, max_memory_entries: int):
+        """Create a summary cache.
+
+        Args:
+            persistent_cache: Disk-backed tier shared across runs
+            max_memory_entries: Maximum number of summaries kept in the in-memory tier
+        """
+        self.persistent_cache = persistent_cache
+        self.max_memory_entries = max_memory_entries
+        self.memory_hits = 0
+        self._memory: OrderedDict[str, Summary] = OrderedDict()
+
+    def _remember(self, key: str, summary: Summary) -> None:
+        """Insert a summary into the in-memory tier, evicting the least recently used one."""
+        if self.max_memory_entries <= 0:
+            return
+        self._memory[key] = summary
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    async def aget(self, key: str) -> Optional[Summary]:
+        """Look up a summary in memory first, then in the persistent tier."""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return self._memory[key]
+
+        cached_value = await self.persistent_cache.aget(key)
+        if cached_value is None:
+            return None
+
+        summary = Summary(**cached_value)
+        self._remember(key, summary)
+        return summary
+
+    async def aset(self, key: str, summary: Summary) -> None:
+        """Store a summary in both tiers."""
+        self._remember(key, summary)
+        await self.persistent_cache.aset(key, summary.model_dump())
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit counters for both tiers and the number of misses."""
+        persistent_stats = self.persistent_cache.stats()
+        return {
+            "memory_hits": self.memory_hits,
+            "persistent_hits": persistent_stats["hits"],
+            "misses": persistent_stats["misses"],
+        }
+
+_summary_caches: Dict[tuple, SummaryCache] = {}
+
+async def get_summary_cache(configurable: Configuration) -> Optional[SummaryCache]:
+    """Return the process-wide webpage summary cache, or None if its database is unavailable."""
+    persistent_cache = await get_persistent_cache(
+        "summary_cache",
+        configurable,
+        configurable.summary_cache_ttl_seconds,
+        configurable.summary_cache_max_size_mb * 1024 * 1024
+    )
+    if persistent_cache is None:
+        return None
+    cache_id = (id(persistent_cache), configurable.summary_cache_memory_entries)
+    with _persistent_caches_lock:
+        if cache_id not in _summary_caches:
+            _summary_caches[cache_id] = SummaryCache(
+                persistent_cache, configurable.summary_cache_memory_entries
+            )
+        return _summary_caches[cache_id]
+
+def make_summary_cache_key(webpage_content: str, model_name: str) -> str:
+    """Build a summary cache key from the page content, summarization model and prompt version.
+
+    Pass exactly the content given to the model, such as the query-relevant excerpt of a
+    long page, so a summary is only reused for the same input.
+    """
+    content_hash = hashlib.sha256(webpage_content.encode("utf-8")).hexdigest()
+    return f"{content_hash}:{model_name}:{SUMMARIZE_WEBPAGE_PROMPT_VERSION}"
+
+##########################
+# Request Coalescing Utils
+##########################
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into a single in-flight task.
+
+    The first caller for a key starts the work; callers arriving while it is still
+    running await the same task instead of repeating the request. Each caller awaits
+    the task through a shield, so cancelling one caller does not cancel the work for
+    the others. Once every caller waiting on a task has been cancelled, the task is
+    cancelled too, so abandoned work does not keep running.
+    """
+
+    def __init__(self):
+        """Create an empty single-flight group."""
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight: Dict[tuple, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn for the key, or join the run already in flight for it.
+
+        Args:
+            key: Identity of the request; equal keys must produce equal results
+            fn: Zero-argument coroutine function performing the request
+
+        Returns:
+            The result of the shared run
+        """
+        loop = asyncio.get_running_loop()
+        # Tasks cannot be awaited across event loops, so keys are scoped per loop
+        flight_key = (id(loop), key)
+        self.calls += 1
+
+        task = self._in_flight.get(flight_key)
+        if task is None:
+            task = loop.create_task(fn())
+            self._in_flight[flight_key] = task
+            task.add_done_callback(lambda done: self._finish(flight_key, done))
+        else:
+            self.coalesced += 1
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and not task.done():
+                # The last caller gave up: stop the work and let later calls start afresh
+                task.cancel()
+                if self._in_flight.get(flight_key) is task:
+                    del self._in_flight[flight_key]
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    def _finish(self, flight_key: tuple, task: asyncio.Task) -> None:
+        """Forget a completed task so later calls start a fresh request."""
+        if self._in_flight.get(flight_key) is task:
+            del self._in_flight[flight_key]
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of calls, coalesced calls and currently in-flight keys."""
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
+
+# Process-wide single-flight groups shared by every researcher in the process
+search_flights = SingleFlight()
+summary_flights = SingleFlight()
+
+def get_single_flight_stats() -> Dict[str, Dict[str, int]]:
+    """Return coalescing counters for Tavily searches and webpage summaries."""
+    return {
+        "search": search_flights.stats(),
+        "summarization": summary_flights.stats(),
+    }
+
+##########################
+# HTTP Client Pool Utils
+##########################
+
+# Long-lived HTTP clients, scoped to the event loop that created them. Connection
+# pools cannot be shared across loops, and keying on the loop weakly lets clients
+# of closed loops be garbage collected instead of leaking.
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[tuple, Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+class _SharedAsyncClient:
+    """Async context manager that hands out a pooled httpx client without closing it."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        """Wrap a long-lived client."""
+        self._client = client
+
+    async def __aenter__(self) -> httpx.AsyncClient:
+        """Return the shared client."""
+        return self._client
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Leave the client open so its connections can be reused."""
+        return None
+
+def _get_loop_clients() -> Dict[tuple, Any]:
+    """Return the client registry for the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _http_clients:
+        _http_clients[loop] = {}
+    return _http_clients[loop]
+
+def get_tavily_client(api_key: Optional[str], configurable: Optional[Configuration] = None) -> AsyncTavilyClient:
+    """Return a Tavily client for the API key that reuses one keep-alive connection pool.
+
+    AsyncTavilyClient opens and closes a fresh httpx client for every request. The
+    returned client is instead pointed at a single pooled httpx client per API key
+    and event loop, so TCP and TLS handshakes are paid once rather than per search.
+
+    Args:
+        api_key: Tavily API key, or None to use the TAVILY_API_KEY environment variable
+        configurable: Configuration providing pool limits; defaults are used if omitted
+
+    Returns:
+        Shared AsyncTavilyClient for this API key
+    """
+    clients = _get_loop_clients()
+    api_key = api_key or os.getenv("TAVILY_API_KEY")
+    key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+    client_key = ("tavily", key_hash)
+    if client_key in clients:
+        return clients[client_key]
+
+    # Raises MissingAPIKeyError before any connection pool is created
+    tavily_client = AsyncTavilyClient(api_key=api_key)
+    if not hasattr(tavily_client, "_client_creator"):
+        # Unknown client internals: still reuse the client object, just without a shared pool
+        logging.warning(
+            "AsyncTavilyClient has no _client_creator hook; Tavily requests will not share "
+            "a connection pool"
+        )
+        clients[client_key] = tavily_client
+        return tavily_client
+
+    settings = configurable or Configuration()
+    limits = httpx.Limits(
+        max_connections=settings.http_pool_max_connections,
+        max_keepalive_connections=settings.http_pool_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry_seconds
+    )
+    # Preserve the proxy settings AsyncTavilyClient reads from the environment
+    proxy_mounts = {
+        scheme: httpx.AsyncHTTPTransport(proxy=proxy, limits=limits)
+        for scheme, proxy in {
+            "http://": os.getenv("TAVILY_HTTP_PROXY"),
+            "https://": os.getenv("TAVILY_HTTPS_PROXY"),
+        }.items()
+        if proxy
+    }
+    http_client = httpx.AsyncClient(
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        },
+        base_url="https://api.tavily.com",
+        limits=limits,
+        mounts=proxy_mounts or None
+    )
+
+    tavily_client._client_creator = lambda: _SharedAsyncClient(http_client)
+    clients[("tavily_http", key_hash)] = http_client
+    clients[client_key] = tavily_client
+    return tavily_client
+
+def get_http_session(configurable: Optional[Configuration] = None) -> aiohttp.ClientSession:
+    """Return the shared aiohttp session for the running event loop.
+
+    Args:
+        configurable: Configuration providing pool limits; defaults are used if omitted
+
+    Returns:
+        Long-lived ClientSession backed by a keep-alive connection pool
+    """
+    clients = _get_loop_clients()
+    session = clients.get(("aiohttp",))
+    if session is None or session.closed:
+        settings = configurable or Configuration()
+        connector = aiohttp.TCPConnector(
+            limit=settings.http_pool_max_connections,
+            keepalive_timeout=settings.http_keepalive_expiry_seconds
+        )
+        session = aiohttp.ClientSession(connector=connector)
+        clients[("aiohttp",)] = session
+    return session
+
+async def aclose_http_clients() -> None:
+    """Close every pooled HTTP client and MCP session owned by the running event loop.
+
+    Clients otherwise live for the lifetime of the process. The CLI calls this before
+    exiting and the LangGraph server calls it from the lifespan of the app in
+    webapp.py; other embedders should call it on shutdown (or at the end of a script)
+    so open connections are released cleanly. Clients are recreated on demand if
+    used afterwards.
+    """
+    clients = _get_loop_clients()
+    for client in list(clients.values()):
+        try:
+            if isinstance(client, MCPSessionManager):
+                await client.aclose()
+            elif isinstance(client, aiohttp.ClientSession):
+                await client.close()
+            elif isinstance(client, httpx.AsyncClient):
+                await client.aclose()
+        except Exception as e:
+            logging.warning(f"Error closing pooled HTTP client: {e}")
+    clients.clear()
+
+##########################
+# Rate Limit Utils
+##########################
+
+class TokenBucket:
+    """Token bucket refilled continuously at a fixed per-minute rate.
+
+    Callers reserve capacity immediately, possibly driving the balance negative,
+    and then sleep until their share has been refilled. This serves waiters in
+    arrival order without holding a lock across the sleep, so a bucket can be
+    shared by every coroutine in the process.
+    """
+
+    def __init__(self, per_minute: int):
+        """Create a full bucket holding one minute of capacity."""
+        self.capacity = float(per_minute)
+        self.refill_per_second = per_minute / 60.0
+        self._balance = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Reserve capacity and return the number of seconds to wait before using it."""
+        # A single request larger than the bucket would otherwise never be admitted
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._balance = min(
+                self.capacity,
+                self._balance + (now - self._updated_at) * self.refill_per_second
+            )
+            self._updated_at = now
+            self._balance -= amount
+            if self._balance >= 0:
+                return 0.0
+            return -self._balance / self.refill_per_second
+
+    async def acquire(self, amount: float = 1) -> None:
+        """Wait until the requested amount of capacity is available."""
+        delay = self.reserve(amount)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class RateLimiter:
+    """Acquire request and token capacity from every bucket that applies to a call."""
+
+    def __init__(self, request_buckets: List[TokenBucket], token_buckets: List[TokenBucket]):
+        """Create a limiter over shared request (RPM) and token (TPM) buckets."""
+        self.request_buckets = request_buckets
+        self.token_buckets = token_buckets
+
+    async def acquire(self, token_count: int = 0) -> None:
+        """Wait until one request with the given number of tokens may be sent."""
+        # Reserve in every bucket first so the waits overlap instead of adding up
+        delays = [bucket.reserve(1) for bucket in self.request_buckets]
+        if token_count:
+            delays.extend(bucket.reserve(token_count) for bucket in self.token_buckets)
+        delay = max(delays, default=0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+# Process-wide buckets, shared by all researchers, keyed by (scope, kind, limit)
+_rate_limit_buckets: Dict[tuple, TokenBucket] = {}
+_rate_limit_buckets_lock = threading.Lock()
+
+def _get_bucket(scope: str, kind: str, per_minute: int) -> TokenBucket:
+    """Return the shared bucket for a scope and limit, creating it on first use."""
+    bucket_key = (scope, kind, per_minute)
+    with _rate_limit_buckets_lock:
+        if bucket_key not in _rate_limit_buckets:
+            _rate_limit_buckets[bucket_key] = TokenBucket(per_minute)
+        return _rate_limit_buckets[bucket_key]
+
+def get_rate_limiter(configurable: Configuration, model_name: str) -> RateLimiter:
+    """Build the rate limiter for a model (e.g. 'openai:gpt-4.1') or service (e.g. 'tavily').
+
+    Both the provider-wide limits (keyed by the prefix before ':') and the
+    model-specific limits from Configuration.rate_limits apply.
+
+    Args:
+        configurable: Configuration holding the rate limits
+        model_name: Full model identifier or service name
+
+    Returns:
+        RateLimiter over the shared buckets; it never waits if no limits are configured
+    """
+    request_buckets, token_buckets = [], []
+    rate_limits = configurable.rate_limits or {}
+    provider = model_name.split(":", 1)[0]
+    scopes = [provider] if provider == model_name else [provider, model_name]
+
+    for scope in scopes:
+        rate_limit = rate_limits.get(scope)
+        if not rate_limit:
+            continue
+        if rate_limit.requests_per_minute:
+            request_buckets.append(_get_bucket(scope, "requests", rate_limit.requests_per_minute))
+        if rate_limit.tokens_per_minute:
+            token_buckets.append(_get_bucket(scope, "tokens", rate_limit.tokens_per_minute))
+
+    return RateLimiter(request_buckets, token_buckets)
+
+async def acquire_model_rate_limit(
+    configurable: Configuration,
+    model_name: str,
+    messages: List[MessageLikeRepresentation]
+) -> None:
+    """Wait until the shared rate limits allow sending these messages to the model."""
+    await token_counter.aload(model_name)
+    await get_rate_limiter(configurable, model_name).acquire(count_message_tokens(messages, model_name))
+
+##########################
+# Model Cache Utils
+##########################
+
+class ModelCache:
+    """Bounded LRU cache of constructed chat models and the runnables built on them.
+
+    Constructing a chat model creates a provider client with its own HTTP pool, and
+    binding a schema or tools converts them to the provider format. Caching both
+    means each distinct configuration is constructed once per process.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        """Create an empty cache holding at most max_entries runnables."""
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[tuple, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key: tuple, factory: Callable[[], Any]) -> Any:
+        """Return the cached value for a key, constructing it with factory on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # Construct outside the lock; a concurrent duplicate construction is harmless
+        value = factory()
+        with self._lock:
+            value = self._entries.setdefault(key, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        """Drop every cached entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit, miss and eviction counters and the current number of entries."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+        }
+
+# Process-wide model cache shared by every node, researcher and search tool
+model_cache = ModelCache()
+
+def get_model_cache_stats() -> Dict[str, int]:
+    """Return hit, miss and eviction counters for the chat model cache."""
+    return model_cache.stats()
+
+def get_chat_model(
+    model_config: Dict[str, Any],
+    structured_output: Optional[type] = None,
+    tools: Optional[List[Any]] = None,
+    max_retries: Optional[int] = None
+):
+    """Return a cached chat model, optionally bound to a structured output schema or tools.
+
+    Args:
+        model_config: Model settings with "model", "max_tokens", "api_key" and optional "tags"
+        structured_output: Pydantic schema passed to with_structured_output
+        tools: Tools passed to bind_tools; identified by object identity
+        max_retries: Number of attempts passed to with_retry, if retries are wanted
+
+    Returns:
+        Runnable equivalent to init_chat_model(...).with_structured_output/bind_tools(...).with_retry(...)
+    """
+    api_key = model_config.get("api_key")
+    model_key = (
+        model_config["model"],
+        model_config.get("max_tokens"),
+        hashlib.sha256((api_key or "").encode("utf-8")).hexdigest(),
+        tuple(model_config.get("tags") or ()),
+    )
+    base_model = model_cache.get_or_create(
+        ("model",) + model_key,
+        lambda: init_chat_model(
+            model=model_config["model"],
+            max_tokens=model_config.get("max_tokens"),
+            api_key=api_key,
+            tags=model_config.get("tags")
+        )
+    )
+    if structured_output is None and tools is None and max_retries is None:
+        return base_model
+
+    def build_chain():
+        """Bind the schema or tools and wrap the model in retries."""
+        chain = base_model
+        if structured_output is not None:
+            chain = chain.with_structured_output(structured_output)
+        if tools is not None:
+            chain = chain.bind_tools(tools)
+        if max_retries is not None:
+            chain = chain.with_retry(stop_after_attempt=max_retries)
+        return chain
+
+    # The cached chain holds references to the schema and tools, so their ids stay unique
+    chain_key = (
+        "chain",
+        model_key,
+        id(structured_output) if structured_output is not None else None,
+        tuple(id(bound_tool) for bound_tool in tools) if tools is not None else None,
+        max_retries,
+    )
+    return model_cache.get_or_create(chain_key, build_chain)
+
+##########################
+# Prompt Caching Utils
+##########################
+
+EPHEMERAL_CACHE_CONTROL = {"type": "ephemeral"}
+
+def _mark_cache_breakpoint(message: MessageLikeRepresentation) -> MessageLikeRepresentation:
+    """Return a copy of the message whose last content block carries a cache breakpoint."""
+    content = message.content
+    if isinstance(content, str):
+        if not content.strip():
+            return message
+        blocks = [{"type": "text", "text": content}]
+    elif content:
+        blocks = [
+            {"type": "text", "text": block} if isinstance(block, str) else dict(block)
+            for block in content
+        ]
+    else:
+        return message
+    blocks[-1]["cache_control"] = EPHEMERAL_CACHE_CONTROL
+    return message.model_copy(update={"content": blocks})
+
+def apply_prompt_cache_breakpoints(
+    messages: List[MessageLikeRepresentation],
+    model_name: str
+) -> List[MessageLikeRepresentation]:
+    """Mark the stable prefix of a ReAct transcript as cacheable for the model's provider.
+
+    For Anthropic models, breakpoints are placed on the system message, which also
+    caches the tool schemas sent before it, and on the last message, so the next
+    iteration reads the whole earlier transcript from cache. Other providers such as
+    OpenAI cache stable prefixes automatically and get the messages unchanged.
+
+    Args:
+        messages: Messages in the order they will be sent
+        model_name: Full model identifier, e.g. "anthropic:claude-sonnet-4-20250514"
+
+    Returns:
+        Messages with cache breakpoints applied; the input list is not modified
+    """
+    if not model_name.startswith("anthropic:") or not messages:
+        return messages
+
+    marked = list(messages)
+    system_index = next(
+        (index for index, message in enumerate(marked) if getattr(message, "type", None) == "system"),
+        None
+    )
+    if system_index is not None:
+        marked[system_index] = _mark_cache_breakpoint(marked[system_index])
+    if len(marked) - 1 != system_index:
+        marked[-1] = _mark_cache_breakpoint(marked[-1])
+    return marked
+
+class PromptCacheStats:
+    """Per-node totals of prompt tokens and the share served from the provider's prompt cache."""
+
+    def __init__(self):
+        """Create empty counters."""
+        self._totals: Dict[str, Counter] = {}
+        self._lock = threading.Lock()
+
+    def record(self, node: str, response: Any) -> None:
+        """Add the usage metadata of a model response to a node's totals."""
+        usage = getattr(response, "usage_metadata", None)
+        if not usage:
+            return
+        details = usage.get("input_token_details") or {}
+        with self._lock:
+            totals = self._totals.setdefault(node, Counter())
+            totals["calls"] += 1
+            totals["input_tokens"] += usage.get("input_tokens", 0)
+            totals["cache_read_tokens"] += details.get("cache_read", 0) or 0
+            totals["cache_creation_tokens"] += details.get("cache_creation", 0) or 0
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return per-node token totals and the cached-token hit rate."""
+        with self._lock:
+            return {
+                node: {
+                    **totals,
+                    "hit_rate": (
+                        totals["cache_read_tokens"] / totals["input_tokens"]
+                        if totals["input_tokens"] else 0.0
+                    ),
+                }
+                for node, totals in self._totals.items()
+            }
+
+# Process-wide prompt cache statistics shared by every node
+prompt_cache_stats = PromptCacheStats()
+
+def get_prompt_cache_stats() -> Dict[str, Dict[str, float]]:
+    """Return per-node prompt token totals and cached-token hit rates."""
+    return prompt_cache_stats.stats()
 
 ##########################
 # Reflection Tool Utils
@@ -274,20 +1846,20 @@ async def get_mcp_access_token(
             "subject_token_type": "urn:ietf:params:oauth:token-type:access_token",
         }
         
-        # Execute token exchange request
-        async with aiohttp.ClientSession() as session:
-            token_url = base_mcp_url.rstrip("/") + "/oauth/token"
-            headers = {"Content-Type": "application/x-www-form-urlencoded"}
-            
-            async with session.post(token_url, headers=headers, data=form_data) as response:
-                if response.status == 200:
-                    # Successfully obtained token
-                    token_data = await response.json()
-                    return token_data
-                else:
-                    # Log error details for debugging
-                    response_text = await response.text()
-                    logging.error(f"Token exchange failed: {response_text}")
+        # Execute token exchange request over the pooled session
+        session = get_http_session()
+        token_url = base_mcp_url.rstrip("/") + "/oauth/token"
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        
+        async with session.post(token_url, headers=headers, data=form_data) as response:
+            if response.status == 200:
+                # Successfully obtained token
+                token_data = await response.json()
+                return token_data
+            else:
+                # Log error details for debugging
+                response_text = await response.text()
+                logging.error(f"Token exchange failed: {response_text}")
                     
     except Exception as e:
         logging.error(f"Error during token exchange: {e}")
@@ -303,18 +1875,24 @@ async def get_tokens(config: RunnableConfig):
     Returns:
         Token dictionary if valid and not expired, None otherwise
     """
-    store = get_store()
+    stored_tokens = await get_stored_tokens(config)
+    return stored_tokens[0] if stored_tokens else None
+
+async def get_stored_tokens(config: RunnableConfig) -> Optional[Tuple[Dict[str, Any], float]]:
+    """Retrieve stored authentication tokens together with their expiry time.
     
-    # Extract required identifiers from config
-    thread_id = config.get("configurable", {}).get("thread_id")
-    if not thread_id:
-        return None
+    Args:
+        config: Runtime configuration containing thread and user identifiers
         
-    user_id = config.get("metadata", {}).get("owner")
+    Returns:
+        Tuple of the token dictionary and its expiry as a Unix timestamp if valid, None otherwise
+    """
+    user_id = get_token_owner(config)
     if not user_id:
         return None
     
     # Retrieve stored tokens
+    store = get_store()
     tokens = await store.aget((user_id, "tokens"), "data")
     if not tokens:
         return None
@@ -330,7 +1908,15 @@ async def get_tokens(config: RunnableConfig):
         await store.adelete((user_id, "tokens"), "data")
         return None
 
-    return tokens.value
+    return tokens.value, expiration_time.timestamp()
+
+def get_token_owner(config: RunnableConfig) -> Optional[str]:
+    """Return the user that owns stored tokens, or None if tokens are not stored for this run."""
+    # Tokens are only stored for runs with both a thread and an owner
+    thread_id = config.get("configurable", {}).get("thread_id")
+    if not thread_id:
+        return None
+    return config.get("metadata", {}).get("owner")
 
 async def set_tokens(config: RunnableConfig, tokens: dict[str, Any]):
     """Store authentication tokens in the configuration store.
@@ -339,34 +1925,59 @@ async def set_tokens(config: RunnableConfig, tokens: dict[str, Any]):
         config: Runtime configuration containing thread and user identifiers
         tokens: Token dictionary to store
     """
-    store = get_store()
-    
-    # Extract required identifiers from config
-    thread_id = config.get("configurable", {}).get("thread_id")
-    if not thread_id:
-        return
-        
-    user_id = config.get("metadata", {}).get("owner")
+    user_id = get_token_owner(config)
     if not user_id:
         return
     
     # Store the tokens
+    store = get_store()
     await store.aput((user_id, "tokens"), "data", tokens)
 
-async def fetch_tokens(config: RunnableConfig) -> dict[str, Any]:
-    """Fetch and refresh MCP tokens, obtaining new ones if needed.
+# Refresh tokens this many seconds before they expire, while the current token is still usable
+MCP_TOKEN_REFRESH_MARGIN_SECONDS = 60
+
+class MCPTokenCache:
+    """In-process TTL cache of exchanged MCP tokens keyed by owner, in front of the LangGraph store."""
+
+    def __init__(self):
+        """Create an empty token cache."""
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._entries: Dict[str, Tuple[Dict[str, Any], float]] = {}
+
+    def get(self, owner: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return the tokens and expiry time for an owner, or None if missing or expired."""
+        entry = self._entries.get(owner)
+        if entry is None or entry[1] <= time.time():
+            self._entries.pop(owner, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def set(self, owner: str, tokens: Dict[str, Any], expires_at: float) -> None:
+        """Remember tokens for an owner until their expiry time (Unix timestamp)."""
+        self._entries[owner] = (tokens, expires_at)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit, miss and refresh counters."""
+        return {"hits": self.hits, "misses": self.misses, "refreshes": self.refreshes}
+
+# Process-wide token cache and single-flight group for token exchanges
+mcp_token_cache = MCPTokenCache()
+token_flights = SingleFlight()
+_background_token_refreshes: set = set()
+
+async def refresh_tokens(config: RunnableConfig) -> Optional[dict[str, Any]]:
+    """Exchange the Supabase token for new MCP tokens, sharing concurrent exchanges.
     
     Args:
         config: Runtime configuration with authentication details
         
     Returns:
-        Valid token dictionary, or None if unable to obtain tokens
+        New token dictionary, or None if unable to obtain tokens
     """
-    # Try to get existing valid tokens first
-    current_tokens = await get_tokens(config)
-    if current_tokens:
-        return current_tokens
-    
     # Extract Supabase token for new token exchange
     supabase_token = config.get("configurable", {}).get("x-supabase-access-token")
     if not supabase_token:
@@ -377,20 +1988,77 @@ async def fetch_tokens(config: RunnableConfig) -> dict[str, Any]:
     if not mcp_config or not mcp_config.get("url"):
         return None
     
-    # Exchange Supabase token for MCP tokens
-    mcp_tokens = await get_mcp_access_token(supabase_token, mcp_config.get("url"))
-    if not mcp_tokens:
-        return None
+    owner = get_token_owner(config)
+    
+    async def exchange():
+        """Exchange the token, then store and cache the result."""
+        mcp_tokens = await get_mcp_access_token(supabase_token, mcp_config.get("url"))
+        if not mcp_tokens:
+            return None
+        await set_tokens(config, mcp_tokens)
+        if owner:
+            mcp_token_cache.refreshes += 1
+            mcp_token_cache.set(owner, mcp_tokens, time.time() + mcp_tokens.get("expires_in", 0))
+        return mcp_tokens
+    
+    # Concurrent researchers of the same user share one request to the token endpoint
+    flight_key = json.dumps([
+        owner or hashlib.sha256(supabase_token.encode("utf-8")).hexdigest(),
+        mcp_config.get("url"),
+    ])
+    return await token_flights.do(flight_key, exchange)
+
+async def fetch_tokens(config: RunnableConfig) -> dict[str, Any]:
+    """Fetch and refresh MCP tokens, obtaining new ones if needed.
+    
+    Tokens are served from the in-process cache when possible, falling back to
+    the store. Tokens close to expiry are refreshed in the background while the
+    current token is still returned.
+    
+    Args:
+        config: Runtime configuration with authentication details
+        
+    Returns:
+        Valid token dictionary, or None if unable to obtain tokens
+    """
+    # Try to get existing valid tokens first, from memory and then from the store
+    owner = get_token_owner(config)
+    current_tokens = mcp_token_cache.get(owner) if owner else None
+    if current_tokens is None:
+        current_tokens = await get_stored_tokens(config)
+        if current_tokens and owner:
+            mcp_token_cache.set(owner, *current_tokens)
+    
+    if not current_tokens:
+        return await refresh_tokens(config)
+    
+    tokens, expires_at = current_tokens
+    if expires_at - time.time() <= MCP_TOKEN_REFRESH_MARGIN_SECONDS:
+        # Refresh proactively, keeping the reference so the task is not garbage collected
+        refresh_task = asyncio.create_task(refresh_tokens(config))
+        _background_token_refreshes.add(refresh_task)
+        refresh_task.add_done_callback(_finish_background_token_refresh)
+    return tokens
+
+def _finish_background_token_refresh(task: asyncio.Task) -> None:
+    """Forget a finished background refresh and log its failure, if any."""
+    _background_token_refreshes.discard(task)
+    if not task.cancelled() and task.exception():
+        logging.warning(f"Background MCP token refresh failed: {task.exception()}")
 
-    # Store the new tokens and return them
-    await set_tokens(config, mcp_tokens)
-    return mcp_tokens
+def get_mcp_token_cache_stats() -> Dict[str, int]:
+    """Return hit, miss and refresh counters for the in-process MCP token cache."""
+    return mcp_token_cache.stats()
 
-def wrap_mcp_authenticate_tool(tool: StructuredTool) -> StructuredTool:
+def wrap_mcp_authenticate_tool(
+    tool: StructuredTool,
+    on_auth_error: Optional[Callable[[], None]] = None
+) -> StructuredTool:
     """Wrap MCP tool with comprehensive authentication and error handling.
     
     Args:
         tool: The MCP structured tool to wrap
+        on_auth_error: Optional callback run when the server requires (re)authentication
         
     Returns:
         Enhanced tool with authentication error handling
@@ -430,6 +2098,8 @@ def wrap_mcp_authenticate_tool(tool: StructuredTool) -> StructuredTool:
             
             # Check for authentication/interaction required error
             if error_code == -32003:  # Interaction required error code
+                if on_auth_error:
+                    on_auth_error()
                 message_payload = error_data.get("message", {})
                 error_message = "Required interaction"
                 
@@ -450,15 +2120,196 @@ def wrap_mcp_authenticate_tool(tool: StructuredTool) -> StructuredTool:
     tool.coroutine = authentication_wrapper
     return tool
 
+class PersistentMCPSession:
+    """A long-lived, initialized MCP client session that reconnects after failures.
+
+    The transport context is held open by a background task on the event loop that
+    created it, so tool calls from any task share one connection. Concurrent
+    requests are multiplexed by the MCP protocol's request ids.
+    """
+
+    def __init__(self, connection: Connection):
+        """Create a session for a connection; it connects lazily on first use."""
+        self.connection = connection
+        self._session: Optional[ClientSession] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._connect_lock = asyncio.Lock()
+
+    async def _run(self, ready: asyncio.Future, stop: asyncio.Event) -> None:
+        """Hold the session open until asked to stop or the connection fails."""
+        session = None
+        try:
+            async with create_session(self.connection) as session:
+                await session.initialize()
+                self._session = session
+                ready.set_result(session)
+                await stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logging.warning(f"MCP session to {self.connection.get('url')} closed: {e}")
+        finally:
+            # A replacement connection may already be live; only clear our own session
+            if session is not None and self._session is session:
+                self._session = None
+            if not ready.done():
+                ready.cancel()
+
+    async def get_session(self) -> ClientSession:
+        """Return the live session, connecting or reconnecting if needed."""
+        async with self._connect_lock:
+            if self._session is not None and self._runner and not self._runner.done():
+                return self._session
+            await self._disconnect()
+            ready = asyncio.get_running_loop().create_future()
+            self._stop = asyncio.Event()
+            self._runner = asyncio.create_task(self._run(ready, self._stop))
+            return await ready
+
+    async def _disconnect(self) -> None:
+        """Stop the background task holding the current connection, if any."""
+        runner, self._runner = self._runner, None
+        if self._stop:
+            self._stop.set()
+        if runner and not runner.done():
+            try:
+                await asyncio.wait_for(runner, timeout=5.0)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                runner.cancel()
+        self._session = None
+
+    async def reset(self, session: ClientSession) -> None:
+        """Drop a session that failed so the next request reconnects."""
+        async with self._connect_lock:
+            if self._session is session:
+                await self._disconnect()
+
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None, **kwargs):
+        """Call a tool; transport failures drop the connection but are not retried.
+
+        Tool calls may have side effects, so a call that failed mid-flight is not
+        repeated. Server-reported errors (McpError) leave the connection in place.
+        Extra keyword arguments, such as a progress callback, are passed to the session.
+        """
+        session = await self.get_session()
+        try:
+            return await session.call_tool(name, arguments, **kwargs)
+        except McpError:
+            raise
+        except Exception:
+            await self.reset(session)
+            raise
+
+    async def list_tools(self, *args, **kwargs):
+        """List tools, reconnecting and retrying once if the connection has failed."""
+        session = await self.get_session()
+        try:
+            return await session.list_tools(*args, **kwargs)
+        except McpError:
+            raise
+        except Exception as e:
+            logging.warning(f"MCP list_tools failed, reconnecting: {e}")
+            await self.reset(session)
+            return await (await self.get_session()).list_tools(*args, **kwargs)
+
+    async def aclose(self) -> None:
+        """Close the connection."""
+        async with self._connect_lock:
+            await self._disconnect()
+
+class MCPSessionManager:
+    """Keep one PersistentMCPSession per connection (server URL and auth headers)."""
+
+    def __init__(self, max_sessions: int = 32):
+        """Create an empty manager; the least recently used sessions are closed beyond max_sessions."""
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict[str, PersistentMCPSession] = OrderedDict()
+        self._closing: set = set()
+
+    def get_session(self, connection: Connection) -> PersistentMCPSession:
+        """Return the shared session for a connection, creating it on first use."""
+        session_key = hashlib.sha256(
+            json.dumps(connection, sort_keys=True, default=repr).encode("utf-8")
+        ).hexdigest()
+        if session_key not in self._sessions:
+            self._sessions[session_key] = PersistentMCPSession(connection)
+        self._sessions.move_to_end(session_key)
+        while len(self._sessions) > self.max_sessions:
+            _, evicted_session = self._sessions.popitem(last=False)
+            # Keep a reference so the close is not garbage collected before it finishes
+            close_task = asyncio.create_task(evicted_session.aclose())
+            self._closing.add(close_task)
+            close_task.add_done_callback(self._finish_close)
+        return self._sessions[session_key]
+
+    def _finish_close(self, task: asyncio.Task) -> None:
+        """Forget a finished eviction close and log its failure, if any."""
+        self._closing.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.warning(f"Error closing evicted MCP session: {task.exception()}")
+
+    async def aclose(self) -> None:
+        """Close every managed session, waiting for evicted sessions still closing."""
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        await asyncio.gather(
+            *(session.aclose() for session in sessions), *self._closing, return_exceptions=True
+        )
+
+def get_mcp_session_manager() -> MCPSessionManager:
+    """Return the MCP session manager for the running event loop."""
+    clients = _get_loop_clients()
+    manager = clients.get(("mcp_sessions",))
+    if manager is None:
+        manager = MCPSessionManager()
+        clients[("mcp_sessions",)] = manager
+    return manager
+
+class MCPSessionHandle:
+    """Session-like handle that routes each request to the current loop's persistent session.
+
+    Tools bound to a handle can be cached across event loops, since the connection
+    is resolved when a request is made rather than when the tool is loaded.
+    """
+
+    def __init__(self, connection: Connection):
+        """Create a handle for a connection."""
+        self.connection = connection
+
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None, **kwargs):
+        """Call a tool over the shared session, forwarding any extra session arguments."""
+        session = get_mcp_session_manager().get_session(self.connection)
+        return await session.call_tool(name, arguments, **kwargs)
+
+    async def list_tools(self, *args, **kwargs):
+        """List tools over the shared session, forwarding any session arguments."""
+        session = get_mcp_session_manager().get_session(self.connection)
+        return await session.list_tools(*args, **kwargs)
+
+async def load_persistent_mcp_tools(connection: Connection) -> List[BaseTool]:
+    """Load the tools of an MCP server, bound to a long-lived shared session.
+
+    Args:
+        connection: Connection configuration of the MCP server
+
+    Returns:
+        LangChain tools whose calls reuse one connection per server and auth token
+    """
+    return await load_session_mcp_tools(MCPSessionHandle(connection))
+
 async def load_mcp_tools(
     config: RunnableConfig,
     existing_tool_names: set[str],
+    on_auth_error: Optional[Callable[[], None]] = None,
 ) -> list[BaseTool]:
     """Load and configure MCP (Model Context Protocol) tools with authentication.
     
     Args:
         config: Runtime configuration containing MCP server details
         existing_tool_names: Set of tool names already in use to avoid conflicts
+        on_auth_error: Optional callback run when a loaded tool hits an authentication error
         
     Returns:
         List of configured MCP tools ready for use
@@ -490,19 +2341,16 @@ async def load_mcp_tools(
     if mcp_tokens:
         auth_headers = {"Authorization": f"Bearer {mcp_tokens['access_token']}"}
     
-    mcp_server_config = {
-        "server_1": {
-            "url": server_url,
-            "headers": auth_headers,
-            "transport": "streamable_http"
-        }
+    mcp_connection = {
+        "url": server_url,
+        "headers": auth_headers,
+        "transport": "streamable_http"
     }
     # TODO: When Multi-MCP Server support is merged in OAP, update this code
     
-    # Step 4: Load tools from MCP server
+    # Step 4: Load tools from MCP server over a long-lived shared session
     try:
-        client = MultiServerMCPClient(mcp_server_config)
-        available_mcp_tools = await client.get_tools()
+        available_mcp_tools = await load_persistent_mcp_tools(mcp_connection)
     except Exception:
         # If MCP server connection fails, return empty list
         return []
@@ -522,7 +2370,7 @@ async def load_mcp_tools(
             continue
         
         # Wrap tool with authentication handling and add to list
-        enhanced_tool = wrap_mcp_authenticate_tool(mcp_tool)
+        enhanced_tool = wrap_mcp_authenticate_tool(mcp_tool, on_auth_error)
         configured_tools.append(enhanced_tool)
     
     return configured_tools
@@ -573,8 +2421,50 @@ async def get_search_tool(search_api: SearchAPI):
 async def get_all_tools(config: RunnableConfig):
     """Assemble complete toolkit including research, search, and MCP tools.
     
+    Toolkits are served from the shared tool registry, so MCP tool discovery runs
+    once per search API, MCP configuration and user until the entry expires or an
+    MCP tool reports an authentication error.
+    
+    Args:
+        config: Runtime configuration specifying search API and MCP settings
+        
+    Returns:
+        List of all configured and available tools for research operations
+    """
+    tools, _ = await get_tool_registry_entry(config)
+    return list(tools)
+
+async def get_tools_by_name(config: RunnableConfig) -> Dict[str, Any]:
+    """Return the cached mapping of tool name to tool for the configured toolkit.
+    
+    Args:
+        config: Runtime configuration specifying search API and MCP settings
+        
+    Returns:
+        Read-only mapping shared by every caller with the same toolkit
+    """
+    _, tools_by_name = await get_tool_registry_entry(config)
+    return tools_by_name
+
+def get_tool_name(research_tool: Any) -> str:
+    """Return the name of a tool object or a provider-native tool dictionary."""
+    if hasattr(research_tool, "name"):
+        return research_tool.name
+    return research_tool.get("name", "web_search")
+
+def index_tools_by_name(tools: List[Any]) -> Dict[str, Any]:
+    """Map each tool's name to the tool."""
+    return {get_tool_name(research_tool): research_tool for research_tool in tools}
+
+async def assemble_tools(
+    config: RunnableConfig,
+    on_auth_error: Optional[Callable[[], None]] = None
+) -> List[Any]:
+    """Build the toolkit from scratch, discovering MCP tools on the configured server.
+    
     Args:
         config: Runtime configuration specifying search API and MCP settings
+        on_auth_error: Optional callback run when an MCP tool hits an authentication error
         
     Returns:
         List of all configured and available tools for research operations
@@ -589,20 +2479,123 @@ async def get_all_tools(config: RunnableConfig):
     tools.extend(search_tools)
     
     # Track existing tool names to prevent conflicts
-    existing_tool_names = {
-        tool.name if hasattr(tool, "name") else tool.get("name", "web_search") 
-        for tool in tools
-    }
+    existing_tool_names = {get_tool_name(research_tool) for research_tool in tools}
     
     # Add MCP tools if configured
-    mcp_tools = await load_mcp_tools(config, existing_tool_names)
+    mcp_tools = await load_mcp_tools(config, existing_tool_names, on_auth_error)
     tools.extend(mcp_tools)
     
     return tools
 
+class ToolRegistry:
+    """TTL cache of assembled toolkits and their name lookups.
+
+    Entries are invalidated explicitly when an MCP tool reports that the server
+    requires (re)authentication, so the next lookup reconnects with fresh tokens.
+    """
+
+    def __init__(self):
+        """Create an empty registry."""
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: Dict[str, Tuple[float, List[Any], Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, ttl_seconds: float) -> Optional[Tuple[List[Any], Dict[str, Any]]]:
+        """Return the tools and name lookup for a key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > ttl_seconds:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def set(self, key: str, tools: List[Any], tools_by_name: Dict[str, Any]) -> None:
+        """Store a toolkit together with its name lookup."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), tools, tools_by_name)
+
+    def invalidate(self, key: str) -> None:
+        """Drop the toolkit for a key so the next lookup rebuilds it."""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit, miss and invalidation counters."""
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
+
+# Process-wide tool registry and single-flight group for concurrent rebuilds
+tool_registry = ToolRegistry()
+tool_flights = SingleFlight()
+
+def make_tool_registry_key(config: RunnableConfig, mcp_access_token: Optional[str] = None) -> str:
+    """Build the registry key from the search API, MCP configuration and user identity.
+    
+    The identity is only part of the key when the MCP server requires authentication,
+    in which case loaded tools carry that user's access token in their headers. The
+    token itself is hashed into the key, so a refreshed token builds a new toolkit
+    instead of reusing tools that still send the old one.
+    """
+    configurable = Configuration.from_runnable_config(config)
+    mcp_config = configurable.mcp_config.model_dump() if configurable.mcp_config else None
+    identity = None
+    if configurable.mcp_config and configurable.mcp_config.auth_required:
+        config = config or {}
+        identity = [
+            config.get("metadata", {}).get("owner"),
+            hashlib.sha256((mcp_access_token or "").encode("utf-8")).hexdigest(),
+        ]
+    key_parts = [get_config_value(configurable.search_api), mcp_config, identity]
+    return hashlib.sha256(json.dumps(key_parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+async def get_tool_registry_entry(config: RunnableConfig) -> Tuple[List[Any], Dict[str, Any]]:
+    """Return the cached toolkit and name lookup for a configuration, building it on a miss."""
+    configurable = Configuration.from_runnable_config(config)
+    if configurable.tool_cache_ttl_seconds <= 0:
+        tools = await assemble_tools(config)
+        return tools, index_tools_by_name(tools)
+
+    # Cheap after the first call: tokens are served from the in-process token cache
+    mcp_access_token = None
+    if configurable.mcp_config and configurable.mcp_config.auth_required:
+        mcp_tokens = await fetch_tokens(config)
+        mcp_access_token = mcp_tokens.get("access_token") if mcp_tokens else None
+    
+    key = make_tool_registry_key(config, mcp_access_token)
+    cached_entry = tool_registry.get(key, configurable.tool_cache_ttl_seconds)
+    if cached_entry is not None:
+        return cached_entry
+
+    async def build_entry():
+        """Assemble the toolkit and cache it unless MCP discovery came back empty."""
+        tools = await assemble_tools(config, on_auth_error=lambda: tool_registry.invalidate(key))
+        tools_by_name = index_tools_by_name(tools)
+        mcp_config = configurable.mcp_config
+        requested_mcp_tools = set(mcp_config.tools or []) if mcp_config and mcp_config.url else set()
+        if requested_mcp_tools and not requested_mcp_tools & tools_by_name.keys():
+            # A failed or unauthenticated MCP connection is retried on the next lookup
+            return tools, tools_by_name
+        tool_registry.set(key, tools, tools_by_name)
+        return tools, tools_by_name
+
+    # Researchers starting together share one MCP discovery round trip
+    return await tool_flights.do(key, build_entry)
+
+def get_tool_registry_stats() -> Dict[str, int]:
+    """Return hit, miss and invalidation counters for the tool registry."""
+    return tool_registry.stats()
+
 def get_notes_from_tool_calls(messages: list[MessageLikeRepresentation]):
-    """Extract notes from tool call messages."""
-    return [tool_msg.content for tool_msg in filter_messages(messages, include_types="tool")]
+    """Extract notes from tool call messages and from research delivered after its tool call."""
+    return [
+        message.content for message in messages
+        if (message.type == "tool" and not message.additional_kwargs.get("research_pending"))
+        or message.additional_kwargs.get("research_unit_id")
+    ]
 
 ##########################
 # Model Provider Native Websearch Utils
@@ -869,6 +2862,709 @@ def remove_up_to_last_ai_message(messages: list[MessageLikeRepresentation]) -> l
     # No AI messages found, return original list
     return messages
 
+##########################
+# Token Accounting Utils
+##########################
+
+# Offline tiktoken encodings for OpenAI model families, matched by model name prefix
+TIKTOKEN_ENCODINGS = {
+    "gpt-4.1": "o200k_base",
+    "gpt-4o": "o200k_base",
+    "gpt-5": "o200k_base",
+    "o1": "o200k_base",
+    "o3": "o200k_base",
+    "o4": "o200k_base",
+    "gpt-4": "cl100k_base",
+    "gpt-3.5": "cl100k_base",
+}
+
+# Characters per token measured on English research text, used for providers whose
+# tokenizer is not available offline. Lower ratios count conservatively.
+PROVIDER_CHARS_PER_TOKEN = {
+    "openai": 4.0,
+    "azure_openai": 4.0,
+    "anthropic": 3.5,
+    "bedrock": 3.5,
+    "bedrock_converse": 3.5,
+    "google_genai": 4.0,
+    "google_vertexai": 4.0,
+    "google": 4.0,
+    "cohere": 4.0,
+    "mistral": 3.5,
+    "mistralai": 3.5,
+    "groq": 3.5,
+    "deepseek": 3.5,
+    "ollama": 3.5,
+}
+DEFAULT_CHARS_PER_TOKEN = 3.5
+
+# Tokens each message adds for role markers and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Share of the context window held back for tool schemas and tokenizer error
+CONTEXT_SAFETY_MARGIN = 0.05
+
+def _message_text(message: MessageLikeRepresentation) -> str:
+    """Return all the text a message contributes to a prompt, including tool call arguments."""
+    content = message.content if hasattr(message, "content") else message
+    if isinstance(content, list):
+        text = "".join(
+            block if isinstance(block, str) else str(block.get("text", block))
+            for block in content
+        )
+    else:
+        text = str(content)
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        text += tool_call["name"] + json.dumps(tool_call.get("args", {}), default=str)
+    return text
+
+class TokenCounter:
+    """Count prompt tokens locally, with tiktoken for OpenAI models and calibrated estimates otherwise."""
+
+    def __init__(self):
+        """Create a counter with no encodings loaded yet."""
+        self._encodings: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _encoding_name(model_name: str) -> Optional[str]:
+        """Return the tiktoken encoding name for a model, or None when only estimates are available."""
+        provider, _, name = model_name.partition(":")
+        if provider not in ("openai", "azure_openai"):
+            return None
+        return next(
+            (encoding for prefix, encoding in TIKTOKEN_ENCODINGS.items() if name.startswith(prefix)),
+            None
+        )
+
+    def _get_encoding(self, model_name: str):
+        """Return the offline tokenizer for a model, or None when only estimates are available.
+
+        Loading an encoding builds (and may download) its BPE ranks synchronously; async
+        code should load it beforehand with aload.
+        """
+        encoding_name = self._encoding_name(model_name)
+        if encoding_name is None:
+            return None
+        if encoding_name in self._encodings:
+            return self._encodings[encoding_name]
+        with self._lock:
+            if encoding_name not in self._encodings:
+                try:
+                    self._encodings[encoding_name] = tiktoken.get_encoding(encoding_name)
+                except Exception as e:
+                    # Encoding files are downloaded on first use; fall back to estimates offline
+                    logging.warning(f"tiktoken encoding {encoding_name} unavailable, estimating tokens: {e}")
+                    self._encodings[encoding_name] = None
+            return self._encodings[encoding_name]
+
+    async def aload(self, model_name: str) -> None:
+        """Load the tokenizer for a model in a worker thread, so later counts never block the event loop."""
+        encoding_name = self._encoding_name(model_name)
+        if encoding_name is not None and encoding_name not in self._encodings:
+            await asyncio.to_thread(self._get_encoding, model_name)
+
+    @staticmethod
+    def _chars_per_token(model_name: str) -> float:
+        """Return the calibrated characters-per-token ratio for the model's provider."""
+        provider = model_name.split(":", 1)[0] if ":" in model_name else ""
+        return PROVIDER_CHARS_PER_TOKEN.get(provider, DEFAULT_CHARS_PER_TOKEN)
+
+    def count_text(self, text: str, model_name: str) -> int:
+        """Count the tokens of a piece of text for the given model."""
+        encoding = self._get_encoding(model_name)
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / self._chars_per_token(model_name))
+
+    def count_messages(self, messages: List[MessageLikeRepresentation], model_name: str) -> int:
+        """Count the prompt tokens of a message list for the given model."""
+        return sum(
+            self.count_text(_message_text(message), model_name) + MESSAGE_OVERHEAD_TOKENS
+            for message in messages
+        )
+
+    def truncate_text(self, text: str, model_name: str, max_tokens: int) -> str:
+        """Cut text so that it fits in max_tokens for the given model."""
+        if max_tokens <= 0:
+            return ""
+        encoding = self._get_encoding(model_name)
+        if encoding is not None:
+            tokens = encoding.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+        return text[:int(max_tokens * self._chars_per_token(model_name))]
+
+    def split_text(self, text: str, model_name: str, max_tokens: int) -> List[str]:
+        """Split text into consecutive pieces of about max_tokens tokens for the given model.
+
+        Pieces are cut at the character offsets of token boundaries, so they join back
+        into the original text exactly even when a token ends inside a multibyte character.
+        """
+        if max_tokens <= 0 or not text:
+            return [text] if text else []
+        encoding = self._get_encoding(model_name)
+        if encoding is not None:
+            tokens = encoding.encode(text, disallowed_special=())
+            _, offsets = encoding.decode_with_offsets(tokens)
+            cuts = offsets[max_tokens::max_tokens]
+        else:
+            step = max(1, int(max_tokens * self._chars_per_token(model_name)))
+            cuts = list(range(step, len(text), step))
+        bounds = [0, *cuts, len(text)]
+        return [text[start:end] for start, end in zip(bounds, bounds[1:]) if end > start]
+
+# Process-wide token counter; tokenizers are loaded once and shared
+token_counter = TokenCounter()
+
+async def load_tokenizers(configurable: Configuration) -> None:
+    """Load the tokenizers of every configured model off the event loop."""
+    model_names = {
+        configurable.summarization_model,
+        configurable.research_model,
+        configurable.compression_model,
+        configurable.final_report_model,
+    }
+    await asyncio.gather(*[token_counter.aload(model_name) for model_name in model_names])
+
+def count_message_tokens(messages: List[MessageLikeRepresentation], model_name: str) -> int:
+    """Count the prompt tokens of a message list for the given model."""
+    return token_counter.count_messages(messages, model_name)
+
+def count_text_tokens(text: str, model_name: str) -> int:
+    """Count the tokens of a piece of text for the given model."""
+    return token_counter.count_text(text, model_name)
+
+def get_prompt_token_budget(model_name: str, max_output_tokens: Optional[int] = None) -> Optional[int]:
+    """Return how many prompt tokens can be sent to a model while leaving room for its output.
+
+    Args:
+        model_name: Full model identifier looked up in MODEL_TOKEN_LIMITS
+        max_output_tokens: Tokens reserved for the model's response
+
+    Returns:
+        Prompt token budget, or None if the model's context window is unknown
+    """
+    model_token_limit = get_model_token_limit(model_name)
+    if not model_token_limit:
+        return None
+    return int(model_token_limit * (1 - CONTEXT_SAFETY_MARGIN)) - (max_output_tokens or 0)
+
+def fit_text_to_token_budget(text: str, model_name: str, max_tokens: int) -> str:
+    """Truncate text to at most max_tokens tokens for the given model."""
+    return token_counter.truncate_text(text, model_name, max_tokens)
+
+def fit_messages_to_token_budget(
+    messages: List[MessageLikeRepresentation],
+    model_name: str,
+    max_tokens: Optional[int]
+) -> List[MessageLikeRepresentation]:
+    """Drop the oldest tool-calling turns of a transcript until it fits the token budget.
+
+    Messages before the first AI message (system prompt and task) are always kept, and
+    turns are removed whole so every tool result still follows the AI message that
+    requested it. If the most recent turn alone is too large, its tool results are
+    truncated evenly.
+
+    Args:
+        messages: Transcript to fit, oldest first
+        model_name: Model the transcript will be sent to
+        max_tokens: Prompt token budget; None leaves the transcript unchanged
+
+    Returns:
+        Messages that fit within the budget
+    """
+    if max_tokens is None or count_message_tokens(messages, model_name) <= max_tokens:
+        return messages
+
+    leading, turns = split_into_turns(messages)
+
+    # Drop whole turns from the oldest end while more than one remains
+    while len(turns) > 1 and count_message_tokens(leading + sum(turns, []), model_name) > max_tokens:
+        turns.pop(0)
+    fitted = leading + sum(turns, [])
+
+    excess = count_message_tokens(fitted, model_name) - max_tokens
+    tool_indexes = [index for index, message in enumerate(fitted) if message.type == "tool"]
+    if excess > 0 and tool_indexes:
+        tool_tokens = [token_counter.count_text(_message_text(fitted[index]), model_name) for index in tool_indexes]
+        keep_ratio = max(0.0, 1 - excess / max(sum(tool_tokens), 1))
+        for index, tokens in zip(tool_indexes, tool_tokens):
+            fitted[index] = fitted[index].model_copy(update={
+                "content": fit_text_to_token_budget(
+                    _message_text(fitted[index]), model_name, int(tokens * keep_ratio)
+                )
+            })
+    return fitted
+
+def cluster_notes(notes: List[str], model_name: str, max_tokens: int) -> List[str]:
+    """Pack research notes, in order, into clusters of at most max_tokens tokens.
+
+    Consecutive notes are grouped while they fit, so notes from related research
+    units stay together. A note larger than max_tokens is split across clusters.
+
+    Args:
+        notes: Research notes in the order they were produced
+        model_name: Model the clusters will be sent to
+        max_tokens: Maximum tokens per cluster
+
+    Returns:
+        Cluster texts with notes separated by blank lines
+    """
+    chunks: List[str] = []
+    for note in notes:
+        if count_text_tokens(note, model_name) <= max_tokens:
+            pieces = [note]
+        else:
+            pieces = token_counter.split_text(note, model_name, max_tokens)
+        chunks.extend(piece for piece in pieces if piece.strip())
+
+    clusters: List[str] = []
+    cluster_tokens = 0
+    for chunk in chunks:
+        chunk_tokens = count_text_tokens(chunk, model_name)
+        if clusters and cluster_tokens + chunk_tokens <= max_tokens:
+            clusters[-1] = f"{clusters[-1]}\n\n{chunk}"
+            cluster_tokens += chunk_tokens
+        else:
+            clusters.append(chunk)
+            cluster_tokens = chunk_tokens
+    return clusters
+
+##########################
+# Context Compaction Utils
+##########################
+
+def split_into_turns(
+    messages: List[MessageLikeRepresentation]
+) -> Tuple[List[MessageLikeRepresentation], List[List[MessageLikeRepresentation]]]:
+    """Split a ReAct transcript into its leading messages and its tool-calling turns.
+
+    Each turn starts with an AI message and holds the tool results that follow it.
+    """
+    first_ai_index = next(
+        (index for index, message in enumerate(messages) if isinstance(message, AIMessage)),
+        len(messages)
+    )
+    turns: List[List[MessageLikeRepresentation]] = []
+    for message in messages[first_ai_index:]:
+        if isinstance(message, AIMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return list(messages[:first_ai_index]), turns
+
+def is_compacted(message: MessageLikeRepresentation) -> bool:
+    """Check whether a tool message has already been replaced by a compact digest."""
+    return bool(getattr(message, "additional_kwargs", {}).get("compacted"))
+
+def compact_tool_messages(
+    messages: List[MessageLikeRepresentation],
+    query: str,
+    keep_recent_turns: int,
+    digest_chars: int
+) -> Tuple[List[MessageLikeRepresentation], List[str]]:
+    """Collapse the tool results of older turns into extractive digests.
+
+    Tool results outside the most recent keep_recent_turns turns that are longer
+    than digest_chars are replaced by their passages most relevant to the query.
+    Turn structure and tool call ids are left intact, so the transcript stays valid
+    for every provider.
+
+    Args:
+        messages: Researcher transcript, oldest first
+        query: Research topic used to rank passages for each digest
+        keep_recent_turns: Number of most recent turns kept verbatim
+        digest_chars: Maximum characters of each digest
+
+    Returns:
+        Tuple of the compacted transcript and the full text of every replaced tool result
+    """
+    leading, turns = split_into_turns(messages)
+    compacted_turns = turns[:-keep_recent_turns] if keep_recent_turns > 0 else turns
+    full_texts: List[str] = []
+
+    for turn in compacted_turns:
+        for index, message in enumerate(turn):
+            if message.type != "tool" or is_compacted(message):
+                continue
+            content = str(message.content)
+            if len(content) <= digest_chars:
+                continue
+            full_texts.append(content)
+            digest = select_relevant_passages(content, query, digest_chars)
+            turn[index] = message.model_copy(update={
+                "content": f"[Digest of an earlier tool result; the full text is kept in the raw notes]\n{digest}",
+                "additional_kwargs": {**message.additional_kwargs, "compacted": True},
+            })
+
+    return leading + sum(turns, []), full_texts
+
+##########################
+# Concurrency Governor Utils
+##########################
+
+class ConcurrencyPool:
+    """Counting limiter that reports how many operations are running and queued.
+
+    Unlike asyncio.Semaphore it is not bound to one event loop, so a process-wide
+    pool can be shared by runs on different loops. Waiters are served first-in,
+    first-out.
+    """
+
+    def __init__(self, limit: int):
+        """Create a pool that admits at most limit concurrent operations."""
+        self.limit = limit
+        self.running = 0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        """Number of operations waiting for a slot."""
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        """Wait for a free slot."""
+        with self._lock:
+            if self.running < self.limit and not self._waiters:
+                self.running += 1
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+        try:
+            await waiter
+        except BaseException:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # The slot was handed over just as this waiter was cancelled; pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """Free a slot, handing it directly to the longest-waiting operation if any."""
+        with self._lock:
+            if not self._waiters:
+                self.running -= 1
+                return
+            waiter = self._waiters.popleft()
+        try:
+            waiter.get_loop().call_soon_threadsafe(self._grant, waiter)
+        except RuntimeError:
+            # The waiter's event loop has been closed; give the slot to the next one
+            self.release()
+
+    def _grant(self, waiter: asyncio.Future) -> None:
+        """Wake a waiter with the slot, or pass the slot on if it was cancelled meanwhile."""
+        if waiter.done():
+            self.release()
+        else:
+            waiter.set_result(None)
+
+CONCURRENCY_POOLS = ("research_units", "tool_calls", "search_requests", "summarizations")
+PROCESS_SCOPE = "process"
+
+class ConcurrencyGovernor:
+    """Run-scoped and process-scoped concurrency pools for every nested fan-out.
+
+    Research units, researcher tool calls, search requests and summarizations each
+    acquire a slot in their named pool, first for their run and then for the whole
+    process, so concurrency stays bounded however the fan-outs multiply. Run pools
+    are dropped as soon as nothing uses them.
+    """
+
+    def __init__(self):
+        """Create a governor with no pools yet."""
+        self._pools: Dict[Tuple[str, str, int], ConcurrencyPool] = {}
+        self._users: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _checkout(self, scope: str, pool_name: str, limit: int) -> Tuple[tuple, ConcurrencyPool]:
+        """Return the pool for a scope and limit, creating it on first use."""
+        pool_key = (scope, pool_name, limit)
+        with self._lock:
+            if pool_key not in self._pools:
+                self._pools[pool_key] = ConcurrencyPool(limit)
+            self._users[pool_key] += 1
+            return pool_key, self._pools[pool_key]
+
+    def _checkin(self, pool_key: tuple) -> None:
+        """Release a use of a pool, dropping idle run pools."""
+        with self._lock:
+            self._users[pool_key] -= 1
+            if self._users[pool_key] <= 0:
+                del self._users[pool_key]
+                if pool_key[0] != PROCESS_SCOPE:
+                    del self._pools[pool_key]
+
+    @asynccontextmanager
+    async def slot(self, pool_name: str, config: RunnableConfig) -> AsyncIterator[None]:
+        """Hold a slot in the run's and the process's pool for the duration of the block.
+
+        Args:
+            pool_name: One of CONCURRENCY_POOLS
+            config: Runtime configuration with the concurrency limits and run identity
+        """
+        configurable = Configuration.from_runnable_config(config)
+        scoped_limits = [
+            (get_run_scope(config), configurable.run_concurrency_limits),
+            (PROCESS_SCOPE, configurable.process_concurrency_limits),
+        ]
+        acquired = []
+        try:
+            for scope, limits in scoped_limits:
+                limit = getattr(limits, pool_name, None) if limits else None
+                if not limit:
+                    continue
+                pool_key, pool = self._checkout(scope, pool_name, limit)
+                try:
+                    await pool.acquire()
+                except BaseException:
+                    self._checkin(pool_key)
+                    raise
+                acquired.append((pool_key, pool))
+            yield
+        finally:
+            for pool_key, pool in reversed(acquired):
+                pool.release()
+                self._checkin(pool_key)
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """Return the limit, running and queued counts of every pool, grouped by scope."""
+        stats: Dict[str, Dict[str, Dict[str, int]]] = {}
+        with self._lock:
+            pools = list(self._pools.items())
+        for (scope, pool_name, limit), pool in pools:
+            pool_stats = stats.setdefault(scope, {}).setdefault(
+                pool_name, {"limit": 0, "running": 0, "queued": 0}
+            )
+            pool_stats["limit"] = max(pool_stats["limit"], limit)
+            pool_stats["running"] += pool.running
+            pool_stats["queued"] += pool.queued
+        return stats
+
+# Configurable key carrying the identity of a research run into its subgraphs and tools
+RUN_SCOPE_KEY = "run_scope"
+
+def _run_identity(config: RunnableConfig) -> Optional[str]:
+    """Return the run identity carried by a config, if any."""
+    config = config or {}
+    configurable = config.get("configurable", {})
+    metadata = config.get("metadata", {})
+    return (
+        configurable.get(RUN_SCOPE_KEY)
+        or configurable.get("run_id")
+        or config.get("run_id")
+        or metadata.get("run_id")
+        or configurable.get("thread_id")
+    )
+
+def with_run_scope(config: RunnableConfig) -> RunnableConfig:
+    """Return the config with its run identity pinned under RUN_SCOPE_KEY.
+
+    Runs invoked without a run_id or thread_id get a fresh unique identity, so
+    concurrent runs in one process never share run-scoped limits.
+    """
+    config = config or {}
+    configurable = config.get("configurable", {})
+    if configurable.get(RUN_SCOPE_KEY):
+        return config
+    run_identity = _run_identity(config) or str(uuid.uuid4())
+    return {**config, "configurable": {**configurable, RUN_SCOPE_KEY: str(run_identity)}}
+
+def get_run_scope(config: RunnableConfig) -> str:
+    """Identify the research run a call belongs to, for run-scoped concurrency limits.
+
+    Uses the identity pinned by with_run_scope, or the run_id or thread_id from the
+    config. A call with no identity at all gets a scope of its own rather than one
+    shared with other runs.
+    """
+    return f"run:{_run_identity(config) or uuid.uuid4()}"
+
+# Process-wide governor shared by every run and nested fan-out
+concurrency_governor = ConcurrencyGovernor()
+
+def concurrency_slot(pool_name: str, config: RunnableConfig):
+    """Async context manager holding a slot in the named run and process concurrency pools."""
+    return concurrency_governor.slot(pool_name, config)
+
+def get_concurrency_stats() -> Dict[str, Dict[str, Dict[str, int]]]:
+    """Return current and queued counts for every concurrency pool, for capacity planning."""
+    return concurrency_governor.stats()
+
+##########################
+# Research Unit Pool Utils
+##########################
+
+class ResearchUnitPool:
+    """Bounded pool of research units that keep running across supervisor steps.
+
+    Units are accepted immediately and run at most max_concurrent at a time, so the
+    supervisor can react to each unit as it completes and dispatch new work while
+    slower units are still running.
+    """
+
+    def __init__(self, max_concurrent: int):
+        """Create an empty pool running at most max_concurrent units at once."""
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._topics: Dict[str, str] = {}
+
+    def submit(self, unit_id: str, topic: str, run: Callable[[asyncio.Semaphore], Awaitable[Any]]) -> None:
+        """Queue a research unit; it starts as soon as a slot is free.
+
+        Args:
+            unit_id: Identifier the unit's result is collected under
+            topic: Research topic of the unit
+            run: Coroutine function given the pool's slots, which it holds while working and
+                may release between retries so queued units can run meanwhile
+        """
+        self._tasks[unit_id] = asyncio.create_task(run(self._slots))
+        self._topics[unit_id] = topic
+
+    @property
+    def pending(self) -> int:
+        """Number of units that have not been collected yet."""
+        return len(self._tasks)
+
+    async def wait_for_any(self) -> None:
+        """Wait until at least one unit has completed, if any are outstanding."""
+        if self._tasks and not any(task.done() for task in self._tasks.values()):
+            await asyncio.wait(self._tasks.values(), return_when=asyncio.FIRST_COMPLETED)
+
+    def pop_completed(self) -> List[Tuple[str, str, Any]]:
+        """Collect completed units in submission order.
+
+        Returns:
+            Tuples of unit id, research topic, and the unit's result or raised exception
+        """
+        completed = []
+        for unit_id, task in list(self._tasks.items()):
+            if not task.done():
+                continue
+            del self._tasks[unit_id]
+            topic = self._topics.pop(unit_id)
+            if task.cancelled():
+                completed.append((unit_id, topic, asyncio.CancelledError()))
+            else:
+                completed.append((unit_id, topic, task.exception() or task.result()))
+        return completed
+
+    async def drain(self) -> List[Tuple[str, str, Any]]:
+        """Wait for every outstanding unit and collect them all."""
+        if self._tasks:
+            await asyncio.wait(self._tasks.values())
+        return self.pop_completed()
+
+    def cancel(self) -> None:
+        """Cancel every unit that is still queued or running."""
+        for task in self._tasks.values():
+            task.cancel()
+
+# Pools of in-flight research units, keyed by the pool id stored in supervisor state. Their
+# tasks only exist in this process, for as long as the supervisor that opened the pool runs.
+research_unit_pools: Dict[str, ResearchUnitPool] = {}
+
+def open_research_unit_pool(max_concurrent: int) -> str:
+    """Create a pool for a research run and return its id."""
+    pool_id = str(uuid.uuid4())
+    research_unit_pools[pool_id] = ResearchUnitPool(max_concurrent)
+    return pool_id
+
+def get_research_unit_pool(pool_id: Optional[str]) -> ResearchUnitPool:
+    """Return the pool for a research run.
+
+    Raises:
+        RuntimeError: If this process has no open pool with the given id, for example
+            when a checkpointed run resumes in another process, whose in-flight
+            research units cannot be recovered
+    """
+    pool = research_unit_pools.get(pool_id) if pool_id else None
+    if pool is None:
+        raise RuntimeError(
+            f"Research unit pool {pool_id!r} is not open in this process. In-flight research "
+            "units cannot be resumed after the supervisor that opened the pool has exited."
+        )
+    return pool
+
+def release_research_unit_pool(pool_id: str) -> None:
+    """Forget a research run's pool and cancel any units it still has running."""
+    pool = research_unit_pools.pop(pool_id, None)
+    if pool:
+        pool.cancel()
+
+##########################
+# Rolling Compression Utils
+##########################
+
+class RollingCompression:
+    """Chain of background folds that keep a researcher's compressed notes up to date.
+
+    Each fold runs as a detached task that first waits for the previous fold, so folds
+    apply in order while the researcher loop never waits on them. A failed fold keeps
+    the notes of the last successful one, and its messages are picked up by the next.
+    """
+
+    def __init__(self):
+        """Create a chain with no folds scheduled."""
+        self._latest: Optional[asyncio.Task] = None
+
+    def fold(
+        self,
+        messages: List[MessageLikeRepresentation],
+        fold_step: Callable[[str, List[MessageLikeRepresentation]], Awaitable[str]]
+    ) -> None:
+        """Schedule folding the transcript so far into the notes, after any earlier folds.
+
+        Args:
+            messages: Full researcher transcript at the time of the fold
+            fold_step: Coroutine function merging the current notes with the new messages
+        """
+        previous = self._latest
+
+        async def run_fold() -> Tuple[str, int]:
+            notes, through = await previous if previous else ("", 0)
+            if len(messages) <= through:
+                return notes, through
+            try:
+                return await fold_step(notes, messages[through:]), len(messages)
+            except Exception as e:
+                logging.warning(f"Incremental research compression failed, deferring to the next fold: {e}")
+                return notes, through
+
+        self._latest = asyncio.create_task(run_fold())
+
+    async def result(self) -> Tuple[str, int]:
+        """Wait for every scheduled fold and return the notes and how many messages they cover."""
+        return await self._latest if self._latest else ("", 0)
+
+    def cancel(self) -> None:
+        """Cancel the folds still running; cancelling the last one cancels those it waits on."""
+        if self._latest:
+            self._latest.cancel()
+
+# Rolling compressions of running researchers, keyed by the id stored in researcher state.
+# A researcher resumed in another process starts a new chain that folds its whole transcript.
+rolling_compressions: Dict[str, RollingCompression] = {}
+
+def get_rolling_compression(rolling_compression_id: str) -> RollingCompression:
+    """Return the rolling compression for a researcher, creating it on first use."""
+    if rolling_compression_id not in rolling_compressions:
+        rolling_compressions[rolling_compression_id] = RollingCompression()
+    return rolling_compressions[rolling_compression_id]
+
+def pop_rolling_compression(rolling_compression_id: str) -> Optional[RollingCompression]:
+    """Remove and return a researcher's rolling compression, or None if this process has none."""
+    return rolling_compressions.pop(rolling_compression_id, None)
+
+def release_rolling_compression(rolling_compression_id: str) -> None:
+    """Forget a researcher's rolling compression and cancel any folds still running."""
+    rolling_compression = pop_rolling_compression(rolling_compression_id)
+    if rolling_compression:
+        rolling_compression.cancel()
+
 ##########################
 # Misc Utils
 ##########################
@@ -0,0 +1,19 @@
+"""HTTP app mounted by the LangGraph server to manage process-wide resources."""
+
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+
+from open_deep_research.configuration import Configuration
+from open_deep_research.utils import aclose_http_clients, load_tokenizers
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    """Warm the default models' tokenizers at startup; close pooled clients and sessions at shutdown."""
+    await load_tokenizers(Configuration())
+    yield
+    await aclose_http_clients()
+
+
+app = Starlette(lifespan=lifespan)
@@ -1,11 +1,71 @@
 
+import asyncio
+import os
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import AsyncMock
+from collections import Counter
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import tiktoken
 from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from tavily import AsyncTavilyClient
 
-from open_deep_research.state import Summary
-from open_deep_research.utils import summarize_webpage
+from open_deep_research.configuration import Configuration
+from open_deep_research.state import Summaries, Summary
+from open_deep_research.utils import (
+    ConcurrencyGovernor,
+    ConcurrencyPool,
+    MCPSessionHandle,
+    MCPSessionManager,
+    MCPTokenCache,
+    ModelCache,
+    NearDuplicateDetector,
+    PersistentCache,
+    PromptCacheStats,
+    SingleFlight,
+    SummarizationPolicy,
+    SummarizationStats,
+    SummaryCache,
+    TokenBucket,
+    TokenCounter,
+    ToolRegistry,
+    aclose_http_clients,
+    apply_prompt_cache_breakpoints,
+    cluster_notes,
+    compact_tool_messages,
+    count_message_tokens,
+    fetch_tokens,
+    fit_messages_to_token_budget,
+    fit_text_to_token_budget,
+    get_all_tools,
+    get_chat_model,
+    get_http_session,
+    get_prompt_token_budget,
+    get_rate_limiter,
+    get_run_scope,
+    get_search_cache,
+    get_summary_cache,
+    get_tavily_client,
+    get_tools_by_name,
+    make_search_cache_key,
+    open_research_unit_pool,
+    pack_summarization_batches,
+    release_research_unit_pool,
+    research_unit_pools,
+    select_relevant_passages,
+    summarize_webpage,
+    summarize_webpages_batch,
+    tavily_search,
+    tavily_search_async,
+    token_counter,
+    with_run_scope,
+)
+from open_deep_research.webapp import app as webapp
+from open_deep_research.webapp import lifespan
 
 
 class TestSummarizeWebpage(unittest.IsolatedAsyncioTestCase):
@@ -37,11 +97,1402 @@ class TestSummarizeWebpage(unittest.IsolatedAsyncioTestCase):
             key_excerpts="Long excerpts."
         )
 
-        long_content = "a" * 5000
+        long_content = "a" * 10000
         result = await summarize_webpage(mock_model, long_content)
 
         mock_model.ainvoke.assert_called_once()
         self.assertIn("<summary>\nLong summary.\n</summary>", result)
 
+    async def test_mid_sized_content_is_compressed_without_llm(self):
+        mock_model = AsyncMock(spec=BaseChatModel)
+        policy = SummarizationPolicy(passthrough_chars=3000, llm_min_chars=20000, stats=SummarizationStats())
+        filler = "\n\n".join(f"Unrelated paragraph {i} about site navigation." * 5 for i in range(40))
+        content = filler + "\n\nThe fusion reactor reached ignition in 2022."
+
+        result = await summarize_webpage(mock_model, content, policy=policy, query="fusion ignition")
+
+        mock_model.ainvoke.assert_not_called()
+        self.assertIn("The fusion reactor reached ignition in 2022.", result)
+        self.assertLessEqual(len(result), 3000 + len("<summary>\n\n</summary>"))
+        self.assertEqual(policy.stats.stats()["tiers"]["extractive"]["count"], 1)
+
+class TestSummarizationPolicy(unittest.TestCase):
+    def test_pages_are_routed_by_length(self):
+        policy = SummarizationPolicy(passthrough_chars=100, llm_min_chars=1000, stats=SummarizationStats())
+        self.assertEqual(policy.tier("x" * 99), "passthrough")
+        self.assertEqual(policy.tier("x" * 100), "extractive")
+        self.assertEqual(policy.tier("x" * 1000), "llm")
+
+    def test_timeout_adapts_to_observed_latency(self):
+        stats = SummarizationStats()
+        policy = SummarizationPolicy(max_timeout=60.0, stats=stats, min_samples=20)
+        for _ in range(19):
+            stats.record("llm", 2.0)
+        self.assertEqual(policy.timeout(), 60.0)
+
+        stats.record("llm", 2.0)
+        self.assertEqual(policy.timeout(), 10.0)
+
+        for _ in range(20):
+            stats.record("llm", 8.0)
+        self.assertEqual(policy.timeout(), 24.0)
+
+class TestTavilySearchStreaming(unittest.IsolatedAsyncioTestCase):
+    async def test_output_order_follows_queries_not_completion(self):
+        delays = {"slow query": 0.05, "fast query": 0.0}
+
+        async def search(query, **kwargs):
+            await asyncio.sleep(delays[query])
+            return {"query": query, "results": [
+                {"url": f"https://{query.split()[0]}.example", "title": query,
+                 "content": "snippet", "raw_content": f"page for {query}"},
+                {"url": "https://shared.example", "title": "shared",
+                 "content": "snippet", "raw_content": "shared page"},
+            ]}
+
+        tavily_client = MagicMock()
+        tavily_client.search = AsyncMock(side_effect=search)
+        config = {"configurable": {"search_cache_enabled": False, "summary_cache_enabled": False}}
+
+        with patch("open_deep_research.utils.get_tavily_client", return_value=tavily_client), \
+                patch("open_deep_research.utils.model_cache", ModelCache()), \
+                patch("open_deep_research.utils.init_chat_model"):
+            output = await tavily_search.coroutine(["slow query", "fast query"], config=config)
+
+        self.assertLess(output.index("https://slow.example"), output.index("https://shared.example"))
+        self.assertLess(output.index("https://shared.example"), output.index("https://fast.example"))
+        self.assertEqual(output.count("--- SOURCE"), 3)
+
+    async def test_near_duplicates_resolve_to_the_earliest_query(self):
+        article = " ".join(f"word{i % 997} token{i % 389}" for i in range(3000))
+        pages = {
+            "slow query": ("https://original.example", article),
+            "fast query": ("https://mirror.example", "Republished. " + article),
+        }
+        delays = {"slow query": 0.05, "fast query": 0.0}
+
+        async def search(query, **kwargs):
+            await asyncio.sleep(delays[query])
+            url, raw_content = pages[query]
+            return {"query": query, "results": [
+                {"url": url, "title": query, "content": "snippet", "raw_content": raw_content},
+            ]}
+
+        tavily_client = MagicMock()
+        tavily_client.search = AsyncMock(side_effect=search)
+        config = {"configurable": {
+            "search_cache_enabled": False,
+            "summary_cache_enabled": False,
+            "deduplicate_near_duplicates": True,
+        }}
+
+        with patch("open_deep_research.utils.get_tavily_client", return_value=tavily_client), \
+                patch("open_deep_research.utils.model_cache", ModelCache()), \
+                patch("open_deep_research.utils.init_chat_model"):
+            output = await tavily_search.coroutine(["slow query", "fast query"], config=config)
+
+        self.assertIn("URL: https://original.example", output)
+        self.assertIn("ALTERNATE URLS: https://mirror.example", output)
+        self.assertEqual(output.count("--- SOURCE"), 1)
+
+class TestHTTPClientPool(unittest.IsolatedAsyncioTestCase):
+    async def test_tavily_client_requests_use_the_pooled_client(self):
+        # get_tavily_client relies on this private hook; fail loudly if tavily-python drops it
+        self.assertTrue(hasattr(AsyncTavilyClient(api_key="test-key"), "_client_creator"))
+
+        tavily_client = get_tavily_client("test-key")
+        async with tavily_client._client_creator() as first:
+            pass
+        async with tavily_client._client_creator() as second:
+            self.assertIs(first, second)
+        self.assertFalse(first.is_closed)
+        await aclose_http_clients()
+        self.assertTrue(first.is_closed)
+
+    async def test_server_lifespan_closes_pooled_clients(self):
+        session = get_http_session()
+        async with lifespan(webapp):
+            pass
+        self.assertTrue(session.closed)
+
+class TestBatchSummarization(unittest.IsolatedAsyncioTestCase):
+    async def test_one_call_for_batch_and_short_pages_pass_through(self):
+        batch_model = AsyncMock(spec=BaseChatModel)
+        batch_model.ainvoke.return_value = Summaries(summaries=[
+            Summary(summary="First.", key_excerpts=""),
+            Summary(summary="Second.", key_excerpts=""),
+        ])
+        model = AsyncMock(spec=BaseChatModel)
+
+        results = await summarize_webpages_batch(
+            model, batch_model, ["a" * 10000, "short", "b" * 10000], model_name="test:model"
+        )
+
+        batch_model.ainvoke.assert_called_once()
+        model.ainvoke.assert_not_called()
+        self.assertIn("First.", results[0])
+        self.assertIn("<summary>\nshort\n</summary>", results[1])
+        self.assertIn("Second.", results[2])
+
+    async def test_falls_back_to_per_page_calls_on_count_mismatch(self):
+        batch_model = AsyncMock(spec=BaseChatModel)
+        batch_model.ainvoke.return_value = Summaries(summaries=[
+            Summary(summary="Only one.", key_excerpts=""),
+        ])
+        model = AsyncMock(spec=BaseChatModel)
+        model.ainvoke.return_value = Summary(summary="Individual.", key_excerpts="")
+
+        results = await summarize_webpages_batch(
+            model, batch_model, ["a" * 10000, "b" * 10000], model_name="test:model"
+        )
+
+        self.assertEqual(model.ainvoke.call_count, 2)
+        self.assertTrue(all("Individual." in result for result in results))
+
+    async def test_fallback_calls_each_hold_their_own_slot(self):
+        batch_model = AsyncMock(spec=BaseChatModel)
+        batch_model.ainvoke.side_effect = ValueError("malformed output")
+        slots = asyncio.Semaphore(1)
+        running, peak = 0, 0
+
+        async def summarize(messages):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return Summary(summary="Individual.", key_excerpts="")
+
+        model = AsyncMock(spec=BaseChatModel)
+        model.ainvoke.side_effect = summarize
+
+        # A one-slot pool would deadlock if the fallback ran inside the batch call's slot
+        results = await asyncio.wait_for(summarize_webpages_batch(
+            model, batch_model, ["a" * 10000, "b" * 10000, "c" * 10000],
+            model_name="test:model", slot=lambda: slots
+        ), timeout=1)
+
+        self.assertEqual(model.ainvoke.call_count, 3)
+        self.assertEqual(peak, 1)
+        self.assertTrue(all("Individual." in result for result in results))
+
+    def test_packing_respects_budget_and_skips_large_pages(self):
+        pages = {
+            "short": "s" * 100,
+            "mid1": "a" * 10000,
+            "mid2": "b" * 10000,
+            "mid3": "c" * 10000,
+            "large": "d" * 40000,
+        }
+        # Each mid page is about 2900 tokens; a 6000 token budget fits two
+        batches, single_pages = pack_summarization_batches(pages, 6000)
+
+        self.assertEqual([list(batch) for batch in batches], [["mid1", "mid2"]])
+        self.assertEqual(set(single_pages), {"short", "mid3", "large"})
+
+class TestModelCache(unittest.TestCase):
+    def setUp(self):
+        self.model_config = {"model": "openai:gpt-4.1", "max_tokens": 100, "api_key": "key-a"}
+
+    def test_same_config_is_constructed_once(self):
+        with patch("open_deep_research.utils.model_cache", ModelCache()), \
+                patch("open_deep_research.utils.init_chat_model") as init_chat_model:
+            first = get_chat_model(self.model_config, structured_output=Summary, max_retries=3)
+            second = get_chat_model(dict(self.model_config), structured_output=Summary, max_retries=3)
+            get_chat_model(self.model_config, structured_output=Summaries, max_retries=3)
+
+        self.assertIs(first, second)
+        init_chat_model.assert_called_once()
+        self.assertEqual(init_chat_model.return_value.with_structured_output.call_count, 2)
+
+    def test_different_api_key_gets_its_own_model(self):
+        with patch("open_deep_research.utils.model_cache", ModelCache()), \
+                patch("open_deep_research.utils.init_chat_model") as init_chat_model:
+            get_chat_model(self.model_config)
+            get_chat_model({**self.model_config, "api_key": "key-b"})
+
+        self.assertEqual(init_chat_model.call_count, 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ModelCache(max_entries=2)
+        cache.get_or_create(("a",), object)
+        cache.get_or_create(("b",), object)
+        cache.get_or_create(("a",), object)
+        cache.get_or_create(("c",), object)
+
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 3, "evictions": 1, "size": 2})
+        factory = MagicMock()
+        cache.get_or_create(("a",), factory)
+        factory.assert_not_called()
+
+class TestPromptCaching(unittest.TestCase):
+    def setUp(self):
+        self.messages = [
+            SystemMessage(content="You are a researcher."),
+            HumanMessage(content="Research topic"),
+            AIMessage(content="", tool_calls=[{"name": "think_tool", "args": {}, "id": "call-1"}]),
+            ToolMessage(content="Reflection recorded", tool_call_id="call-1"),
+        ]
+
+    def test_anthropic_breakpoints_on_system_and_last_message(self):
+        marked = apply_prompt_cache_breakpoints(self.messages, "anthropic:claude-sonnet-4-20250514")
+
+        self.assertEqual(marked[0].content[-1]["cache_control"], {"type": "ephemeral"})
+        self.assertEqual(marked[-1].content[-1]["cache_control"], {"type": "ephemeral"})
+        self.assertEqual(marked[1:3], self.messages[1:3])
+        self.assertEqual(self.messages[0].content, "You are a researcher.")
+
+    def test_other_providers_are_left_unchanged(self):
+        marked = apply_prompt_cache_breakpoints(self.messages, "openai:gpt-4.1")
+
+        self.assertIs(marked, self.messages)
+
+    def test_hit_rate_reported_per_node(self):
+        stats = PromptCacheStats()
+        response = AIMessage(content="", usage_metadata={
+            "input_tokens": 1000, "output_tokens": 10, "total_tokens": 1010,
+            "input_token_details": {"cache_read": 800, "cache_creation": 100},
+        })
+        stats.record("researcher", response)
+        stats.record("researcher", response)
+        stats.record("supervisor", AIMessage(content="no usage"))
+
+        self.assertEqual(stats.stats()["researcher"]["cache_read_tokens"], 1600)
+        self.assertAlmostEqual(stats.stats()["researcher"]["hit_rate"], 0.8)
+        self.assertNotIn("supervisor", stats.stats())
+
+class TestTokenAccounting(unittest.TestCase):
+    model_name = "anthropic:claude-sonnet-4-20250514"
+
+    def make_transcript(self, turns, result_chars):
+        messages = [SystemMessage(content="System prompt"), HumanMessage(content="Research topic")]
+        for turn in range(turns):
+            call_id = f"call-{turn}"
+            messages.append(AIMessage(content="", tool_calls=[{"name": "tavily_search", "args": {"queries": [str(turn)]}, "id": call_id}]))
+            messages.append(ToolMessage(content=f"result {turn} " + "x" * result_chars, tool_call_id=call_id))
+        return messages
+
+    def test_prompt_budget_reserves_output_and_margin(self):
+        self.assertEqual(get_prompt_token_budget(self.model_name, 10000), 180000)
+        self.assertIsNone(get_prompt_token_budget("unknown:model", 10000))
+
+    def test_text_is_truncated_to_budget(self):
+        text = "word " * 10000
+        fitted = fit_text_to_token_budget(text, self.model_name, 500)
+
+        self.assertLessEqual(count_message_tokens([fitted], self.model_name), 500 + 4)
+        self.assertTrue(text.startswith(fitted))
+
+    def test_transcript_within_budget_is_unchanged(self):
+        messages = self.make_transcript(turns=3, result_chars=100)
+
+        self.assertIs(fit_messages_to_token_budget(messages, self.model_name, 100000), messages)
+        self.assertIs(fit_messages_to_token_budget(messages, self.model_name, None), messages)
+
+    def test_oldest_turns_are_dropped_whole(self):
+        messages = self.make_transcript(turns=5, result_chars=3500)
+        fitted = fit_messages_to_token_budget(messages, self.model_name, 2500)
+
+        self.assertLessEqual(count_message_tokens(fitted, self.model_name), 2500)
+        self.assertEqual(fitted[:2], messages[:2])
+        self.assertEqual(fitted[-2:], messages[-2:])
+        self.assertIsInstance(fitted[2], AIMessage)
+
+    def test_oversized_last_turn_is_truncated(self):
+        messages = self.make_transcript(turns=2, result_chars=35000)
+        fitted = fit_messages_to_token_budget(messages, self.model_name, 2000)
+
+        self.assertLessEqual(count_message_tokens(fitted, self.model_name), 2000)
+        self.assertEqual(len(fitted), 4)
+        self.assertTrue(fitted[-1].content.startswith("result 1"))
+
+    def test_tokenizer_is_loaded_off_the_event_loop(self):
+        counter = TokenCounter()
+        byte_encoding = tiktoken.Encoding(
+            name="bytes", pat_str=r"[\s\S]",
+            mergeable_ranks={bytes([i]): i for i in range(256)}, special_tokens={}
+        )
+        loaded_in = []
+
+        def get_encoding(name):
+            loaded_in.append(threading.current_thread())
+            return byte_encoding
+
+        with patch("open_deep_research.utils.tiktoken.get_encoding", side_effect=get_encoding):
+            asyncio.run(counter.aload("openai:gpt-4.1"))
+            self.assertEqual(counter.count_text("abc", "openai:gpt-4.1"), 3)
+
+        self.assertEqual(len(loaded_in), 1)
+        self.assertIsNot(loaded_in[0], threading.main_thread())
+
+class TestContextCompaction(unittest.IsolatedAsyncioTestCase):
+    def make_transcript(self, turns):
+        messages = [HumanMessage(content="solar panel efficiency")]
+        for turn in range(turns):
+            call_id = f"call-{turn}"
+            messages.append(AIMessage(content="", tool_calls=[{"name": "tavily_search", "args": {}, "id": call_id}]))
+            paragraphs = [f"Paragraph {i} about unrelated gardening tips and recipes." for i in range(150)]
+            paragraphs[90] = "Solar panel efficiency reached a record of 47 percent."
+            messages.append(ToolMessage(content="\n\n".join(paragraphs), tool_call_id=call_id))
+        return messages
+
+    def test_older_results_become_digests_and_recent_turns_stay_verbatim(self):
+        messages = self.make_transcript(turns=4)
+        compacted, full_texts = compact_tool_messages(messages, "solar panel efficiency", keep_recent_turns=2, digest_chars=2100)
+
+        self.assertEqual(len(compacted), len(messages))
+        self.assertEqual(full_texts, [messages[2].content, messages[4].content])
+        self.assertIn("47 percent", compacted[2].content)
+        self.assertLess(len(compacted[2].content), 2300)
+        self.assertEqual(compacted[2].tool_call_id, "call-0")
+        self.assertEqual(compacted[6:], messages[6:])
+        self.assertFalse(messages[2].additional_kwargs)
+
+        again, more_texts = compact_tool_messages(compacted, "solar panel efficiency", keep_recent_turns=2, digest_chars=2100)
+        self.assertEqual(again, compacted)
+        self.assertEqual(more_texts, [])
+
+    async def test_compact_research_moves_full_text_to_raw_notes(self):
+        from open_deep_research.deep_researcher import compact_research
+
+        messages = self.make_transcript(turns=3)
+        command = await compact_research(
+            {"researcher_messages": messages, "research_topic": "solar panel efficiency"},
+            {"configurable": {"researcher_compaction_keep_recent_turns": 1}}
+        )
+
+        self.assertEqual(command.goto, "researcher")
+        self.assertEqual(command.update["raw_notes"], [messages[2].content, messages[4].content])
+        self.assertEqual(command.update["researcher_messages"]["type"], "override")
+
+class TestIncrementalCompression(unittest.IsolatedAsyncioTestCase):
+    async def run_researcher(self, configurable):
+        from langchain_core.tools import tool
+
+        from open_deep_research.deep_researcher import researcher_subgraph
+
+        @tool
+        async def search(query: str) -> str:
+            """Search the web."""
+            return f"Findings about {query}"
+
+        researcher_turns = [
+            AIMessage(content="", tool_calls=[{"name": "search", "args": {"query": "first"}, "id": "call-1"}]),
+            AIMessage(content="", tool_calls=[{"name": "search", "args": {"query": "second"}, "id": "call-2"}]),
+            AIMessage(content="Done researching."),
+        ]
+        compression_prompts = []
+
+        async def compression_call(messages):
+            compression_prompts.append(messages[-1].content)
+            return AIMessage(content=f"notes after {len(compression_prompts)} folds")
+
+        research_model = MagicMock(ainvoke=AsyncMock(side_effect=researcher_turns))
+        compression_model = MagicMock(ainvoke=AsyncMock(side_effect=compression_call))
+
+        def fake_get_chat_model(model_config, tools=None, **kwargs):
+            return research_model if tools else compression_model
+
+        with patch("open_deep_research.deep_researcher.get_chat_model", side_effect=fake_get_chat_model), \
+                patch("open_deep_research.deep_researcher.get_all_tools", AsyncMock(return_value=[search])), \
+                patch("open_deep_research.deep_researcher.get_tools_by_name", AsyncMock(return_value={"search": search})):
+            result = await researcher_subgraph.ainvoke(
+                {"researcher_messages": [HumanMessage(content="topic")], "research_topic": "topic"},
+                {"configurable": {"research_model": "openai:gpt-4.1", **configurable}}
+            )
+        return result, compression_prompts
+
+    async def test_steps_are_folded_as_research_runs(self):
+        result, compression_prompts = await self.run_researcher({"incremental_compression": True})
+
+        self.assertEqual(len(compression_prompts), 2)
+        self.assertIn("Findings about first", compression_prompts[0])
+        self.assertNotIn("Findings about first", compression_prompts[1])
+        self.assertIn("notes after 1 folds", compression_prompts[1])
+        self.assertEqual(result["compressed_research"], "notes after 2 folds")
+        self.assertIn("Findings about second", "\n".join(result["raw_notes"]))
+
+    async def test_research_iterations_do_not_wait_for_folds(self):
+        from langchain_core.tools import tool
+
+        from open_deep_research.deep_researcher import run_research_unit
+
+        @tool
+        async def search(query: str) -> str:
+            """Search the web."""
+            return f"Findings about {query}"
+
+        research_call_times = []
+
+        async def research_call(messages):
+            research_call_times.append(time.monotonic())
+            await asyncio.sleep(0.01)
+            if len(research_call_times) > 4:
+                return AIMessage(content="Done researching.")
+            query = f"query {len(research_call_times)}"
+            return AIMessage(content="", tool_calls=[{"name": "search", "args": {"query": query}, "id": query}])
+
+        folds = 0
+
+        async def compression_call(messages):
+            nonlocal folds
+            await asyncio.sleep(0.2)
+            folds += 1
+            return AIMessage(content=f"notes after {folds} folds")
+
+        research_model = MagicMock(ainvoke=AsyncMock(side_effect=research_call))
+        compression_model = MagicMock(ainvoke=AsyncMock(side_effect=compression_call))
+
+        def fake_get_chat_model(model_config, tools=None, **kwargs):
+            return research_model if tools else compression_model
+
+        with patch("open_deep_research.deep_researcher.get_chat_model", side_effect=fake_get_chat_model), \
+                patch("open_deep_research.deep_researcher.get_all_tools", AsyncMock(return_value=[search])), \
+                patch("open_deep_research.deep_researcher.get_tools_by_name", AsyncMock(return_value={"search": search})):
+            result = await run_research_unit("topic", {"configurable": {
+                "research_model": "openai:gpt-4.1", "incremental_compression": True,
+                "research_unit_timeout_seconds": 0,
+            }})
+
+        # Each iteration follows the previous one without waiting for a 0.2s fold
+        gaps = [later - earlier for earlier, later in zip(research_call_times, research_call_times[1:])]
+        self.assertEqual(len(gaps), 4)
+        self.assertLess(max(gaps), 0.1)
+        self.assertEqual(result["compressed_research"], "notes after 4 folds")
+
+    async def test_full_compression_by_default(self):
+        result, compression_prompts = await self.run_researcher({})
+
+        self.assertEqual(len(compression_prompts), 1)
+        self.assertEqual(result["compressed_research"], "notes after 1 folds")
+
+class TestMapReduceReport(unittest.IsolatedAsyncioTestCase):
+    model_name = "anthropic:claude-sonnet-4-20250514"
+
+    def make_notes(self, count):
+        return [f"Note {index}: " + "finding " * 110 for index in range(count)]
+
+    def test_notes_are_packed_in_order_within_budget(self):
+        notes = self.make_notes(5) + ["Huge note: " + "word " * 2000]
+        clusters = cluster_notes(notes, self.model_name, max_tokens=600)
+
+        self.assertTrue(clusters[0].startswith("Note 0") and "Note 1" in clusters[0])
+        self.assertTrue(all(len(cluster) <= 600 * 3.5 for cluster in clusters))
+        self.assertEqual("".join(clusters).count("word"), 2000)
+
+    def test_multibyte_note_is_split_on_token_offsets(self):
+        # Byte-level encoding: every multibyte character spans several tokens
+        byte_encoding = tiktoken.Encoding(
+            name="bytes", pat_str=r"[\s\S]",
+            mergeable_ranks={bytes([value]): value for value in range(256)}, special_tokens={}
+        )
+        note = "研究结果显示" * 50 + "🔬" * 30
+        with patch.object(token_counter, "_get_encoding", return_value=byte_encoding):
+            clusters = cluster_notes([note], "openai:gpt-4.1", max_tokens=101)
+
+        self.assertGreater(len(clusters), 1)
+        self.assertEqual("".join(clusters), note)
+
+    async def generate_report(self, notes, configurable):
+        from open_deep_research.deep_researcher import final_report_generation
+
+        prompts = []
+        in_flight = 0
+        max_in_flight = 0
+
+        async def write(messages):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            prompts.append(messages[-1].content)
+            return AIMessage(content=f"Draft {len(prompts)}")
+
+        writer_model = MagicMock(ainvoke=AsyncMock(side_effect=write))
+        with patch("open_deep_research.deep_researcher.get_chat_model", return_value=writer_model):
+            result = await final_report_generation(
+                {"notes": notes, "research_brief": "brief", "messages": [HumanMessage(content="question")]},
+                {"configurable": {
+                    "final_report_model": self.model_name,
+                    "report_map_reduce_threshold": 100,
+                    "report_section_max_tokens": 300,
+                    "max_concurrent_report_sections": 2,
+                    **configurable
+                }}
+            )
+        return result, prompts, max_in_flight
+
+    async def test_sections_are_drafted_concurrently_then_merged(self):
+        result, prompts, max_in_flight = await self.generate_report(self.make_notes(6), {})
+
+        self.assertEqual(len(prompts), 7)
+        self.assertEqual(max_in_flight, 2)
+        self.assertTrue(all(f"Draft {index}" in prompts[-1] for index in range(1, 7)))
+        self.assertEqual(result["final_report"], "Draft 7")
+
+    async def test_hierarchical_merge_reduces_to_one_draft(self):
+        result, prompts, _ = await self.generate_report(self.make_notes(4), {"report_merge_strategy": "hierarchical"})
+
+        # 4 section drafts, one merge of the drafts (which fit one group), then the final pass
+        self.assertEqual(len(prompts), 4 + 1 + 1)
+        self.assertIn("Draft 4", prompts[4])
+        self.assertTrue(all(prompt.startswith("You are drafting part") for prompt in prompts[:4]))
+        self.assertTrue(prompts[4].startswith("You are consolidating drafts"))
+        self.assertEqual(result["final_report"], "Draft 6")
+
+    async def test_small_findings_use_a_single_call(self):
+        result, prompts, _ = await self.generate_report(["Short note"], {})
+
+        self.assertEqual(len(prompts), 1)
+        self.assertIn("Short note", prompts[0])
+
+class TestResearchWorkQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_all_units_run_under_the_concurrency_limit_in_call_order(self):
+        from open_deep_research.deep_researcher import supervisor_tools
+
+        in_flight = 0
+        max_in_flight = 0
+
+        async def run_unit(state, config):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            topic = state["research_topic"]
+            await asyncio.sleep(0.01 * (5 - int(topic[-1])))
+            in_flight -= 1
+            return {"compressed_research": f"findings for {topic}", "raw_notes": [f"raw {topic}"]}
+
+        tool_calls = [
+            {"name": "ConductResearch", "args": {"research_topic": f"topic {index}"}, "id": f"call-{index}"}
+            for index in range(5)
+        ]
+        state = {"supervisor_messages": [AIMessage(content="", tool_calls=tool_calls)], "research_iterations": 1}
+        with patch("open_deep_research.deep_researcher.researcher_subgraph") as researcher_subgraph:
+            researcher_subgraph.ainvoke = AsyncMock(side_effect=run_unit)
+            command = await supervisor_tools(state, {"configurable": {"max_concurrent_research_units": 2, "research_unit_timeout_seconds": 0}})
+
+        messages = command.update["supervisor_messages"]
+        self.assertEqual(command.goto, "supervisor")
+        self.assertEqual([message.tool_call_id for message in messages], [f"call-{index}" for index in range(5)])
+        self.assertEqual(messages[4].content, "findings for topic 4")
+        self.assertEqual(max_in_flight, 2)
+
+class TestResearchUnitFailureIsolation(unittest.IsolatedAsyncioTestCase):
+    async def run_supervisor_tools(self, run_unit, max_retries):
+        from open_deep_research.deep_researcher import supervisor_tools
+
+        tool_calls = [
+            {"name": "ConductResearch", "args": {"research_topic": topic}, "id": f"call-{topic}"}
+            for topic in ("good", "bad")
+        ]
+        state = {"supervisor_messages": [AIMessage(content="", tool_calls=tool_calls)], "research_iterations": 1}
+        with patch("open_deep_research.deep_researcher.researcher_subgraph") as researcher_subgraph:
+            researcher_subgraph.ainvoke = AsyncMock(side_effect=run_unit)
+            return await supervisor_tools(state, {"configurable": {
+                "research_unit_timeout_seconds": 0,
+                "research_unit_max_retries": max_retries,
+                "research_unit_retry_backoff_seconds": 0,
+            }})
+
+    async def test_failed_unit_does_not_discard_the_others(self):
+        async def run_unit(state, config):
+            if state["research_topic"] == "bad":
+                raise RuntimeError("page parse failed")
+            return {"compressed_research": "good findings", "raw_notes": ["good raw"]}
+
+        command = await self.run_supervisor_tools(run_unit, max_retries=1)
+
+        good, bad = command.update["supervisor_messages"]
+        self.assertEqual(command.goto, "supervisor")
+        self.assertEqual(good.content, "good findings")
+        self.assertIn("page parse failed", bad.content)
+        self.assertEqual(command.update["raw_notes"], ["good raw"])
+
+    async def test_failed_unit_is_retried(self):
+        attempts = Counter()
+
+        async def run_unit(state, config):
+            attempts[state["research_topic"]] += 1
+            if state["research_topic"] == "bad" and attempts["bad"] == 1:
+                raise RuntimeError("transient")
+            return {"compressed_research": f"{state['research_topic']} findings", "raw_notes": []}
+
+        command = await self.run_supervisor_tools(run_unit, max_retries=1)
+
+        self.assertEqual(command.update["supervisor_messages"][1].content, "bad findings")
+        self.assertEqual(attempts, Counter({"good": 1, "bad": 2}))
+
+    async def test_retry_backoff_releases_the_research_slot(self):
+        from open_deep_research.deep_researcher import supervisor_tools
+
+        finished = []
+
+        async def run_unit(state, config):
+            topic = state["research_topic"]
+            if topic == "bad" and "bad" not in finished:
+                finished.append("bad")
+                raise RuntimeError("transient")
+            finished.append(topic)
+            return {"compressed_research": f"{topic} findings", "raw_notes": []}
+
+        tool_calls = [
+            {"name": "ConductResearch", "args": {"research_topic": topic}, "id": f"call-{topic}"}
+            for topic in ("bad", "good")
+        ]
+        state = {"supervisor_messages": [AIMessage(content="", tool_calls=tool_calls)], "research_iterations": 1}
+        with patch("open_deep_research.deep_researcher.researcher_subgraph") as researcher_subgraph:
+            researcher_subgraph.ainvoke = AsyncMock(side_effect=run_unit)
+            await supervisor_tools(state, {"configurable": {
+                "max_concurrent_research_units": 1,
+                "research_unit_timeout_seconds": 0,
+                "research_unit_max_retries": 1,
+                "research_unit_retry_backoff_seconds": 0.05,
+            }})
+
+        # The queued unit ran while the failed one was backing off
+        self.assertEqual(finished, ["bad", "good", "bad"])
+
+class TestPipelinedSupervisor(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.release = asyncio.Event()
+
+        async def run_unit(state, config):
+            if state["research_topic"].startswith("slow"):
+                await self.release.wait()
+            return {"compressed_research": f"findings for {state['research_topic']}", "raw_notes": []}
+
+        patcher = patch("open_deep_research.deep_researcher.researcher_subgraph")
+        self.addCleanup(patcher.stop)
+        patcher.start().ainvoke = AsyncMock(side_effect=run_unit)
+        self.config = {"configurable": {
+            "pipelined_supervisor": True, "max_total_research_units": 3, "research_unit_timeout_seconds": 0
+        }}
+        self.research_pool_id = open_research_unit_pool(max_concurrent=5)
+        self.addCleanup(release_research_unit_pool, self.research_pool_id)
+
+    def conduct(self, *topics):
+        return AIMessage(content="", tool_calls=[
+            {"name": "ConductResearch", "args": {"research_topic": topic}, "id": f"call-{topic}"}
+            for topic in topics
+        ])
+
+    async def test_completed_units_are_reported_while_stragglers_run(self):
+        from open_deep_research.deep_researcher import supervisor_tools
+
+        state = {
+            "supervisor_messages": [self.conduct("slow", "fast")],
+            "research_iterations": 1,
+            "research_pool_id": self.research_pool_id,
+        }
+        first = await supervisor_tools(state, self.config)
+        pending, done = first.update["supervisor_messages"]
+        self.assertTrue(pending.additional_kwargs["research_pending"])
+        self.assertEqual(done.content, "findings for fast")
+
+        # A new turn dispatches more work, capped per run, while the slow unit is still running
+        state.update(first.update)
+        state["supervisor_messages"] = [self.conduct("fast 2", "fast 3")]
+        second = await supervisor_tools(state, self.config)
+        self.assertEqual(second.update["research_units_dispatched"], 3)
+        self.assertIn("limit of 3 research units", second.update["supervisor_messages"][0].content)
+        self.assertEqual(second.update["supervisor_messages"][1].content, "findings for fast 2")
+
+        # The straggler is drained into the notes when research completes
+        self.release.set()
+        state.update(second.update)
+        state["supervisor_messages"] = [
+            pending, done, *second.update["supervisor_messages"],
+            AIMessage(content="", tool_calls=[{"name": "ResearchComplete", "args": {}, "id": "call-done"}])
+        ]
+        final = await supervisor_tools(state, self.config)
+        self.assertEqual(final.goto, "__end__")
+        notes = final.update["notes"]
+        self.assertEqual(notes[0], "findings for fast")
+        self.assertEqual(notes[-2:], ["findings for fast 2", "findings for slow"])
+        self.assertFalse(any("running in the background" in note for note in notes))
+
+    async def test_units_are_cancelled_when_the_supervisor_fails(self):
+        from open_deep_research.deep_researcher import (
+            research_supervisor,
+            supervisor_tools,
+        )
+
+        cancelled = asyncio.Event()
+
+        async def run_unit(state, config):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def fail_after_dispatch(supervisor_input, config):
+            state = {**supervisor_input, "supervisor_messages": [self.conduct("slow", "fast")], "research_iterations": 1}
+            task = asyncio.create_task(supervisor_tools(state, config))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            raise RuntimeError("supervisor model failed")
+
+        with patch("open_deep_research.deep_researcher.researcher_subgraph") as researcher_subgraph, \
+                patch("open_deep_research.deep_researcher.supervisor_subgraph") as supervisor_subgraph:
+            researcher_subgraph.ainvoke = AsyncMock(side_effect=run_unit)
+            supervisor_subgraph.ainvoke = AsyncMock(side_effect=fail_after_dispatch)
+            with self.assertRaises(RuntimeError):
+                await research_supervisor({"research_brief": "brief"}, self.config)
+
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        self.assertEqual(research_unit_pools.keys(), {self.research_pool_id})
+
+    async def test_missing_pool_fails_loudly(self):
+        from open_deep_research.deep_researcher import supervisor_tools
+
+        state = {
+            "supervisor_messages": [self.conduct("fast")],
+            "research_iterations": 1,
+            "research_pool_id": "pool-from-another-process",
+        }
+        with self.assertRaisesRegex(RuntimeError, "not open in this process"):
+            await supervisor_tools(state, self.config)
+
+class TestResearchUnitTimeout(unittest.IsolatedAsyncioTestCase):
+    async def run_unit(self, search_delay, timeout, compression_delay=0):
+        from langchain_core.tools import tool
+
+        from open_deep_research.deep_researcher import run_research_unit
+
+        @tool
+        async def search(query: str) -> str:
+            """Search the web."""
+            await asyncio.sleep(search_delay if query == "second" else 0)
+            return f"Findings about {query}"
+
+        research_model = MagicMock(ainvoke=AsyncMock(side_effect=[
+            AIMessage(content="", tool_calls=[{"name": "search", "args": {"query": "first"}, "id": "call-1"}]),
+            AIMessage(content="", tool_calls=[{"name": "search", "args": {"query": "second"}, "id": "call-2"}]),
+            AIMessage(content="Done researching."),
+        ]))
+        compression_prompts = []
+
+        async def compress(messages):
+            compression_prompts.append("\n".join(str(message.content) for message in messages))
+            await asyncio.sleep(compression_delay)
+            return AIMessage(content="compressed")
+
+        compression_model = MagicMock(ainvoke=AsyncMock(side_effect=compress))
+
+        def fake_get_chat_model(model_config, tools=None, **kwargs):
+            return research_model if tools else compression_model
+
+        with patch("open_deep_research.deep_researcher.get_chat_model", side_effect=fake_get_chat_model), \
+                patch("open_deep_research.deep_researcher.get_all_tools", AsyncMock(return_value=[search])), \
+                patch("open_deep_research.deep_researcher.get_tools_by_name", AsyncMock(return_value={"search": search})):
+            result = await run_research_unit("topic", {"configurable": {
+                "research_model": "openai:gpt-4.1", "research_unit_timeout_seconds": timeout
+            }})
+        return result, compression_prompts
+
+    async def test_slow_unit_returns_partial_compression(self):
+        start = time.monotonic()
+        result, compression_prompts = await self.run_unit(search_delay=10, timeout=0.2)
+
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertTrue(result["partial"])
+        self.assertEqual(result["compressed_research"], "compressed")
+        self.assertIn("Findings about first", compression_prompts[0])
+        self.assertNotIn("Findings about second", compression_prompts[0])
+
+    async def test_partial_compression_stays_within_the_budget(self):
+        start = time.monotonic()
+        result, _ = await self.run_unit(search_delay=10, timeout=0.5, compression_delay=10)
+
+        self.assertLess(time.monotonic() - start, 0.8)
+        self.assertTrue(result["partial"])
+        self.assertIn("Findings about first", result["compressed_research"])
+
+    async def test_unit_within_budget_is_complete(self):
+        result, _ = await self.run_unit(search_delay=0, timeout=5)
+
+        self.assertEqual(result["compressed_research"], "compressed")
+        self.assertNotIn("partial", result)
+
+    def test_partial_results_are_flagged_to_the_supervisor(self):
+        from open_deep_research.deep_researcher import (
+            format_research_unit_result,
+            research_unit_additional_kwargs,
+        )
+
+        result = {"compressed_research": "some findings", "partial": True}
+        self.assertIn("partial", format_research_unit_result(result))
+        self.assertTrue(format_research_unit_result(result).endswith("some findings"))
+        self.assertEqual(research_unit_additional_kwargs(result), {"partial_research": True})
+
+class TestConcurrencyGovernor(unittest.IsolatedAsyncioTestCase):
+    async def test_pool_limits_running_and_reports_queued(self):
+        pool = ConcurrencyPool(limit=2)
+        order = []
+
+        async def work(name):
+            await pool.acquire()
+            order.append(name)
+            await asyncio.sleep(0.01)
+            pool.release()
+
+        tasks = [asyncio.create_task(work(name)) for name in "abcd"]
+        await asyncio.sleep(0.001)
+        self.assertEqual((pool.running, pool.queued), (2, 2))
+        await asyncio.gather(*tasks)
+
+        self.assertEqual(order, list("abcd"))
+        self.assertEqual((pool.running, pool.queued), (0, 0))
+
+    async def test_cancelled_waiter_does_not_leak_a_slot(self):
+        pool = ConcurrencyPool(limit=1)
+        await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        pool.release()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        await asyncio.sleep(0)
+
+        self.assertEqual((pool.running, pool.queued), (0, 0))
+        await asyncio.wait_for(pool.acquire(), 1)
+
+    async def test_run_and_process_limits_apply_together(self):
+        governor = ConcurrencyGovernor()
+        in_flight = Counter()
+        peak = Counter()
+
+        async def tool_call(run_id):
+            config = {"configurable": {
+                "thread_id": run_id,
+                "run_concurrency_limits": {"tool_calls": 2},
+                "process_concurrency_limits": {"tool_calls": 3},
+            }}
+            async with governor.slot("tool_calls", config):
+                in_flight[run_id] += 1
+                in_flight["process"] += 1
+                peak[run_id] = max(peak[run_id], in_flight[run_id])
+                peak["process"] = max(peak["process"], in_flight["process"])
+                await asyncio.sleep(0.01)
+                in_flight[run_id] -= 1
+                in_flight["process"] -= 1
+
+        calls = asyncio.gather(*[tool_call(run_id) for run_id in ["a"] * 5 + ["b"] * 5])
+        await asyncio.sleep(0.001)
+        stats = governor.stats()
+        await calls
+
+        self.assertEqual(peak["a"], 2)
+        self.assertEqual(peak["b"], 2)
+        self.assertEqual(peak["process"], 3)
+        self.assertEqual(stats["process"]["tool_calls"], {"limit": 3, "running": 3, "queued": 1})
+        self.assertEqual(stats["run:a"]["tool_calls"]["queued"], 3)
+        self.assertEqual(governor.stats(), {"process": {"tool_calls": {"limit": 3, "running": 0, "queued": 0}}})
+
+    def test_runs_without_an_identity_get_their_own_scope(self):
+        first, second = with_run_scope({}), with_run_scope({})
+
+        self.assertNotEqual(get_run_scope(first), get_run_scope(second))
+        self.assertEqual(get_run_scope(first), get_run_scope(with_run_scope(first)))
+        self.assertNotEqual(get_run_scope({}), get_run_scope({}))
+        self.assertEqual(get_run_scope({"run_id": "abc"}), "run:abc")
+        self.assertEqual(get_run_scope(with_run_scope({"metadata": {"run_id": "abc"}})), "run:abc")
+
+    async def test_unset_limits_never_wait(self):
+        governor = ConcurrencyGovernor()
+        async with governor.slot("research_units", {}):
+            self.assertEqual(governor.stats(), {})
+
+class TestConfigurationCache(unittest.TestCase):
+    def tearDown(self):
+        Configuration.clear_cache()
+
+    def test_cached_configuration_matches_uncached_parse(self):
+        configs = [
+            None,
+            {"configurable": {}},
+            {"configurable": {"research_model": "anthropic:claude-sonnet-4", "max_researcher_iterations": 3}},
+            {"configurable": {
+                "search_api": "none",
+                "mcp_config": {"url": "https://mcp.example", "tools": ["search"]},
+                "rate_limits": {"openai": {"requests_per_minute": 500}},
+                "thread_id": "ignored",
+            }},
+        ]
+        for config in configs:
+            configurable = config.get("configurable", {}) if config else {}
+            first = Configuration.from_runnable_config(config)
+            self.assertEqual(first, Configuration._parse_configurable(configurable))
+            self.assertIs(Configuration.from_runnable_config(config), first)
+
+    def test_environment_overrides_are_snapshotted(self):
+        config = {"configurable": {"research_model": "openai:gpt-4.1"}}
+        with patch.dict(os.environ, {"RESEARCH_MODEL": "anthropic:claude-sonnet-4"}):
+            Configuration.clear_cache()
+            self.assertEqual(
+                Configuration.from_runnable_config(config).research_model, "anthropic:claude-sonnet-4"
+            )
+        self.assertEqual(
+            Configuration.from_runnable_config(config).research_model, "anthropic:claude-sonnet-4"
+        )
+        Configuration.clear_cache()
+        self.assertEqual(Configuration.from_runnable_config(config).research_model, "openai:gpt-4.1")
+
+class TestToolRegistry(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.config = {"configurable": {
+            "search_api": "none",
+            "mcp_config": {"url": "https://mcp.example", "tools": ["search_docs"]},
+        }}
+        self.mcp_tool = MagicMock()
+        self.mcp_tool.name = "search_docs"
+
+    async def test_toolkit_is_built_once_and_reloaded_after_auth_error(self):
+        load_mcp_tools = AsyncMock(return_value=[self.mcp_tool])
+        with patch("open_deep_research.utils.tool_registry", ToolRegistry()), \
+                patch("open_deep_research.utils.load_mcp_tools", load_mcp_tools):
+            first = await get_all_tools(self.config)
+            second = await get_all_tools(self.config)
+            tools_by_name = await get_tools_by_name(self.config)
+
+            self.assertEqual(load_mcp_tools.call_count, 1)
+            self.assertEqual([id(t) for t in first], [id(t) for t in second])
+            self.assertIs(tools_by_name["search_docs"], self.mcp_tool)
+
+            on_auth_error = load_mcp_tools.call_args.args[2]
+            on_auth_error()
+            await get_all_tools(self.config)
+            self.assertEqual(load_mcp_tools.call_count, 2)
+
+    async def test_failed_mcp_discovery_is_not_cached(self):
+        load_mcp_tools = AsyncMock(side_effect=[[], [self.mcp_tool]])
+        with patch("open_deep_research.utils.tool_registry", ToolRegistry()), \
+                patch("open_deep_research.utils.load_mcp_tools", load_mcp_tools):
+            self.assertNotIn("search_docs", await get_tools_by_name(self.config))
+            self.assertIn("search_docs", await get_tools_by_name(self.config))
+
+    async def test_refreshed_access_token_rebuilds_the_toolkit(self):
+        config = {**self.config, "configurable": {
+            **self.config["configurable"],
+            "mcp_config": {"url": "https://mcp.example", "tools": ["search_docs"], "auth_required": True},
+        }}
+        fetch_tokens = AsyncMock(side_effect=[
+            {"access_token": "old"}, {"access_token": "old"}, {"access_token": "new"},
+        ])
+        load_mcp_tools = AsyncMock(return_value=[self.mcp_tool])
+        with patch("open_deep_research.utils.tool_registry", ToolRegistry()), \
+                patch("open_deep_research.utils.fetch_tokens", fetch_tokens), \
+                patch("open_deep_research.utils.load_mcp_tools", load_mcp_tools):
+            for _ in range(3):
+                await get_all_tools(config)
+
+        self.assertEqual(load_mcp_tools.call_count, 2)
+
+class TestPersistentMCPSession(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.connects = 0
+        self.fail_next_call = False
+
+        @asynccontextmanager
+        async def create_session(connection):
+            self.connects += 1
+            session = MagicMock()
+            session.initialize = AsyncMock()
+
+            async def call_tool(name, arguments, **kwargs):
+                self.call_kwargs = kwargs
+                await asyncio.sleep(0.01)
+                if self.fail_next_call:
+                    self.fail_next_call = False
+                    raise ConnectionError("connection reset")
+                return f"{name} result"
+
+            session.call_tool = AsyncMock(side_effect=call_tool)
+            yield session
+
+        self.patcher = patch("open_deep_research.utils.create_session", create_session)
+        self.patcher.start()
+        self.manager = MCPSessionManager()
+        self.connection = {"url": "https://mcp.example/mcp", "transport": "streamable_http"}
+
+    async def asyncTearDown(self):
+        await self.manager.aclose()
+        self.patcher.stop()
+
+    async def test_concurrent_calls_share_one_connection(self):
+        session = self.manager.get_session(self.connection)
+        results = await asyncio.gather(*[session.call_tool("search", {}) for _ in range(5)])
+
+        self.assertEqual(results, ["search result"] * 5)
+        self.assertEqual(self.connects, 1)
+        self.assertIs(self.manager.get_session(dict(self.connection)), session)
+
+    async def test_reconnects_after_transport_failure(self):
+        session = self.manager.get_session(self.connection)
+        await session.call_tool("search", {})
+        self.fail_next_call = True
+        with self.assertRaises(ConnectionError):
+            await session.call_tool("search", {})
+
+        self.assertEqual(await session.call_tool("search", {}), "search result")
+        self.assertEqual(self.connects, 2)
+
+    async def test_handle_forwards_extra_session_arguments(self):
+        handle = MCPSessionHandle(self.connection)
+        progress_callback = AsyncMock()
+        with patch("open_deep_research.utils.get_mcp_session_manager", return_value=self.manager):
+            result = await handle.call_tool(
+                "search", {"query": "q"}, progress_callback=progress_callback
+            )
+
+        self.assertEqual(result, "search result")
+        self.assertEqual(self.call_kwargs, {"progress_callback": progress_callback})
+
+    async def test_evicted_session_is_closed(self):
+        manager = MCPSessionManager(max_sessions=1)
+        evicted = manager.get_session(self.connection)
+        await evicted.call_tool("search", {})
+        manager.get_session({**self.connection, "url": "https://other.example/mcp"})
+        self.assertEqual(len(manager._closing), 1)
+
+        await manager.aclose()
+        self.assertFalse(manager._closing)
+        self.assertIsNone(evicted._runner)
+
+class TestMCPTokenCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.config = {
+            "configurable": {
+                "thread_id": "thread-1",
+                "x-supabase-access-token": "supabase-token",
+                "mcp_config": {"url": "https://mcp.example", "auth_required": True},
+            },
+            "metadata": {"owner": "user-1"},
+        }
+        self.store = MagicMock()
+        self.store.aget = AsyncMock(return_value=None)
+        self.store.aput = AsyncMock()
+        self.exchange_calls = 0
+        self.token_cache = MCPTokenCache()
+
+        async def exchange(supabase_token, base_mcp_url):
+            self.exchange_calls += 1
+            await asyncio.sleep(0.01)
+            return {"access_token": f"token-{self.exchange_calls}", "expires_in": 3600}
+
+        self.patchers = [
+            patch("open_deep_research.utils.get_store", return_value=self.store),
+            patch("open_deep_research.utils.get_mcp_access_token", side_effect=exchange),
+            patch("open_deep_research.utils.mcp_token_cache", self.token_cache),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    async def asyncTearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    async def test_concurrent_fetches_share_one_exchange_and_then_skip_the_store(self):
+        results = await asyncio.gather(*[fetch_tokens(self.config) for _ in range(5)])
+        self.assertEqual(self.exchange_calls, 1)
+        self.assertTrue(all(result["access_token"] == "token-1" for result in results))
+
+        store_reads = self.store.aget.call_count
+        self.assertEqual((await fetch_tokens(self.config))["access_token"], "token-1")
+        self.assertEqual(self.store.aget.call_count, store_reads)
+
+    async def test_tokens_near_expiry_are_refreshed_in_background(self):
+        self.token_cache.set("user-1", {"access_token": "old"}, time.time() + 30)
+
+        self.assertEqual((await fetch_tokens(self.config))["access_token"], "old")
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.exchange_calls, 1)
+        self.assertEqual((await fetch_tokens(self.config))["access_token"], "token-1")
+
+class TestNearDuplicateDetector(unittest.TestCase):
+    def setUp(self):
+        self.article = " ".join(f"word{i % 997} token{i % 389}" for i in range(3000))
+
+    def test_mirrored_copy_is_matched_to_original(self):
+        detector = NearDuplicateDetector(threshold=0.85)
+        mirrored = "Republished from Example Wire. " + self.article + " All rights reserved."
+
+        self.assertIsNone(detector.match_or_add("https://original.example", self.article))
+        self.assertEqual(detector.match_or_add("https://mirror.example", mirrored), "https://original.example")
+
+    def test_unrelated_page_is_kept(self):
+        detector = NearDuplicateDetector(threshold=0.85)
+        unrelated = " ".join(f"other{i % 613} text{i % 211}" for i in range(3000))
+
+        detector.match_or_add("https://original.example", self.article)
+        self.assertIsNone(detector.match_or_add("https://unrelated.example", unrelated))
+
+class TestPassageSelection(unittest.TestCase):
+    def test_relevant_passage_past_the_cutoff_is_kept(self):
+        boilerplate = "\n\n".join(f"Navigation menu item {i} and cookie banner text." * 10 for i in range(40))
+        content = "Page title\n\n" + boilerplate + "\n\nThe fusion reactor reached ignition in 2022."
+
+        selected = select_relevant_passages(content, "fusion reactor ignition", char_budget=2000)
+
+        self.assertLessEqual(len(selected), 2000)
+        self.assertTrue(selected.startswith("Page title"))
+        self.assertIn("The fusion reactor reached ignition in 2022.", selected)
+
+    def test_content_within_budget_is_unchanged(self):
+        content = "Short page.\n\nNothing to trim."
+        self.assertEqual(select_relevant_passages(content, "anything", char_budget=1000), content)
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_calls_share_one_request(self):
+        single_flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*[single_flight.do("key", fetch) for _ in range(3)])
+
+        self.assertEqual(results, ["result"] * 3)
+        self.assertEqual(calls, 1)
+        self.assertEqual(single_flight.stats(), {"calls": 3, "coalesced": 2, "in_flight": 0})
+
+    async def test_errors_propagate_to_every_caller(self):
+        single_flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(
+            single_flight.do("key", fail), single_flight.do("key", fail), return_exceptions=True
+        )
+
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+    async def test_work_is_cancelled_only_when_every_caller_is(self):
+        single_flight = SingleFlight()
+        started, cancelled = asyncio.Event(), asyncio.Event()
+
+        async def fetch():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        first = asyncio.create_task(single_flight.do("key", fetch))
+        second = asyncio.create_task(single_flight.do("key", fetch))
+        await started.wait()
+
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.sleep(0)
+        self.assertFalse(cancelled.is_set())
+
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        self.assertEqual(single_flight.stats()["in_flight"], 0)
+
+    async def test_concurrent_summaries_of_same_page_are_coalesced(self):
+        async def slow_summary(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            return Summary(summary="Shared.", key_excerpts="Quote.")
+
+        mock_model = AsyncMock(spec=BaseChatModel)
+        mock_model.ainvoke.side_effect = slow_summary
+
+        content = "e" * 10000
+        results = await asyncio.gather(
+            summarize_webpage(mock_model, content, "openai:gpt-4.1-mini"),
+            summarize_webpage(mock_model, content, "openai:gpt-4.1-mini"),
+        )
+
+        mock_model.ainvoke.assert_called_once()
+        self.assertEqual(results[0], results[1])
+
+class TestSummaryCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.persistent_cache = PersistentCache(
+            os.path.join(self.tmp_dir.name, "summary_cache.sqlite"),
+            ttl_seconds=60,
+            max_size_bytes=1024 * 1024,
+        )
+
+    async def asyncTearDown(self):
+        self.tmp_dir.cleanup()
+
+    async def test_repeated_page_is_summarized_once(self):
+        mock_model = AsyncMock(spec=BaseChatModel)
+        mock_model.ainvoke.return_value = Summary(summary="Cached.", key_excerpts="Quote.")
+        summary_cache = SummaryCache(self.persistent_cache, max_memory_entries=8)
+
+        content = "b" * 10000
+        first = await summarize_webpage(mock_model, content, "openai:gpt-4.1-mini", summary_cache)
+        second = await summarize_webpage(mock_model, content, "openai:gpt-4.1-mini", summary_cache)
+
+        mock_model.ainvoke.assert_called_once()
+        self.assertEqual(first, second)
+        self.assertEqual(summary_cache.stats()["memory_hits"], 1)
+
+    async def test_persistent_tier_survives_new_memory_tier(self):
+        mock_model = AsyncMock(spec=BaseChatModel)
+        mock_model.ainvoke.return_value = Summary(summary="Cached.", key_excerpts="Quote.")
+
+        content = "c" * 10000
+        await summarize_webpage(
+            mock_model, content, "openai:gpt-4.1-mini", SummaryCache(self.persistent_cache, 8)
+        )
+        result = await summarize_webpage(
+            mock_model, content, "openai:gpt-4.1-mini", SummaryCache(self.persistent_cache, 8)
+        )
+
+        mock_model.ainvoke.assert_called_once()
+        self.assertIn("<summary>\nCached.\n</summary>", result)
+
+    async def test_different_model_is_not_served_from_cache(self):
+        mock_model = AsyncMock(spec=BaseChatModel)
+        mock_model.ainvoke.return_value = Summary(summary="Cached.", key_excerpts="Quote.")
+        summary_cache = SummaryCache(self.persistent_cache, max_memory_entries=8)
+
+        content = "d" * 10000
+        await summarize_webpage(mock_model, content, "openai:gpt-4.1-mini", summary_cache)
+        await summarize_webpage(mock_model, content, "openai:gpt-4.1-nano", summary_cache)
+
+        self.assertEqual(mock_model.ainvoke.call_count, 2)
+
+    async def test_different_excerpts_of_a_page_are_cached_separately(self):
+        mock_model = AsyncMock(spec=BaseChatModel)
+        mock_model.ainvoke.return_value = Summary(summary="Cached.", key_excerpts="Quote.")
+        summary_cache = SummaryCache(self.persistent_cache, max_memory_entries=8)
+
+        raw_page = "e" * 10000 + "f" * 10000
+        for excerpt in (raw_page[:10000], raw_page[10000:], raw_page[:10000]):
+            await summarize_webpage(mock_model, excerpt, "openai:gpt-4.1-mini", summary_cache)
+
+        self.assertEqual(mock_model.ainvoke.call_count, 2)
+
+    async def test_unwritable_cache_dir_disables_summary_cache(self):
+        blocked_dir = os.path.join(self.tmp_dir.name, "not_a_dir")
+        open(blocked_dir, "w").close()
+        configurable = Configuration(cache_dir=os.path.join(blocked_dir, "cache"))
+
+        self.assertIsNone(await get_summary_cache(configurable))
+
+class TestRateLimiter(unittest.TestCase):
+    def test_bucket_admits_burst_then_paces(self):
+        bucket = TokenBucket(per_minute=60)
+        self.assertEqual(bucket.reserve(60), 0.0)
+        self.assertAlmostEqual(bucket.reserve(1), 1.0, places=1)
+        self.assertAlmostEqual(bucket.reserve(1), 2.0, places=1)
+
+    def test_provider_and_model_limits_share_buckets(self):
+        configurable = Configuration(rate_limits={
+            "openai": {"requests_per_minute": 500},
+            "openai:gpt-4.1": {"requests_per_minute": 100, "tokens_per_minute": 30000},
+        })
+        research_limiter = get_rate_limiter(configurable, "openai:gpt-4.1")
+        summary_limiter = get_rate_limiter(configurable, "openai:gpt-4.1-mini")
+
+        self.assertEqual(len(research_limiter.request_buckets), 2)
+        self.assertEqual(len(research_limiter.token_buckets), 1)
+        self.assertIs(research_limiter.request_buckets[0], summary_limiter.request_buckets[0])
+        self.assertEqual(get_rate_limiter(Configuration(), "tavily").request_buckets, [])
+
+class TestPersistentCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip_counts_hits_and_misses(self):
+        cache = PersistentCache(self.path, ttl_seconds=60, max_size_bytes=1024 * 1024)
+        self.assertIsNone(cache.get("key"))
+        cache.set("key", {"results": [{"url": "https://example.com"}]})
+
+        self.assertEqual(cache.get("key"), {"results": [{"url": "https://example.com"}]})
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "evictions": 0})
+
+    def test_entries_expire_after_ttl(self):
+        cache = PersistentCache(self.path, ttl_seconds=10, max_size_bytes=1024 * 1024)
+        with patch("open_deep_research.utils.time.time", return_value=1000.0):
+            cache.set("key", "value")
+        with patch("open_deep_research.utils.time.time", return_value=1011.0):
+            self.assertIsNone(cache.get("key"))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = PersistentCache(self.path, ttl_seconds=3600, max_size_bytes=1400)
+        for i, key in enumerate(["a", "b", "c"]):
+            with patch("open_deep_research.utils.time.time", return_value=1000.0 + i):
+                # Random hex payloads compress to roughly 550 bytes, so only two entries fit
+                cache.set(key, os.urandom(512).hex())
+            if key == "b":
+                with patch("open_deep_research.utils.time.time", return_value=1001.5):
+                    cache.get("a")
+
+        with patch("open_deep_research.utils.time.time", return_value=1003.0):
+            self.assertIsNotNone(cache.get("a"))
+            self.assertIsNone(cache.get("b"))
+            self.assertIsNotNone(cache.get("c"))
+
+    def test_unwritable_cache_dir_falls_back_to_no_cache(self):
+        # A regular file in place of the cache directory makes every open fail
+        blocked_dir = os.path.join(self.tmp_dir.name, "not_a_dir")
+        open(blocked_dir, "w").close()
+        config = {"configurable": {
+            "cache_dir": os.path.join(blocked_dir, "cache"), "search_cache_enabled": True
+        }}
+        tavily_client = MagicMock()
+        tavily_client.search = AsyncMock(return_value={"query": "q", "results": []})
+
+        with patch("open_deep_research.utils.get_tavily_client", return_value=tavily_client), \
+                patch("open_deep_research.utils.os.makedirs", wraps=os.makedirs) as makedirs:
+            for _ in range(2):
+                results = asyncio.run(tavily_search_async(["q"], config=config))
+                self.assertEqual(results, [{"query": "q", "results": []}])
+            self.assertIsNone(asyncio.run(get_search_cache(Configuration.from_runnable_config(config))))
+
+        # The failed open is remembered instead of being retried on every search
+        self.assertEqual(makedirs.call_count, 1)
+
+    def test_cache_is_opened_off_the_event_loop(self):
+        config = {"configurable": {"cache_dir": self.tmp_dir.name}}
+        opened_in = []
+
+        def record_thread(*args):
+            opened_in.append(threading.current_thread())
+            return PersistentCache(*args)
+
+        async def open_twice():
+            configurable = Configuration.from_runnable_config(config)
+            return await get_search_cache(configurable), await get_search_cache(configurable)
+
+        with patch("open_deep_research.utils.PersistentCache", side_effect=record_thread):
+            first, second = asyncio.run(open_twice())
+
+        self.assertIs(first, second)
+        self.assertEqual(len(opened_in), 1)
+        self.assertIsNot(opened_in[0], threading.main_thread())
+
+    def test_search_cache_key_normalizes_query(self):
+        self.assertEqual(
+            make_search_cache_key("  Quantum   Computing ", 5, "general", True),
+            make_search_cache_key("quantum computing", 5, "general", True),
+        )
+        self.assertNotEqual(
+            make_search_cache_key("quantum computing", 5, "general", True),
+            make_search_cache_key("quantum computing", 5, "news", True),
+        )
+
 if __name__ == "__main__":
     unittest.main()